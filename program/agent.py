@@ -1,14 +1,45 @@
 import numpy as np
 import pickle
 import os
-from random import randint, random
+import time
+import random
+import sys
 from constants import ACTION_MAP, NUM_ACTIONS
 from player import Player
+from metrics import ProgressPrinter
+from transitions import TransitionTable
+from kernels import HAVE_NUMBA, get_train_episodes
+from compact import CompactLayout, COMPACT_DTYPES, LEGAL_BY_MASK
+from qtable_io import save_q_array, load_q_array, load_legacy_pickle, is_q_table_file, QTableFormatError
+
+# potential used for the distance part of the reward:
+# "manhattan" is the straight line distance to the exit, "path" the real number of steps left (maze.distance_to_exit)
+REWARD_SHAPINGS = ("manhattan", "path")
+
+# "dict" keeps one small array per visited (row, col)
+# "dense" preallocates a single (rows, cols, NUM_ACTIONS) float32 array indexed by cell
+# "compact" only has rows for open cells, in float16 or float32 (see compact.py), for very large mazes
+Q_BACKENDS = ("dict", "dense", "compact")
 
 class RLAgent:
     # manages the q learning algorithm: q table and training
-    def __init__(self, learning_rate, discount_factor, epsilon_start, epsilon_end, epsilon_decay, step_penalty):
-        self.q_table = {}
+    def __init__(self, learning_rate, discount_factor, epsilon_start, epsilon_end, epsilon_decay, step_penalty, q_backend="dict", reward_shaping="manhattan", seed=None,
+                 compact_dtype="float16", mask_actions=False):
+        if q_backend not in Q_BACKENDS:
+            raise ValueError(f"Unknown Q-table backend '{q_backend}', expected one of {Q_BACKENDS}")
+        if compact_dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unknown compact Q-table dtype '{compact_dtype}', expected one of {COMPACT_DTYPES}")
+        if reward_shaping not in REWARD_SHAPINGS:
+            raise ValueError(f"Unknown reward shaping '{reward_shaping}', expected one of {REWARD_SHAPINGS}")
+        self.reward_shaping = reward_shaping
+        self.q_backend = q_backend
+        # the dense table needs the maze size and the compact one the maze itself, see prepare_q_table()
+        self.q_table = {} if q_backend == "dict" else None
+        self.layout = None # the compact backend's CompactLayout
+        self.compact_dtype = compact_dtype
+        # compact backend only: moves into walls are -inf, so they are never the best action or the best next
+        # value, and exploration only picks legal moves (the agent doesn't spend episodes finding the walls)
+        self.mask_actions = mask_actions and q_backend == "compact"
         self.lr = learning_rate
         self.gamma = discount_factor
         self.epsilon = epsilon_start
@@ -16,33 +47,87 @@ class RLAgent:
         self.epsilon_end = epsilon_end
         self.epsilon_decay = epsilon_decay
         self.step_penalty = step_penalty
-        print(f"Agent Initialized with: LR={self.lr}, Gamma={self.gamma}, EpsilonDecay={self.epsilon_decay}")
+        # exploration has its own generators, so a seeded agent trains the same way every time
+        # whatever else uses the random module (seed=None gives fresh, unpredictable ones)
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        # set by a training callback (e.g. metrics.EarlyStopping) to end train() / train_batched() early
+        self.stop_training = False
+        self.episodes_trained = 0
+        print(f"Agent Initialized with: LR={self.lr}, Gamma={self.gamma}, EpsilonDecay={self.epsilon_decay}, Backend={self.q_backend}")
+
+    def start_episode(self, maze):
+        # called before an exploit_only episode is played on maze (greedy_rollout, Game.run)
+        # position states only need a compact table laid out for this maze, see general.GeneralAgent for agents
+        # that remember things
+        if self.q_backend == "compact":
+            self.prepare_q_table(maze)
 
     def _get_state_key(self, row, col):
         # this may seem redundant, but only made to make purpose clear in code
         # otherwise, it's just using the coordinates for no clear reason
+        # (compact tables are indexed by open cell instead)
+        if self.q_backend == "compact":
+            return self.layout.cell_index.item(row, col)
         return (row, col) 
 
+    def _state_keys(self, table):
+        # the state key of every flat cell of a transitions.TransitionTable, for the training loops
+        if self.q_backend == "compact":
+            return self.layout.cell_index.ravel().tolist()
+        return table.keys()
+
+    def prepare_q_table(self, maze):
+        # makes sure the table fits maze before training or playing on it, a table that already does is kept
+        # dict tables grow by themselves, dense ones are allocated per maze size and compact ones per maze
+        if self.q_backend == "dense" and (self.q_table is None or self.q_table.shape[:2] != (maze.rows, maze.cols)):
+            self._allocate_q_table(maze.rows, maze.cols)
+        elif self.q_backend == "compact" and (self.layout is None or not self.layout.matches(maze)):
+            self.layout = CompactLayout(maze)
+            self._allocate_q_table(maze.rows, maze.cols)
+
+    def _allocate_q_table(self, rows, cols):
+        # (re)creates an empty dense table, every cell starts at 0 just like a fresh dict entry
+        if self.q_backend == "compact":
+            self._set_compact_values(np.zeros((self.layout.num_open, NUM_ACTIONS), dtype=self.compact_dtype))
+            return
+        self.q_table = np.zeros((rows, cols, NUM_ACTIONS), dtype=np.float32)
+
+    def _set_compact_values(self, values):
+        if self.mask_actions:
+            values[self.layout.illegal()] = -np.inf
+        self.q_table = values
+
     def _initialize_q_table_for_state(self, state_key):
-        if state_key not in self.q_table:
+        # dense tables already hold every cell
+        if self.q_backend == "dict" and state_key not in self.q_table:
             self.q_table[state_key] = np.zeros(NUM_ACTIONS)
 
     def choose_action(self, state_key, exploit_only=False):
         # Chooses an action using an explore or exploit
         self._initialize_q_table_for_state(state_key)  
-        if not exploit_only and random() < self.epsilon:
-            return randint(0, NUM_ACTIONS - 1)  # explore: choose a random action
+        if not exploit_only and self.rng.random() < self.epsilon:
+            if self.mask_actions:
+                legal = LEGAL_BY_MASK[self.layout.legal_masks.item(state_key)]
+                return legal[self.rng.randrange(len(legal))]
+            return self.rng.randint(0, NUM_ACTIONS - 1)  # explore: choose a random action
         else:
-            return np.argmax(self.q_table[state_key])  # Exploit: choose the best known action
+            # a (row, col) key indexes straight into the dense array, same as a dict lookup
+            return int(np.argmax(self.q_table[state_key]))  # Exploit: choose the best known action
 
-    def get_reward(self, old_pos, new_pos, move_reason, exit_pos):
+    def get_reward(self, old_pos, new_pos, move_reason, exit_pos, distances=None):
         # Calculates the reward for a move
+        # distances is maze.distance_to_exit (or its .tolist()) when shaping by the real path length
         if move_reason in ("wall", "boundary"): return -10.0
         if new_pos == exit_pos: return 100.0
 
         # more closer = more reward
-        dist_old = abs(old_pos[0] - exit_pos[0]) + abs(old_pos[1] - exit_pos[1])
-        dist_new = abs(new_pos[0] - exit_pos[0]) + abs(new_pos[1] - exit_pos[1])
+        if distances is not None:
+            dist_old = distances[old_pos[0]][old_pos[1]]
+            dist_new = distances[new_pos[0]][new_pos[1]]
+        else:
+            dist_old = abs(old_pos[0] - exit_pos[0]) + abs(old_pos[1] - exit_pos[1])
+            dist_new = abs(new_pos[0] - exit_pos[0]) + abs(new_pos[1] - exit_pos[1])
 
         # +0.1 if goes toward -0.1 if going away
         distance_reward = (dist_old - dist_new) * 0.1
@@ -50,7 +135,23 @@ class RLAgent:
         return self.step_penalty + distance_reward
 
     def update_q_table(self, state_key, action, reward, next_state_key):
-        # updates the Q-table
+        # updates the Q-table, returns how much the value changed (absolute)
+        if self.q_backend == "dense":
+            # scalar reads/writes on the flat array avoid the per-state view objects
+            row, col = state_key
+            old_q_value = self.q_table.item(row, col, action)
+            max_future_q = max(self.q_table[next_state_key].tolist())
+            change = self.lr * (reward + self.gamma * max_future_q - old_q_value)
+            self.q_table[row, col, action] = old_q_value + change
+            return abs(change)
+        if self.q_backend == "compact":
+            # the same, a state key is a row of the values array (float16 rounds the stored value)
+            old_q_value = self.q_table.item(state_key, action)
+            max_future_q = max(self.q_table[next_state_key].tolist())
+            change = self.lr * (reward + self.gamma * max_future_q - old_q_value)
+            self.q_table[state_key, action] = old_q_value + change
+            return abs(change)
+
         self._initialize_q_table_for_state(next_state_key)
 
         old_q_value = self.q_table[state_key][action]
@@ -59,66 +160,382 @@ class RLAgent:
         # q learning  formula (google Bellman Equation if you forget what it means)
         new_q_value = old_q_value + self.lr * (reward + self.gamma * max_future_q - old_q_value)
         self.q_table[state_key][action] = new_q_value
+        return abs(new_q_value - old_q_value)
+
+    def q_states(self):
+        # number of states the table holds values for
+        if self.q_backend == "dense":
+            return 0 if self.q_table is None else self.q_table.shape[0] * self.q_table.shape[1]
+        return 0 if self.q_table is None else len(self.q_table)
 
-    def train(self, maze, num_episodes):
+    def q_table_bytes(self):
+        # memory held by the Q-table
+        # for dicts that is the dict, its tuple keys and the per-state arrays (not the ints inside the keys)
+        if self.q_backend == "dense":
+            return 0 if self.q_table is None else self.q_table.nbytes
+        if self.q_backend == "compact":
+            return 0 if self.q_table is None else self.q_table.nbytes + self.layout.nbytes()
+        return sys.getsizeof(self.q_table) + sum(sys.getsizeof(key) + sys.getsizeof(values) for key, values in self.q_table.items())
+
+    def _start_training(self, maze, num_episodes, callbacks):
+        # shared setup of train() and train_batched(), returns the callbacks to call
+        self.stop_training = False
+        callbacks = [ProgressPrinter(), *callbacks]
+        for callback in callbacks:
+            callback.on_train_begin(self, maze, num_episodes)
+        return callbacks
+
+    def _finish_training(self, callbacks, episodes, transitions, seconds):
+        self.episodes_trained = episodes
+        summary = {
+            'episodes': episodes,
+            'transitions': transitions,
+            'seconds': seconds,
+            'transitions_per_sec': transitions / seconds if seconds > 0 else 0.0,
+        }
+        for callback in callbacks:
+            callback.on_train_end(self, summary)
+        print("Training finished.")
+
+    def train(self, maze, num_episodes, callbacks=()):
         # trains the agent on a maze by just repeating episodes
         # let the reward mechanism handle it
+        # callbacks are metrics.TrainingCallback objects, called after every episode
+        # returns the total number of transitions taken
         print(f"Starting training for {num_episodes} episodes...")
         self.epsilon = self.epsilon_start
+        self.prepare_q_table(maze)
+        total_steps = 0
 
-        player = Player(maze.start_pos, maze.rows, maze.cols)
+        # moves and rewards are looked up in the maze's transition table instead of moving a Player
+        # and calling get_reward every step (same results, see transitions.py)
+        table = TransitionTable(maze, self.step_penalty, self.reward_shaping)
+        next_cells, rewards, terminal = table.as_lists()
+        keys = self._state_keys(table)
         max_steps_per_episode = maze.rows * maze.cols
 
+        callbacks = self._start_training(maze, num_episodes, callbacks)
+        train_start = time.perf_counter()
         for episode in range(num_episodes):
-            player.reset()
-            state_key = self._get_state_key(player.row, player.col)
+            episode_start = time.perf_counter()
+            cell = table.start_cell
+            state_key = keys[cell]
             total_reward = 0
+            max_delta_q = 0.0
 
             for step in range(max_steps_per_episode):
                 action = self.choose_action(state_key)
-                row_delta, col_delta, _ = ACTION_MAP[action]
-
-                old_pos = (player.row, player.col)
-                moved, move_reason = player.move(row_delta, col_delta, maze.layout)
-                new_pos = (player.row, player.col)
-                next_state_key = self._get_state_key(new_pos[0], new_pos[1])
-
-                reward = self.get_reward(old_pos, new_pos, move_reason, maze.exit_pos)
+                reward = rewards[cell][action]
+                done = terminal[cell][action]
+                cell = next_cells[cell][action]
+                next_state_key = keys[cell]
                 total_reward += reward
-                
-                self.update_q_table(state_key, action, reward, next_state_key)
+
+                delta_q = self.update_q_table(state_key, action, reward, next_state_key)
+                if delta_q > max_delta_q:
+                    max_delta_q = delta_q
                 state_key = next_state_key
 
-                if new_pos == maze.exit_pos:
+                if done:
                     break
 
+            total_steps += step + 1
             if self.epsilon > self.epsilon_end:
                 self.epsilon *= self.epsilon_decay
 
-            if (episode + 1) % (num_episodes // 20 or 1) == 0:
-                print(f"  ...Episode: {episode+1:>6}/{num_episodes}, Steps: {step+1:<4}, Reward: {total_reward:6.1f}, Epsilon: {self.epsilon:.4f}")
+            seconds = time.perf_counter() - episode_start
+            stats = {
+                'episode': episode + 1,
+                'steps': step + 1,
+                'reward': total_reward,
+                'epsilon': self.epsilon,
+                'seconds': seconds,
+                'transitions_per_sec': (step + 1) / seconds if seconds > 0 else 0.0,
+                'q_states': self.q_states(),
+                'max_delta_q': max_delta_q,
+            }
+            for callback in callbacks:
+                callback.on_episode_end(self, stats)
+            if self.stop_training:
+                break
 
-        print("Training finished.")
+        self._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+        return total_steps
+
+    def train_batched(self, maze, num_episodes, num_envs=64, callbacks=()):
+        # same Q-learning as train(), but num_envs episodes run side by side as numpy arrays
+        # every tick moves all of them one step and applies their updates with fancy indexing
+        # (if two episodes update the same state/action in one tick, the last write wins)
+        # callbacks get the same per-episode stats as with train(), in the order episodes finish
+        if self.q_backend != "dense":
+            raise ValueError("Batched training needs the dense Q-table backend")
+        print(f"Starting batched training for {num_episodes} episodes ({num_envs} at a time)...")
+        self.epsilon = self.epsilon_start
+        self.prepare_q_table(maze)
+        # one row per flat cell, a view so updates land in self.q_table
+        q = self.q_table.reshape(-1, NUM_ACTIONS)
+        rng = self.np_rng
+
+        table = TransitionTable(maze, self.step_penalty, self.reward_shaping)
+        max_steps_per_episode = maze.rows * maze.cols
+
+        num_envs = max(1, min(num_envs, num_episodes))
+        cells = np.full(num_envs, table.start_cell)
+        steps = np.zeros(num_envs, dtype=np.int64)
+        total_rewards = np.zeros(num_envs)
+        max_delta_q = np.zeros(num_envs)
+        episode_starts = np.full(num_envs, time.perf_counter())
+        started = num_envs
+        finished = 0
+        total_steps = 0
+
+        callbacks = self._start_training(maze, num_episodes, callbacks)
+        train_start = time.perf_counter()
 
-    def save_q_table(self, filepath):
-        # saves the q-table to a file using pickle
+        while finished < num_episodes:
+            # epsilon greedy for every episode at once
+            greedy = q[cells].argmax(axis=1)
+            explore = rng.random(len(cells)) < self.epsilon
+            actions = np.where(explore, rng.integers(0, NUM_ACTIONS, len(cells)), greedy)
+
+            next_cells = table.next_cells[cells, actions]
+            rewards = table.rewards[cells, actions]
+            at_exit = table.terminal[cells, actions]
+
+            old_q_values = q[cells, actions]
+            max_future_q = q[next_cells].max(axis=1)
+            changes = self.lr * (rewards + self.gamma * max_future_q - old_q_values)
+            q[cells, actions] = old_q_values + changes
+            np.maximum(max_delta_q, np.abs(changes), out=max_delta_q)
+
+            cells = next_cells
+            steps += 1
+            total_rewards += rewards
+            total_steps += len(cells)
+
+            done = at_exit | (steps >= max_steps_per_episode)
+            if not done.any():
+                continue
+
+            now = time.perf_counter()
+            q_states = self.q_states()
+            for index in np.flatnonzero(done):
+                finished += 1
+                if self.epsilon > self.epsilon_end:
+                    self.epsilon *= self.epsilon_decay
+                seconds = now - episode_starts[index]
+                stats = {
+                    'episode': finished,
+                    'steps': int(steps[index]),
+                    'reward': float(total_rewards[index]),
+                    'epsilon': self.epsilon,
+                    'seconds': seconds,
+                    'transitions_per_sec': steps[index] / seconds if seconds > 0 else 0.0,
+                    'q_states': q_states,
+                    'max_delta_q': float(max_delta_q[index]),
+                }
+                for callback in callbacks:
+                    callback.on_episode_end(self, stats)
+                if self.stop_training:
+                    break
+            if self.stop_training:
+                break
+
+            # finished episodes either restart from the start or retire once enough have been launched
+            restart = np.flatnonzero(done)[:num_episodes - started]
+            started += len(restart)
+            cells[restart] = table.start_cell
+            steps[restart] = 0
+            total_rewards[restart] = 0
+            max_delta_q[restart] = 0
+            episode_starts[restart] = now
+            keep = ~done
+            keep[restart] = True
+            cells, steps, total_rewards = cells[keep], steps[keep], total_rewards[keep]
+            max_delta_q, episode_starts = max_delta_q[keep], episode_starts[keep]
+
+        self._finish_training(callbacks, finished, total_steps, time.perf_counter() - train_start)
+        return total_steps
+
+    def train_jit(self, maze, num_episodes, seed=None, callbacks=(), chunk_episodes=16):
+        # same Q-learning as train(), with the episodes run by the compiled kernel in kernels.py
+        # the kernel draws its own random numbers from seed (taken from the agent's rng when None),
+        # so runs match train() statistically, not step for step
+        # episodes are handed to the kernel chunk_episodes at a time, callbacks run after every chunk
+        # without numba (or with the dict backend) this is just train()
+        if not HAVE_NUMBA or self.q_backend != "dense":
+            print("JIT training needs numba and the dense Q-table backend, using the python trainer.")
+            return self.train(maze, num_episodes, callbacks)
+        print(f"Starting JIT training for {num_episodes} episodes...")
+        train_episodes = get_train_episodes()
+        self.epsilon = self.epsilon_start
+        self.prepare_q_table(maze)
+        q = self.q_table.reshape(-1, NUM_ACTIONS)
+        table = TransitionTable(maze, self.step_penalty, self.reward_shaping)
+        rng_state = np.array([self.rng.getrandbits(63) if seed is None else seed], dtype=np.uint64)
+        max_steps_per_episode = maze.rows * maze.cols
+        episode_steps = np.zeros(chunk_episodes, dtype=np.int64)
+        episode_rewards = np.zeros(chunk_episodes)
+        episode_max_delta_q = np.zeros(chunk_episodes)
+        total_steps = 0
+        finished = 0
+
+        callbacks = self._start_training(maze, num_episodes, callbacks)
+        train_start = time.perf_counter()
+        while finished < num_episodes and not self.stop_training:
+            chunk_start = time.perf_counter()
+            chunk = min(chunk_episodes, num_episodes - finished)
+            epsilon = self.epsilon
+            chunk_steps, self.epsilon = train_episodes(
+                q, table.next_cells, table.rewards, table.terminal, table.start_cell, chunk, max_steps_per_episode,
+                self.lr, self.gamma, self.epsilon, self.epsilon_end, self.epsilon_decay, rng_state,
+                episode_steps, episode_rewards, episode_max_delta_q)
+            total_steps += chunk_steps
+            seconds = time.perf_counter() - chunk_start
+
+            # the kernel only times whole chunks, each episode gets its share by steps
+            q_states = self.q_states()
+            for index in range(chunk):
+                finished += 1
+                if epsilon > self.epsilon_end:
+                    epsilon *= self.epsilon_decay
+                steps = int(episode_steps[index])
+                stats = {
+                    'episode': finished,
+                    'steps': steps,
+                    'reward': float(episode_rewards[index]),
+                    'epsilon': epsilon,
+                    'seconds': seconds * steps / chunk_steps,
+                    'transitions_per_sec': chunk_steps / seconds if seconds > 0 else 0.0,
+                    'q_states': q_states,
+                    'max_delta_q': float(episode_max_delta_q[index]),
+                }
+                for callback in callbacks:
+                    callback.on_episode_end(self, stats)
+                # the rest of the chunk is already trained, it just isn't reported
+                if self.stop_training:
+                    break
+
+        self._finish_training(callbacks, finished, total_steps, time.perf_counter() - train_start)
+        return total_steps
+
+    def greedy_rollout(self, maze, max_steps=None, path=None):
+        # plays one episode with exploit_only actions, like Game.run but without drawing
+        # returns (reached_exit, steps_taken); with a list as path, every position the player is at gets appended to it
+        if max_steps is None:
+            max_steps = maze.rows * maze.cols * 2
+        player = Player(maze.start_pos, maze.rows, maze.cols)
+        walls = maze.walls
+        self.start_episode(maze)
+        if path is not None:
+            path.append((player.row, player.col))
+        for step in range(max_steps):
+            action = self.choose_action(self._get_state_key(player.row, player.col), exploit_only=True)
+            row_delta, col_delta, _ = ACTION_MAP[action]
+            player.move(row_delta, col_delta, walls)
+            if path is not None:
+                path.append((player.row, player.col))
+            if (player.row, player.col) == maze.exit_pos:
+                return True, step + 1
+        return False, max_steps
+
+    def save_q_table(self, filepath, shape=None, dtype=np.float32):
+        # saves the q-table in the binary format from qtable_io (float32, or float16 for half the size)
+        # dict and compact tables are written densely, shape is the maze's (rows, cols) for dicts
         try:
-            with open(filepath, 'wb') as f:
-                pickle.dump(self.q_table, f)
+            save_q_array(filepath, self.dense_q_table(shape), dtype)
             print(f"Q-table saved to {filepath}")
-        except IOError as e:
+        except (IOError, QTableFormatError) as e:
             print(f"Error saving Q-table to {filepath}: {e}")
 
-    def load_q_table(self, filepath):
+    def load_q_table(self, filepath, shape=None):
         # Loads a qtable from a file
+        # binary tables are memory mapped, old pickled tables (.pkl) are still read as a migration path
+        # shape is the (rows, cols) of the maze: used when an old dict table is loaded into a dense agent,
+        # and to reject tables saved for a different size
         if not os.path.exists(filepath):
             print("No cached Q-table found. A new one will be created during training.")
             return False
         try:
-            with open(filepath, 'rb') as f:
-                self.q_table = pickle.load(f)
-            print(f"Q-table successfully loaded from {filepath}")
-            return True
-        except (pickle.UnpicklingError, EOFError, IOError) as e:
+            if is_q_table_file(filepath):
+                q_table = load_q_array(filepath)
+                if shape is not None and q_table.shape[:2] != tuple(shape):
+                    raise QTableFormatError(f"table is {q_table.shape[0]}x{q_table.shape[1]}, expected {shape[0]}x{shape[1]}")
+            else:
+                q_table = load_legacy_pickle(filepath)
+                self._check_legacy_table(q_table, shape)
+            self.set_q_table(q_table, shape)
+        except (pickle.UnpicklingError, ValueError, EOFError, IOError) as e:
+            # ValueError covers QTableFormatError and tables that don't fit this agent
             print(f"Error loading Q-table from {filepath}: {e}. Will train a new one.")
             return False
+
+        print(f"Q-table successfully loaded from {filepath}")
+        return True
+
+    def dense_q_table(self, shape=None):
+        # the table as a (rows, cols, NUM_ACTIONS) array whatever the backend, shape is the maze's (rows, cols) for dicts
+        if self.q_backend == "dense":
+            return self.q_table
+        if self.q_backend == "compact":
+            return self.layout.expand(self.q_table)
+        return self._dense_from_dict(self.q_table, shape)
+
+    def set_q_table(self, q_table, shape=None):
+        # installs a table from any backend, converting it to this agent's backend
+        # a compact agent needs prepare_q_table(maze) first, its layout depends on the maze
+        if self.q_backend == "compact":
+            if isinstance(q_table, dict):
+                q_table = self._dense_from_dict(q_table, shape)
+            if self.layout is None or q_table.shape[:2] != self.layout.shape:
+                raise ValueError("A compact Q-table is laid out for one maze, call prepare_q_table(maze) first")
+            self._set_compact_values(self.layout.compact(q_table, self.compact_dtype))
+            return
+        if self.q_backend == "dense" and isinstance(q_table, dict):
+            q_table = self._dense_from_dict(q_table, shape)
+        elif self.q_backend == "dense":
+            # float32 arrays (including copy-on-write memmaps) are used as they are, no copy
+            q_table = np.asarray(q_table)
+            if q_table.dtype != np.float32 or not q_table.flags.writeable:
+                q_table = q_table.astype(np.float32)
+        elif isinstance(q_table, np.ndarray):
+            q_table = self._dict_from_dense(q_table)
+        self.q_table = q_table
+
+    @staticmethod
+    def _check_legacy_table(q_table, shape=None):
+        # an old pickle is only a table if it is {(row, col): NUM_ACTIONS values} or a (rows, cols, NUM_ACTIONS) array
+        # raises QTableFormatError for anything else, or for cells outside shape
+        if isinstance(q_table, np.ndarray):
+            if q_table.ndim != 3 or q_table.shape[2] != NUM_ACTIONS:
+                raise QTableFormatError(f"array of shape {q_table.shape} is not a (rows, cols, {NUM_ACTIONS}) Q-table")
+            if shape is not None and q_table.shape[:2] != tuple(shape):
+                raise QTableFormatError(f"table is {q_table.shape[0]}x{q_table.shape[1]}, expected {shape[0]}x{shape[1]}")
+            return
+        if not isinstance(q_table, dict):
+            raise QTableFormatError(f"expected a dict or an array, got {type(q_table).__name__}")
+        for state, values in q_table.items():
+            if (not isinstance(state, tuple) or len(state) != 2
+                    or not all(isinstance(i, (int, np.integer)) and not isinstance(i, bool) and i >= 0 for i in state)):
+                raise QTableFormatError(f"state {state!r} is not a (row, col) cell")
+            if np.shape(values) != (NUM_ACTIONS,):
+                raise QTableFormatError(f"state {state} has {np.shape(values)} values, expected {NUM_ACTIONS}")
+            if shape is not None and (state[0] >= shape[0] or state[1] >= shape[1]):
+                raise QTableFormatError(f"state {state} is outside a {shape[0]}x{shape[1]} maze")
+
+    @staticmethod
+    def _dense_from_dict(q_dict, shape=None):
+        # converts an old pickled {(row, col): array} table into the dense layout
+        if shape is None:
+            # +2 to cover the outer wall ring, which is never stored in the dict
+            shape = (max(r for r, _ in q_dict) + 2, max(c for _, c in q_dict) + 2) if q_dict else (1, 1)
+        dense = np.zeros((shape[0], shape[1], NUM_ACTIONS), dtype=np.float32)
+        for (row, col), values in q_dict.items():
+            dense[row, col] = values
+        return dense
+
+    @staticmethod
+    def _dict_from_dense(q_dense):
+        # only cells that were ever updated are kept, everything else is created lazily again
+        return {(int(r), int(c)): q_dense[r, c].astype(np.float64)
+                for r, c in zip(*np.nonzero(q_dense.any(axis=2)))}
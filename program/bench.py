@@ -0,0 +1,515 @@
+import os
+import sys
+import json
+import time
+import random
+import pickle
+import platform
+import tempfile
+import subprocess
+import argparse
+from collections import deque
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+from maze import Maze
+from agent import RLAgent, Q_BACKENDS
+from generators import GENERATORS
+from pathfinding import bidirectional_bfs, astar, distance_field
+from constants import ACTION_MAP, NUM_ACTIONS, COLOR_INFO_TEXT
+from qtable_io import save_q_array, load_q_array, load_legacy_pickle
+from metrics import EarlyStopping
+from planning import value_iteration, dyna_q, graph_q, q_lambda, prioritized_sweeping
+from kernels import HAVE_NUMBA
+from general import GeneralAgent
+from graph import MazeGraph
+from corpus import write_corpus, iter_corpus
+
+# small standalone benchmarks, run e.g. `python bench.py qtable`
+# all the normal training output is swallowed so only the results are printed
+# every maze, generator and agent is seeded, so two runs do exactly the same work and only the timings move:
+#
+#   python bench.py --save baseline.json          (on the old version)
+#   python bench.py --compare baseline.json       (on the new one, prints what got faster or slower)
+
+# bench/case -> {metric: value}, filled by _record as the benchmarks run
+RESULTS = {}
+# metrics with these endings are timings, everything else is a result that should not change between runs
+TIMING_SUFFIXES = ('seconds', '_ms', 'per_sec')
+
+
+def _quiet(func, *args, **kwargs):
+    # runs func without its progress prints
+    with redirect_stdout(StringIO()):
+        return func(*args, **kwargs)
+
+
+def _make_agent(**kwargs):
+    params = dict(learning_rate=0.5, discount_factor=0.99, epsilon_start=1.0,
+                  epsilon_end=0.01, epsilon_decay=0.9998, step_penalty=-0.1, seed=0)
+    params.update(kwargs)
+    return _quiet(RLAgent, **params)
+
+
+def _record(bench, case, **metrics):
+    RESULTS[f"{bench}/{case}"] = metrics
+
+
+def bench_qtable(sizes=((21, 31), (51, 51), (101, 151)), episodes=200):
+    # training steps/sec of every Q-table backend on the same maze
+    print(f"{'maze':>10} {'backend':>8} {'steps':>10} {'seconds':>8} {'steps/sec':>12}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        for backend in Q_BACKENDS:
+            agent = _make_agent(q_backend=backend)
+            start = time.perf_counter()
+            steps = _quiet(agent.train, maze, episodes)
+            elapsed = time.perf_counter() - start
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {backend:>8} {steps:>10} {elapsed:>8.2f} {steps / elapsed:>12,.0f}")
+            _record('qtable', f"{maze.rows}x{maze.cols}/{backend}", steps=steps, steps_per_sec=steps / elapsed)
+
+
+def bench_batched(sizes=((21, 31), (101, 151)), episodes=256, env_counts=(64, 256)):
+    # transitions/sec of the batched trainer against the single episode dense trainer
+    print(f"{'maze':>10} {'trainer':>12} {'steps':>10} {'seconds':>8} {'steps/sec':>12}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        runs = [('train', lambda agent: agent.train(maze, episodes))]
+        runs += [(f'batched x{n}', lambda agent, n=n: agent.train_batched(maze, episodes, num_envs=n)) for n in env_counts]
+        for label, run in runs:
+            agent = _make_agent(q_backend="dense")
+            start = time.perf_counter()
+            steps = _quiet(run, agent)
+            elapsed = time.perf_counter() - start
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {label:>12} {steps:>10} {elapsed:>8.2f} {steps / elapsed:>12,.0f}")
+            _record('batched', f"{maze.rows}x{maze.cols}/{label}", steps=steps, steps_per_sec=steps / elapsed)
+
+
+def bench_generators(sizes=(101, 501, 2001)):
+    # cells/sec of every generation algorithm on square mazes
+    print(f"{'algorithm':>12} {'size':>6} {'seconds':>8} {'cells/sec':>12}")
+    for name, generate in GENERATORS.items():
+        for size in sizes:
+            start = time.perf_counter()
+            walls = generate(size, size, random.Random(size))
+            elapsed = time.perf_counter() - start
+            print(f"{name:>12} {size:>6} {elapsed:>8.2f} {size * size / elapsed:>12,.0f}")
+            _record('generators', f"{name}/{size}", walls=int(walls.sum()), cells_per_sec=size * size / elapsed)
+
+
+def _tuple_bfs(maze):
+    # the original Maze._find_shortest_path_bfs: (row, col) tuples in a set and a deque
+    queue = deque([(maze.start_pos, 0)])
+    visited = {maze.start_pos}
+    walls = maze.walls.tolist()
+    while queue:
+        (row, col), distance = queue.popleft()
+        if (row, col) == maze.exit_pos:
+            return distance
+        for row_delta, col_delta, _ in ACTION_MAP.values():
+            next_row, next_col = row + row_delta, col + col_delta
+            if 0 <= next_row < maze.rows and 0 <= next_col < maze.cols and \
+               not walls[next_row][next_col] and (next_row, next_col) not in visited:
+                visited.add((next_row, next_col))
+                queue.append(((next_row, next_col), distance + 1))
+    return -1
+
+
+def bench_pathfinding(sizes=(101, 501, 1001), algorithms=('backtracker', 'kruskal')):
+    # shortest path searches against the original tuple based BFS
+    searches = {
+        'tuple bfs': _tuple_bfs,
+        'bidir bfs': lambda maze: bidirectional_bfs(maze.walls, maze.start_pos, maze.exit_pos),
+        'astar': lambda maze: len(astar(maze.walls, maze.start_pos, maze.exit_pos)) - 1,
+        'dist field': lambda maze: int(distance_field(maze.walls, maze.exit_pos)[maze.start_pos]),
+        'dijkstra': lambda maze: len(MazeGraph(maze).shortest_path()) - 1,
+    }
+    print(f"{'algorithm':>12} {'size':>6} {'search':>12} {'length':>8} {'ms':>10}")
+    for algorithm in algorithms:
+        for size in sizes:
+            maze = _quiet(Maze, size, size, algorithm=algorithm, seed=size)
+            for label, search in searches.items():
+                start = time.perf_counter()
+                length = search(maze)
+                elapsed = time.perf_counter() - start
+                print(f"{algorithm:>12} {size:>6} {label:>12} {length:>8} {elapsed * 1000:>10.1f}")
+                _record('pathfinding', f"{algorithm}/{size}/{label}", length=length, search_ms=elapsed * 1000)
+
+
+def bench_persistence(sizes=(101, 501, 1001)):
+    # Q-table save/load latency and file size: the old pickled dict against the binary format
+    print(f"{'size':>6} {'format':>14} {'MB':>8} {'save ms':>9} {'load ms':>9} {'load+read ms':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            q_array = np.random.default_rng(size).random((size, size, NUM_ACTIONS)).astype(np.float32)
+            # a dict entry for roughly every path cell, like a trained dict backend
+            q_dict = {(r, c): q_array[r, c].astype(np.float64) for r in range(1, size, 2) for c in range(1, size)}
+            path = os.path.join(directory, f"q_{size}")
+
+            def save_pickle():
+                with open(path, 'wb') as f:
+                    pickle.dump(q_dict, f)
+
+            formats = {
+                'pickle dict': (save_pickle, lambda: load_legacy_pickle(path), lambda table: sum(v[0] for v in table.values())),
+                'binary f32': (lambda: save_q_array(path, q_array), lambda: load_q_array(path), lambda table: table.sum(dtype=np.float64)),
+                'binary f16': (lambda: save_q_array(path, q_array, np.float16), lambda: load_q_array(path), lambda table: table.sum(dtype=np.float64)),
+            }
+            for label, (save, load, read) in formats.items():
+                start = time.perf_counter()
+                save()
+                save_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                table = load()
+                load_ms = (time.perf_counter() - start) * 1000
+                read(table)
+                read_ms = (time.perf_counter() - start) * 1000
+                megabytes = os.path.getsize(path) / 1e6
+                print(f"{size:>6} {label:>14} {megabytes:>8.2f} {save_ms:>9.1f} {load_ms:>9.2f} {read_ms:>13.1f}")
+                _record('persistence', f"{size}/{label}", megabytes=megabytes, save_ms=save_ms, load_ms=load_ms, read_ms=read_ms)
+                del table
+
+
+def bench_solvers(sizes=((11, 15), (21, 31), (41, 61)), max_episodes=20000):
+    # time until the greedy policy is optimal: plain Q-learning against the model based solvers
+    # the episodic solvers stop at the first two checks in a row (10 episodes apart) with the shortest path
+    print(f"{'maze':>10} {'solver':>16} {'episodes':>9} {'seconds':>8} {'steps':>6} {'optimal':>8}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        runs = {
+            'q_learning': lambda agent, callbacks: agent.train(maze, max_episodes, callbacks=callbacks),
+            'dyna_q': lambda agent, callbacks: dyna_q(agent, maze, max_episodes, 5, callbacks=callbacks),
+            'value_iteration': lambda agent, callbacks: value_iteration(agent, maze),
+            'graph_q': lambda agent, callbacks: graph_q(agent, maze, max_episodes, callbacks=callbacks),
+            'q_lambda': lambda agent, callbacks: q_lambda(agent, maze, max_episodes, callbacks=callbacks),
+            'prioritized': lambda agent, callbacks: prioritized_sweeping(agent, maze, max_episodes, 5, callbacks=callbacks),
+        }
+        for label, run in runs.items():
+            agent = _make_agent(q_backend="dense", reward_shaping="path")
+            early_stop = EarlyStopping(check_every=10, patience=1)
+            start = time.perf_counter()
+            _quiet(run, agent, [early_stop])
+            elapsed = time.perf_counter() - start
+            solved, steps = agent.greedy_rollout(maze)
+            optimal = solved and steps == maze.shortest_path_length
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {label:>16} {agent.episodes_trained:>9} {elapsed:>8.2f} {steps:>6} {str(optimal):>8}")
+            _record('solvers', f"{maze.rows}x{maze.cols}/{label}", episodes=agent.episodes_trained, steps=steps, optimal=optimal, seconds=elapsed)
+
+
+def bench_jit(sizes=((21, 31), (101, 101), (301, 301)), episodes=20):
+    # transitions/sec of the compiled kernel against the python trainer (dense backend for both)
+    # the kernel is compiled (or loaded from numba's cache) by a warm-up run first, which isn't timed
+    if not HAVE_NUMBA:
+        print("numba is not installed, train_jit would just run the python trainer")
+        return
+    _quiet(_make_agent(q_backend="dense").train_jit, _quiet(Maze, 7, 7, seed=0), 1)
+    print(f"{'maze':>10} {'trainer':>8} {'steps':>10} {'seconds':>8} {'steps/sec':>12} {'speedup':>8}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        python_rate = None
+        for label in ('train', 'jit'):
+            agent = _make_agent(q_backend="dense")
+            run = agent.train if label == 'train' else agent.train_jit
+            start = time.perf_counter()
+            steps = _quiet(run, maze, episodes)
+            elapsed = time.perf_counter() - start
+            rate = steps / elapsed
+            python_rate = python_rate or rate
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {label:>8} {steps:>10} {elapsed:>8.2f} {rate:>12,.0f} {rate / python_rate:>7.1f}x")
+            _record('jit', f"{maze.rows}x{maze.cols}/{label}", steps=steps, steps_per_sec=rate)
+
+
+def bench_general(sizes=((21, 31), (51, 51), (101, 101), (301, 301)), algorithms=('backtracker', 'kruskal'),
+                  training_mazes=40, episodes=100):
+    # the --general agent: trained once on small mazes, then played on bigger unseen ones with no training at all
+    # efficiency is shortest_path_length / steps like in evaluate.py
+    mazes = [_quiet(Maze, *random.Random(i).choice(((11, 15), (15, 21), (21, 31))), seed=i) for i in range(training_mazes)]
+    agent = _quiet(GeneralAgent, learning_rate=0.5, discount_factor=0.99, epsilon_start=1.0, epsilon_end=0.01,
+                   epsilon_decay=0.01 ** (1 / (training_mazes * episodes)), step_penalty=-0.1, seed=0)
+    start = time.perf_counter()
+    _quiet(agent.train_many, mazes, episodes)
+    elapsed = time.perf_counter() - start
+    print(f"trained once on {training_mazes} mazes x {episodes} episodes in {elapsed:.2f}s")
+    _record('general', "train", episodes=agent.episodes_trained, seconds=elapsed)
+
+    print(f"{'maze':>10} {'algorithm':>12} {'steps':>7} {'shortest':>9} {'efficiency':>11} {'seconds':>8}")
+    for rows, cols in sizes:
+        for algorithm in algorithms:
+            maze = _quiet(Maze, rows, cols, algorithm=algorithm, seed=rows * cols)
+            start = time.perf_counter()
+            solved, steps = agent.greedy_rollout(maze)
+            elapsed = time.perf_counter() - start
+            efficiency = maze.shortest_path_length / steps * 100 if solved else 0.0
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {algorithm:>12} {steps:>7} {maze.shortest_path_length:>9} {efficiency:>10.1f}% {elapsed:>8.3f}")
+            _record('general', f"{maze.rows}x{maze.cols}/{algorithm}", solved=solved, steps=steps, efficiency=round(efficiency, 2), seconds=elapsed)
+
+
+def _run_python(*args):
+    # a fresh interpreter in this directory, without pygame's hello message
+    environment = {**os.environ, 'PYGAME_HIDE_SUPPORT_PROMPT': "1"}
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), env=environment)
+
+
+def bench_memory(sizes=(101, 1001)):
+    # Q-table memory of every backend for a fully explored maze (a value for every open cell)
+    # the dict is filled the way training fills it, one float64 array per state
+    print(f"{'maze':>10} {'backend':>16} {'MB':>9} {'bytes/state':>12}")
+    for size in sizes:
+        maze = _quiet(Maze, size, size, seed=size)
+        open_states = int((~maze.walls).sum())
+        backends = {
+            'dict': dict(q_backend="dict"),
+            'dense': dict(q_backend="dense"),
+            'compact float32': dict(q_backend="compact", compact_dtype="float32"),
+            'compact float16': dict(q_backend="compact", compact_dtype="float16", mask_actions=True),
+        }
+        for label, kwargs in backends.items():
+            agent = _make_agent(**kwargs)
+            agent.prepare_q_table(maze)
+            if agent.q_backend == "dict":
+                for row, col in zip(*np.nonzero(~maze.walls)):
+                    agent._initialize_q_table_for_state((int(row), int(col)))
+            q_bytes = agent.q_table_bytes()
+            print(f"{f'{maze.rows}x{maze.cols}':>10} {label:>16} {q_bytes / 2 ** 20:>9.2f} {q_bytes / open_states:>12.1f}")
+            _record('memory', f"{maze.rows}x{maze.cols}/{label}", q_bytes=q_bytes, bytes_per_state=round(q_bytes / open_states, 2))
+
+
+def _import_ms(module):
+    # cumulative import time of module in a fresh interpreter, from python -X importtime
+    result = _run_python("-X", "importtime", "-c", f"import {module}")
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].rstrip() == f" {module}":
+            return int(fields[1]) / 1000
+    raise ValueError(f"no import time for {module}")
+
+
+def bench_startup(modules=('maze', 'agent', 'session', 'evaluate', 'service', 'main', 'game'),
+                  scripts=('main.py', 'evaluate.py'), repeats=5):
+    # import time of the entry points and the core modules (best of repeats fresh interpreters each),
+    # and the wall clock of `python <script> --help`
+    # heavy is whether importing the module loads pygame or numba; only game (the window) and train_jit should
+    print(f"{'module':>12} {'import ms':>10} {'heavy':>14}")
+    for module in modules:
+        import_ms = min(_import_ms(module) for _ in range(repeats))
+        check = f"import sys, {module}; print(' '.join(m for m in ('pygame', 'numba') if m in sys.modules) or '-')"
+        heavy = _run_python("-c", check).stdout.strip()
+        print(f"{module:>12} {import_ms:>10.1f} {heavy:>14}")
+        _record('startup', f"import/{module}", heavy=heavy, import_ms=import_ms)
+
+    print(f"{'script':>12} {'--help ms':>10}")
+    for script in scripts:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _run_python(script, "--help")
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{script:>12} {min(timings):>10.1f}")
+        _record('startup', f"help/{script}", help_ms=min(timings))
+
+
+def bench_rendering(sizes=((21, 31), (51, 71)), frames=300):
+    # Game frame times on SDL's dummy video driver, so this runs without a window (e.g. in CI)
+    # "full" redraws the whole window like the first frame, "dirty" is the per-step update of Game.run
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    from game import Game
+
+    print(f"{'maze':>10} {'surface ms':>11} {'full ms':>9} {'dirty ms':>9}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        agent = _make_agent(q_backend="dense")
+        _quiet(value_iteration, agent, maze)
+        game = Game(maze, agent)
+
+        start = time.perf_counter()
+        game._build_maze_surface()
+        surface_ms = (time.perf_counter() - start) * 1000
+        frame_ms = {}
+        for label, old_tile in (('full', None), ('dirty', maze.start_pos)):
+            start = time.perf_counter()
+            for _ in range(frames):
+                game._draw_frame(0, "Solving...", COLOR_INFO_TEXT, old_tile)
+            frame_ms[label] = (time.perf_counter() - start) * 1000 / frames
+        print(f"{f'{maze.rows}x{maze.cols}':>10} {surface_ms:>11.2f} {frame_ms['full']:>9.3f} {frame_ms['dirty']:>9.3f}")
+        _record('rendering', f"{maze.rows}x{maze.cols}", surface_ms=surface_ms, full_frame_ms=frame_ms['full'], dirty_frame_ms=frame_ms['dirty'])
+    pygame.quit()
+
+
+def save_results(filepath):
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'numba': HAVE_NUMBA}
+    with open(filepath, 'w') as f:
+        json.dump({'environment': environment, 'results': RESULTS}, f, indent=2)
+    print(f"\nResults written to {filepath}")
+
+
+def compare_results(filepath, threshold=0.1):
+    # compares this run with a file written by save_results
+    # timings more than threshold (a fraction) worse or better are flagged, any other metric that differs at all
+    # means the benchmark no longer does the same work, so its timings aren't comparable
+    with open(filepath) as f:
+        baseline = json.load(f)['results']
+    print(f"\n--- compared with {filepath} ---")
+    print(f"{'case':>40} {'metric':>16} {'before':>14} {'after':>14} {'change':>8}")
+    slower = 0
+    for case, metrics in RESULTS.items():
+        if case not in baseline:
+            continue
+        for metric, value in metrics.items():
+            before = baseline[case].get(metric)
+            if before is None:
+                continue
+            if not metric.endswith(TIMING_SUFFIXES):
+                if before != value:
+                    print(f"{case:>40} {metric:>16} {before!s:>14} {value!s:>14} {'CHANGED':>8}")
+                continue
+            # positive change = faster, whichever way round the metric goes
+            change = (value / before - 1) if metric.endswith('per_sec') else (before / value - 1) if value else 0.0
+            flag = ""
+            if change < -threshold:
+                flag = " slower"
+                slower += 1
+            elif change > threshold:
+                flag = " faster"
+            print(f"{case:>40} {metric:>16} {before:>14,.3f} {value:>14,.3f} {change:>+8.0%}{flag}")
+    print(f"{slower} timing(s) more than {threshold:.0%} slower")
+
+
+def bench_graph(sizes=((101, 151), (301, 301), (1001, 1001)), algorithms=('backtracker', 'kruskal'),
+                training_sizes=((21, 31), (41, 61), (61, 91), (101, 151)), max_episodes=20000, max_cell_cells=6000):
+    # the junction graph: states left once corridors are edges (and with dead ends pruned), time to build it
+    # and to search it (dijkstra in the pathfinding bench is build plus search)
+    print(f"{'algorithm':>12} {'maze':>10} {'open cells':>11} {'nodes':>8} {'pruned':>7} {'build ms':>9} {'search ms':>10}")
+    for algorithm in algorithms:
+        for rows, cols in sizes:
+            maze = _quiet(Maze, rows, cols, algorithm=algorithm, seed=rows * cols)
+            start = time.perf_counter()
+            graph = MazeGraph(maze)
+            build_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            length = len(graph.shortest_path()) - 1
+            search_ms = (time.perf_counter() - start) * 1000
+            pruned = MazeGraph(maze, prune_dead_ends=True).num_nodes
+            open_cells = int((~maze.walls).sum())
+            print(f"{algorithm:>12} {f'{rows}x{cols}':>10} {open_cells:>11} {graph.num_nodes:>8} {pruned:>7} {build_ms:>9.1f} {search_ms:>10.1f}")
+            _record('graph', f"{algorithm}/{rows}x{cols}", open_cells=open_cells, nodes=graph.num_nodes, pruned_nodes=pruned,
+                    length=length, build_ms=build_ms, search_ms=search_ms)
+
+    # training until the greedy path is optimal, cell Q-learning against graph_q (cell Q-learning only up to
+    # max_cell_cells cells, it takes minutes beyond); gamma 0.999 so the exit reward still reaches the start of
+    # the longer paths, at 0.99 it is discounted below the cost of going in circles
+    print(f"{'maze':>10} {'algorithm':>12} {'solver':>11} {'states':>7} {'episodes':>9} {'seconds':>8} {'optimal':>8}")
+    for algorithm in algorithms:
+        for rows, cols in training_sizes:
+            maze = _quiet(Maze, rows, cols, algorithm=algorithm, seed=rows * cols)
+            runs = {'graph_q': lambda agent, callbacks: graph_q(agent, maze, max_episodes, callbacks=callbacks)}
+            if rows * cols <= max_cell_cells:
+                runs['q_learning'] = lambda agent, callbacks: agent.train(maze, max_episodes, callbacks=callbacks)
+            for label, run in runs.items():
+                agent = _make_agent(q_backend="dense", discount_factor=0.999, epsilon_decay=0.99)
+                start = time.perf_counter()
+                _quiet(run, agent, [EarlyStopping(check_every=10, patience=2)])
+                elapsed = time.perf_counter() - start
+                solved, steps = agent.greedy_rollout(maze)
+                optimal = solved and steps == maze.shortest_path_length
+                states = MazeGraph(maze).num_nodes if label == "graph_q" else int((~maze.walls).sum())
+                print(f"{f'{rows}x{cols}':>10} {algorithm:>12} {label:>11} {states:>7} {agent.episodes_trained:>9} {elapsed:>8.2f} {str(optimal):>8}")
+                _record('graph', f"{algorithm}/{rows}x{cols}/{label}", states=states, episodes=agent.episodes_trained,
+                        optimal=optimal, seconds=elapsed)
+
+
+def bench_corpus(count=2000, sizes=((21, 31), (101, 101)), worker_counts=(0, 2), shard_size=500):
+    # corpus.py: generating a corpus (no pool and across processes), its size on disk, and reading it back
+    # against generating the same mazes again
+    print(f"{'maze':>10} {'workers':>8} {'write/sec':>10} {'bytes/maze':>11} {'read/sec':>10} {'packed/sec':>11} {'generate/sec':>13}")
+    for rows, cols in sizes:
+        config = {'count': count, 'rows': rows, 'cols': cols, 'vary_size': False, 'algorithm': "backtracker",
+                  'seed': 0, 'shard_size': shard_size}
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                index = write_corpus(directory, {**config, 'workers': workers})
+                write_rate = count / (time.perf_counter() - start)
+                bytes_per_maze = sum(shard['bytes'] for shard in index['shards']) / count
+                start = time.perf_counter()
+                lengths = [maze.shortest_path_length for maze in iter_corpus(directory)]
+                read_rate = count / (time.perf_counter() - start)
+                start = time.perf_counter()
+                for maze in iter_corpus(directory, packed=True):
+                    pass
+                packed_rate = count / (time.perf_counter() - start)
+            start = time.perf_counter()
+            generated = min(count, 200)
+            for index in range(generated):
+                _quiet(Maze, rows, cols, seed=index)
+            generate_rate = generated / (time.perf_counter() - start)
+            print(f"{f'{rows}x{cols}':>10} {workers:>8} {write_rate:>10.0f} {bytes_per_maze:>11.1f} {read_rate:>10.0f} {packed_rate:>11.0f} {generate_rate:>13.0f}")
+            _record('corpus', f"{rows}x{cols}/{workers} workers", total_length=sum(lengths), bytes_per_maze=round(bytes_per_maze, 1),
+                    write_per_sec=write_rate, read_per_sec=read_rate, packed_read_per_sec=packed_rate, generate_per_sec=generate_rate)
+
+
+def bench_credit(sizes=((21, 31), (41, 61)), decays=(0.99, 0.9998), max_episodes=3000):
+    # episodes until the greedy policy is optimal for the update rules, with main.py's default manhattan shaping:
+    # one-step Q-learning (train), Q(lambda) and prioritized sweeping, with fast and slow epsilon decay
+    # (Watkins's Q(lambda) cuts its traces at every exploratory action, so its traces only help once epsilon is
+    # low, with the fast decay; with the slow one what it gains comes from never trying moves into walls)
+    print(f"{'maze':>10} {'decay':>7} {'rule':>12} {'episodes':>9} {'seconds':>8} {'steps':>6} {'optimal':>8}")
+    for rows, cols in sizes:
+        maze = _quiet(Maze, rows, cols, seed=rows * cols)
+        runs = {
+            'one-step': lambda agent, callbacks: agent.train(maze, max_episodes, callbacks=callbacks),
+            'q_lambda': lambda agent, callbacks: q_lambda(agent, maze, max_episodes, callbacks=callbacks),
+            'prioritized': lambda agent, callbacks: prioritized_sweeping(agent, maze, max_episodes, 10, callbacks=callbacks),
+        }
+        for decay in decays:
+            for label, run in runs.items():
+                agent = _make_agent(q_backend="dense", epsilon_decay=decay)
+                start = time.perf_counter()
+                _quiet(run, agent, [EarlyStopping(check_every=10, patience=1)])
+                elapsed = time.perf_counter() - start
+                solved, steps = agent.greedy_rollout(maze)
+                optimal = solved and steps == maze.shortest_path_length
+                print(f"{f'{maze.rows}x{maze.cols}':>10} {decay:>7} {label:>12} {agent.episodes_trained:>9} {elapsed:>8.2f} {steps:>6} {str(optimal):>8}")
+                _record('credit', f"{maze.rows}x{maze.cols}/{decay}/{label}", episodes=agent.episodes_trained, steps=steps,
+                        optimal=optimal, seconds=elapsed)
+
+
+BENCHMARKS = {
+    'qtable': bench_qtable,
+    'batched': bench_batched,
+    'generators': bench_generators,
+    'pathfinding': bench_pathfinding,
+    'persistence': bench_persistence,
+    'solvers': bench_solvers,
+    'jit': bench_jit,
+    'general': bench_general,
+    'graph': bench_graph,
+    'corpus': bench_corpus,
+    'credit': bench_credit,
+    'memory': bench_memory,
+    'startup': bench_startup,
+    'rendering': bench_rendering,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the maze solver.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all).")
+    parser.add_argument("--save", help="Write the results to this JSON file (e.g. a baseline).")
+    parser.add_argument("--compare", help="Compare the results with a JSON file written by --save.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Timing change (fraction) flagged by --compare.")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+    for name in args.names or BENCHMARKS:
+        print(f"\n--- {name} ---")
+        BENCHMARKS[name]()
+    if args.save:
+        save_results(args.save)
+    if args.compare:
+        compare_results(args.compare, args.threshold)
+    sys.exit()
@@ -0,0 +1,72 @@
+import weakref
+
+import numpy as np
+
+from constants import ACTION_MAP, NUM_ACTIONS
+
+# layout of the "compact" Q-table backend, for mazes too big for a dense table or a dict
+# about half of a perfect maze is wall and the agent never stands on a wall, so only open cells get a row:
+#   cell_index  (rows, cols) int32, the row of every cell in the agent's values array, -1 for walls
+#   values      (open cells, NUM_ACTIONS) float16 or float32, one contiguous array (held by the agent as q_table)
+# saved tables and the cache still use the dense (rows, cols, NUM_ACTIONS) layout, see expand() / compact()
+
+COMPACT_DTYPES = ("float16", "float32")
+
+# the legal actions of every legal mask (bit a set = action a doesn't walk into a wall or off the maze)
+# a cell with no legal move at all can't be left anyway, it gets every action
+LEGAL_BY_MASK = [[action for action in range(NUM_ACTIONS) if mask >> action & 1] or list(range(NUM_ACTIONS))
+                 for mask in range(1 << NUM_ACTIONS)]
+
+
+class CompactLayout:
+    def __init__(self, maze):
+        walls = maze.walls
+        self.shape = walls.shape
+        # to tell whether a maze is the one this layout is for, without touching its grid again
+        self.maze = weakref.ref(maze)
+        self.packed_walls = maze.packed_walls
+        open_cells = np.flatnonzero(~walls.ravel())
+        self.num_open = len(open_cells)
+        self.cell_index = np.full(walls.shape, -1, dtype=np.int32)
+        self.cell_index.reshape(-1)[open_cells] = np.arange(self.num_open, dtype=np.int32)
+
+        # (open cells,) uint8 legal action masks, for masking illegal actions
+        rows, cols = self.shape
+        padded = np.ones((rows + 2, cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = walls
+        masks = np.zeros(walls.shape, dtype=np.uint8)
+        for action in range(NUM_ACTIONS):
+            row_delta, col_delta, _ = ACTION_MAP[action]
+            blocked = padded[1 + row_delta:rows + 1 + row_delta, 1 + col_delta:cols + 1 + col_delta]
+            masks |= (~blocked).astype(np.uint8) << action
+        self.legal_masks = masks.ravel()[open_cells]
+
+    def matches(self, maze):
+        # called on every start_episode, so the same maze and other sizes are answered without reading any walls
+        if self.maze() is maze:
+            return True
+        if (maze.rows, maze.cols) != self.shape:
+            return False
+        return np.array_equal(maze.packed_walls, self.packed_walls)
+
+    def open_cells(self):
+        # flat cell of every row of the values array
+        return np.flatnonzero(self.cell_index.ravel() >= 0)
+
+    def illegal(self):
+        # (open cells, NUM_ACTIONS) bool, True where the action is blocked
+        return (self.legal_masks[:, None] >> np.arange(NUM_ACTIONS, dtype=np.uint8) & 1) == 0
+
+    def compact(self, dense, dtype):
+        # (rows, cols, NUM_ACTIONS) -> (open cells, NUM_ACTIONS)
+        return np.asarray(dense).reshape(-1, NUM_ACTIONS)[self.open_cells()].astype(dtype)
+
+    def expand(self, values):
+        # (open cells, NUM_ACTIONS) -> (rows, cols, NUM_ACTIONS) float32, walls all 0 like an untrained dense table
+        dense = np.zeros((*self.shape, NUM_ACTIONS), dtype=np.float32)
+        dense.reshape(-1, NUM_ACTIONS)[self.open_cells()] = values
+        return dense
+
+    def nbytes(self):
+        # memory of the layout itself, on top of the values array
+        return self.cell_index.nbytes + self.legal_masks.nbytes + self.packed_walls.nbytes
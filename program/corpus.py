@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import random
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from generators import GENERATORS
+from maze import Maze
+from session import derive_seed
+
+# fixed maze corpora for regression runs and benchmarks, e.g. 50000 seeded mazes generated once and read back
+# any number of times without generating or searching anything:
+#
+#   python corpus.py corpus_21x31 --count 50000 --rows 21 --cols 31 --seed 0 --workers 4
+#   python evaluate.py --load_mazes corpus_21x31
+#
+# a corpus is a directory of shards plus index.json (the settings and every shard's file, first maze and count)
+# each shard is a compressed .npz of shard_size mazes:
+#   packed               every maze's np.packbits(walls, axis=1) grid, flattened and concatenated (uint8)
+#   offsets              where maze i's grid is in packed: packed[offsets[i]:offsets[i + 1]]
+#   rows, cols, start_pos, exit_pos, shortest_path_length, seed
+# maze i gets the seeds evaluate.py gives its maze i (derive_seed), so the corpus doesn't depend on how the work
+# was split between workers, and --seed 0 here is the same mazes as `evaluate.py --seed 0` (--vary_size draws
+# the sizes per maze instead of from one session rng, so those sizes differ)
+# iter_corpus() reads the grids out of each shard's zip one maze at a time, never a whole shard
+
+INDEX_FILE = "index.json"
+METADATA_KEYS = ('offsets', 'rows', 'cols', 'start_pos', 'exit_pos', 'shortest_path_length', 'seed')
+
+
+def corpus_maze(config, index):
+    # maze index of the corpus config describes
+    seed = derive_seed(config['seed'], "maze", index)
+    rows, cols = config['rows'], config['cols']
+    if config['vary_size']:
+        # same ranges as evaluate.py --vary_size, but drawn per maze
+        size_rng = random.Random(derive_seed(config['seed'], "size", index))
+        rows = max(7, rows + size_rng.randint(-2, 2) * 2)
+        cols = max(7, cols + size_rng.randint(-3, 3) * 2)
+    return Maze(rows, cols, algorithm=config['algorithm'], seed=derive_seed(seed, "maze"), verbose=False), seed
+
+
+def write_shard(directory, number, first, count, config):
+    # generates mazes first .. first + count - 1 into one shard, returns its index entry
+    grids = []
+    metadata = {key: [] for key in METADATA_KEYS if key != 'offsets'}
+    for index in range(first, first + count):
+        maze, seed = corpus_maze(config, index)
+        grids.append(maze.packed_walls.ravel())
+        metadata['rows'].append(maze.rows)
+        metadata['cols'].append(maze.cols)
+        metadata['start_pos'].append(maze.start_pos)
+        metadata['exit_pos'].append(maze.exit_pos)
+        metadata['shortest_path_length'].append(maze.shortest_path_length)
+        metadata['seed'].append(seed)
+
+    filename = f"shard-{number:05d}.npz"
+    path = os.path.join(directory, filename)
+    np.savez_compressed(
+        path,
+        packed=np.concatenate(grids),
+        offsets=np.concatenate(([0], np.cumsum([len(grid) for grid in grids]))).astype(np.int64),
+        rows=np.array(metadata['rows'], dtype=np.int32),
+        cols=np.array(metadata['cols'], dtype=np.int32),
+        start_pos=np.array(metadata['start_pos'], dtype=np.int32).reshape(-1, 2),
+        exit_pos=np.array(metadata['exit_pos'], dtype=np.int32).reshape(-1, 2),
+        shortest_path_length=np.array(metadata['shortest_path_length'], dtype=np.int32),
+        seed=np.array(metadata['seed'], dtype=np.uint64),
+    )
+    return {'file': filename, 'first': first, 'count': count, 'bytes': os.path.getsize(path)}
+
+
+def write_corpus(directory, config):
+    # generates config['count'] mazes into directory, config['workers'] processes writing whole shards
+    # (0 = all in this process); index.json is written last, so a corpus without one is incomplete
+    # a corpus has to be reproducible from its index, so an unseeded one gets a drawn seed that is recorded there
+    if config['seed'] is None:
+        config = {**config, 'seed': random.getrandbits(32)}
+    os.makedirs(directory, exist_ok=True)
+    shard_size = config['shard_size']
+    jobs = [(number, first, min(shard_size, config['count'] - first))
+            for number, first in enumerate(range(0, config['count'], shard_size))]
+    if config['workers'] > 0:
+        with ProcessPoolExecutor(max_workers=config['workers']) as executor:
+            futures = [executor.submit(write_shard, directory, number, first, count, config) for number, first, count in jobs]
+            shards = [future.result() for future in futures]
+    else:
+        shards = [write_shard(directory, number, first, count, config) for number, first, count in jobs]
+
+    index = {key: config[key] for key in ('count', 'rows', 'cols', 'vary_size', 'algorithm', 'seed', 'shard_size')}
+    index['shards'] = shards
+    with open(os.path.join(directory, INDEX_FILE + ".tmp"), 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(os.path.join(directory, INDEX_FILE + ".tmp"), os.path.join(directory, INDEX_FILE))
+    return index
+
+
+def read_index(directory):
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def iter_shard(filepath, algorithm=None, packed=False):
+    # yields the mazes of one shard in order as Maze.from_arrays (packed=True keeps the grids bit-packed)
+    # the small metadata arrays are loaded whole, the grids are decompressed from the zip as they are read
+    with np.load(filepath) as shard:
+        metadata = {key: shard[key].tolist() for key in METADATA_KEYS}
+    offsets = metadata['offsets']
+    with zipfile.ZipFile(filepath) as archive, archive.open("packed.npy") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            np.lib.format.read_array_header_2_0(f)
+        else:
+            raise ValueError(f"{filepath}: unsupported .npy format version {version[0]}.{version[1]} for the packed grids")
+        for i in range(len(offsets) - 1):
+            grid = np.frombuffer(f.read(offsets[i + 1] - offsets[i]), dtype=np.uint8)
+            yield Maze.from_arrays(grid, metadata['rows'][i], metadata['cols'][i], metadata['start_pos'][i],
+                                   metadata['exit_pos'][i], metadata['shortest_path_length'][i],
+                                   algorithm=algorithm, seed=metadata['seed'][i], packed=packed)
+
+
+def iter_corpus(directory, packed=False):
+    # every maze of a corpus in order, one shard open at a time
+    index = read_index(directory)
+    for shard in index['shards']:
+        yield from iter_shard(os.path.join(directory, shard['file']), index['algorithm'], packed)
+
+
+def get_corpus_config():
+    parser = argparse.ArgumentParser(description="Generate a seeded maze corpus as sharded .npz files.")
+    parser.add_argument("output", help="Directory to write the shards and index.json to.")
+    parser.add_argument("--count", type=int, default=10000, help="Number of mazes.")
+    parser.add_argument("--rows", type=int, default=21, help="Number of rows in each maze.")
+    parser.add_argument("--cols", type=int, default=31, help="Number of columns in each maze.")
+    parser.add_argument("--vary_size", action="store_true", help="Randomly vary maze sizes like evaluate.py --vary_size.")
+    parser.add_argument("--algorithm", choices=GENERATORS, default="backtracker", help="Maze generation algorithm.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus, maze i is the same as evaluate.py's maze i.")
+    parser.add_argument("--shard_size", type=int, default=1000, help="Mazes per shard file.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes generating shards (0 = no pool).")
+    return vars(parser.parse_args())
+
+
+if __name__ == "__main__":
+    config = get_corpus_config()
+    if config['count'] < 1 or config['shard_size'] < 1:
+        raise ValueError("--count and --shard_size must be at least 1")
+    start = time.perf_counter()
+    index = write_corpus(config['output'], config)
+    elapsed = time.perf_counter() - start
+    megabytes = sum(shard['bytes'] for shard in index['shards']) / 1e6
+    print(f"-> Wrote {index['count']} mazes in {len(index['shards'])} shards ({megabytes:.2f} MB) to {config['output']} "
+          f"in {elapsed:.2f}s ({index['count'] / elapsed:.0f} mazes/sec), seed {index['seed']}")
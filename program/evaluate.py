@@ -0,0 +1,206 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from contextlib import redirect_stdout, nullcontext
+from io import StringIO
+import random
+
+from maze import Maze
+from agent import Q_BACKENDS, REWARD_SHAPINGS
+from generators import GENERATORS
+from compact import COMPACT_DTYPES
+from corpus import iter_corpus
+from planning import SOLVERS
+from session import create_cache, derive_seed, prepare_agent, prepare_general_agent
+
+# headless batch evaluation: generate (or load) mazes, train agents and roll out the greedy policy
+# at full speed, then report the results as JSON or CSV
+# nothing in here imports pygame, so it is cheap to run in CI
+#
+#   python evaluate.py --num_mazes 100 --rows 21 --cols 31 --episodes 5000 --format csv --output results.csv
+#   python evaluate.py --general --num_mazes 100 --rows 51 --cols 51    (one agent for all mazes, no per-maze training)
+
+RESULT_FIELDS = ['maze', 'rows', 'cols', 'shortest_path_length', 'solved', 'steps', 'efficiency',
+                 'episodes', 'q_table_bytes', 'train_seconds', 'rollout_seconds']
+
+
+def load_mazes(filepath):
+    # reads mazes written by save_mazes, or every maze of a corpus directory (see corpus.py)
+    # a corpus is returned as iter_corpus's generator, so only the maze being evaluated is in memory
+    if os.path.isdir(filepath):
+        return iter_corpus(filepath)
+    with open(filepath) as f:
+        entries = json.load(f)
+    return [Maze.from_layout(entry['layout'], entry['start_pos'], entry['exit_pos'], entry.get('shortest_path_length'))
+            for entry in entries]
+
+
+def save_mazes(mazes, filepath):
+    entries = [{'layout': maze.layout, 'start_pos': maze.start_pos, 'exit_pos': maze.exit_pos,
+                'shortest_path_length': maze.shortest_path_length} for maze in mazes]
+    with open(filepath, 'w') as f:
+        json.dump(entries, f)
+
+
+def evaluate_maze(config, maze, cache=None, seed=None, agent=None):
+    # trains (or loads) an agent for one maze and measures its greedy rollout
+    # an agent passed in (the --general one) is used as it is, nothing is trained for this maze
+    start = time.perf_counter()
+    episodes = 0
+    if agent is None:
+        agent = prepare_agent(config, maze, cache, seed)
+        episodes = agent.episodes_trained # 0 for cached tables, fewer than asked for with --early_stop
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solved, steps = agent.greedy_rollout(maze)
+    rollout_seconds = time.perf_counter() - start
+
+    # same efficiency measure as the Game info panel
+    efficiency = maze.shortest_path_length / steps * 100 if solved else 0.0
+    return {
+        'rows': maze.rows,
+        'cols': maze.cols,
+        'shortest_path_length': maze.shortest_path_length,
+        'solved': solved,
+        'steps': steps,
+        'efficiency': round(efficiency, 2),
+        'episodes': episodes,
+        'q_table_bytes': agent.q_table_bytes(),
+        'train_seconds': round(train_seconds, 4),
+        'rollout_seconds': round(rollout_seconds, 6),
+    }
+
+
+def summarize(results, total_seconds):
+    solved = [r for r in results if r['solved']]
+    return {
+        'mazes': len(results),
+        'solved': len(solved),
+        'success_rate': len(solved) / len(results) if results else 0.0,
+        'mean_efficiency': sum(r['efficiency'] for r in solved) / len(solved) if solved else 0.0,
+        'episodes': sum(r['episodes'] for r in results),
+        'train_seconds': round(sum(r['train_seconds'] for r in results), 4),
+        'rollout_seconds': round(sum(r['rollout_seconds'] for r in results), 6),
+        'total_seconds': round(total_seconds, 4),
+    }
+
+
+def write_report(results, summary, output_format, out):
+    if output_format == "json":
+        json.dump({'summary': summary, 'results': results}, out, indent=2)
+        out.write("\n")
+    else:
+        # one row per maze; the summary is easy to recompute from these
+        writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def get_eval_config():
+    parser = argparse.ArgumentParser(description="Headless batch evaluation of the maze solving agent.")
+    parser.add_argument("--num_mazes", type=int, default=10, help="Number of mazes to generate (ignored with --load_mazes).")
+    parser.add_argument("--rows", type=int, default=21, help="Number of rows in each maze.")
+    parser.add_argument("--cols", type=int, default=31, help="Number of columns in each maze.")
+    parser.add_argument("--algorithm", choices=GENERATORS, default="backtracker", help="Maze generation algorithm.")
+    parser.add_argument("--vary_size", action="store_true", help="Randomly vary maze sizes like the interactive session.")
+    parser.add_argument("--load_mazes", help="JSON file (or corpus.py directory) of mazes to evaluate instead of generating new ones.")
+    parser.add_argument("--save_mazes", help="Write the evaluated mazes to this JSON file.")
+    parser.add_argument("--episodes", type=int, default=20000, help="Number of training episodes per maze.")
+    parser.add_argument("--step_penalty", type=float, default=-0.1, help="Penalty for each step taken.")
+    parser.add_argument("--reward_shaping", choices=REWARD_SHAPINGS, default="manhattan", help="Distance used to reward moving toward the exit.")
+    parser.add_argument("--lr", type=float, default=0.5, help="Learning Rate for the agent.")
+    parser.add_argument("--gamma", type=float, default=0.99, help="Discount Factor for future rewards.")
+    parser.add_argument("--epsilon_decay", type=float, default=0.9998, help="Decay rate for exploration.")
+    parser.add_argument("--q_backend", choices=Q_BACKENDS, default="dense", help="Q-table storage: per-cell dict, one dense array, or compact rows for open cells only.")
+    parser.add_argument("--compact_dtype", choices=COMPACT_DTYPES, default="float16", help="Precision of the compact Q-table backend.")
+    parser.add_argument("--mask_actions", action="store_true", help="Compact backend: never try moves into walls.")
+    parser.add_argument("--q_dtype", choices=["float32", "float16"], default="float32", help="Precision of saved Q-table files.")
+    parser.add_argument("--metrics_file", help="Append per-episode training metrics to this .csv or .jsonl file.")
+    parser.add_argument("--metrics_every", type=int, default=1, help="Only record every Nth episode in the metrics file.")
+    parser.add_argument("--profile", help="Profile training with cProfile and write the stats to this file.")
+    parser.add_argument("--early_stop", action="store_true", help="Stop training once the greedy path is optimal and stable.")
+    parser.add_argument("--early_stop_every", type=int, default=50, help="Episodes between early stopping checks.")
+    parser.add_argument("--early_stop_patience", type=int, default=3, help="Checks in a row that must pass before stopping.")
+    parser.add_argument("--early_stop_tolerance", type=float, default=0.0, help="Allowed fraction of extra steps over the shortest path.")
+    parser.add_argument("--early_stop_delta_q", type=float, help="Also require every Q-value change between checks to stay below this.")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible maze sizes, mazes and training.")
+    parser.add_argument("--jit", action="store_true", help="Train with the compiled numba kernel (falls back to python without numba).")
+    parser.add_argument("--solver", choices=SOLVERS, default="q_learning", help="Model free Q-learning, or planning with the known maze model.")
+    parser.add_argument("--planning_steps", type=int, default=10, help="Simulated updates per real step with --solver dyna_q or prioritized_sweeping.")
+    parser.add_argument("--prune_dead_ends", action="store_true", help="With --solver graph_q, leave dead end branches out of the junction graph.")
+    parser.add_argument("--trace_lambda", type=float, default=0.8, help="Trace decay of --solver q_lambda (0 is one-step Q-learning without wall moves), cuts the episodes needed most with a fast --epsilon_decay.")
+    parser.add_argument("--general", action="store_true", help="Train one agent on many small mazes and evaluate it on every maze without retraining.")
+    parser.add_argument("--general_mazes", type=int, default=40, help="Number of training mazes with --general.")
+    parser.add_argument("--general_episodes", type=int, default=100, help="Training episodes per training maze with --general.")
+    parser.add_argument("--general_model", help="Q-table file of the --general agent: loaded if it exists, written after training otherwise.")
+    parser.add_argument("--num_envs", type=int, default=1, help="Episodes trained side by side (>1 uses the batched trainer).")
+    parser.add_argument("--use_cache", action="store_true", help="Load and save cached Q-tables like main.py does.")
+    parser.add_argument("--cache_dir", default="q_cache", help="Directory for cached Q-tables.")
+    parser.add_argument("--cache_size_mb", type=float, default=256, help="Size budget of the Q-table cache.")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Report format.")
+    parser.add_argument("--output", help="Report file (default: stdout).")
+    parser.add_argument("--verbose", action="store_true", help="Show the usual generation and training output.")
+    config = vars(parser.parse_args())
+    config['no_cache'] = False # the cache is only used at all with --use_cache
+    return config
+
+
+if __name__ == "__main__":
+    config = get_eval_config()
+    # training chatter would otherwise end up mixed into a report written to stdout
+    quiet = nullcontext() if config['verbose'] else redirect_stdout(StringIO())
+
+    cache = create_cache(config) if config['use_cache'] else None
+    session_start = time.perf_counter()
+    results = []
+    # the same seeding as main.py (and session.prepare_maze), so a --seed gives the same mazes in both
+    session_rng = random.Random(config['seed'])
+    with quiet:
+        if config['load_mazes']:
+            mazes = load_mazes(config['load_mazes'])
+        else:
+            mazes = []
+            for index in range(config['num_mazes']):
+                rows, cols = config['rows'], config['cols']
+                if config['vary_size']:
+                    rows = max(7, rows + session_rng.randint(-2, 2) * 2)
+                    cols = max(7, cols + session_rng.randint(-3, 3) * 2)
+                seed = derive_seed(config['seed'], "maze", index)
+                mazes.append(Maze(rows=rows, cols=cols, algorithm=config['algorithm'], seed=derive_seed(seed, "maze")))
+
+        general_agent = None
+        if config['general']:
+            start = time.perf_counter()
+            general_agent = prepare_general_agent(config, config['seed'])
+            general_seconds = time.perf_counter() - start
+
+        # mazes can be a generator (a corpus), the mazes are only kept when they are saved afterwards
+        evaluated = []
+        for index, maze in enumerate(mazes):
+            seed = derive_seed(config['seed'], "maze", index)
+            results.append({'maze': index, **evaluate_maze(config, maze, cache, derive_seed(seed, "agent"), general_agent)})
+            if config['save_mazes']:
+                evaluated.append(maze)
+
+    if config['save_mazes']:
+        save_mazes(evaluated, config['save_mazes'])
+
+    summary = summarize(results, time.perf_counter() - session_start)
+    if general_agent:
+        # the training all the mazes shared (0 episodes when the model was loaded)
+        summary['episodes'] = general_agent.episodes_trained
+        summary['train_seconds'] = round(general_seconds, 4)
+    if cache:
+        summary['cache'] = cache.stats()
+    if config['output']:
+        with open(config['output'], 'w', newline='') as f:
+            write_report(results, summary, config['format'], f)
+    else:
+        write_report(results, summary, config['format'], sys.stdout)
+    print(f"Solved {summary['solved']}/{summary['mazes']} mazes "
+          f"({summary['success_rate']:.0%}, mean efficiency {summary['mean_efficiency']:.1f}%) "
+          f"in {summary['total_seconds']:.1f}s", file=sys.stderr)
@@ -1,12 +1,15 @@
 import pygame
+import numpy as np
 from constants import *
 from player import Player
 from maze import Maze
 
 class Game:
     # Manages the pygame window
-    def __init__(self, maze, agent):
-        pygame.init()
+    def __init__(self, maze, agent, fast_forward=False, show_fps=False):
+        # only the parts of pygame the window uses, pygame.init() would also start audio and joysticks
+        pygame.display.init()
+        pygame.font.init()
         info = pygame.display.Info()
         max_width = info.current_w
         max_height = info.current_h - 100  # leave room for taskbar, etc.
@@ -14,40 +17,50 @@ class Game:
         # dynamically adjust TILE_SIZE if maze too big
         max_tile_width = max_width // maze.cols
         max_tile_height = (max_height - INFO_PANEL_HEIGHT) // maze.rows
-        self.tile_size = min(max_tile_width, max_tile_height, TILE_SIZE)  # don't exceed original TILE_SIZE
+        self.tile_size = max(1, min(max_tile_width, max_tile_height, TILE_SIZE))  # don't exceed original TILE_SIZE
 
         self.screen_width = maze.cols * self.tile_size
         self.screen_height = maze.rows * self.tile_size + INFO_PANEL_HEIGHT
 
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), pygame.RESIZABLE)
+        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
 
         self.maze = maze
+        self.walls = maze.walls
         self.agent = agent
         self.player = Player(maze.start_pos, maze.rows, maze.cols)
 
-        self.screen_width = maze.cols * TILE_SIZE
-        self.screen_height = maze.rows * TILE_SIZE + INFO_PANEL_HEIGHT
-        
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption("Reinforcement Learning Maze Solver")
         self.clock = pygame.time.Clock()
         self.font_small = pygame.font.SysFont("Arial", 18)
         self.font_large = pygame.font.SysFont("Arial", 22, bold=True)
 
-    def _draw_maze(self):
-        # draws the maze on the screen
-        for r, row_str in enumerate(self.maze.layout):
-            for c, char in enumerate(row_str):
-                rect = pygame.Rect(c * TILE_SIZE, r * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                if char == 'W':
-                    pygame.draw.rect(self.screen, COLOR_WALL, rect)
-                    pygame.draw.rect(self.screen, COLOR_WALL_BORDER, rect, 1)
-                elif char in ' P':
-                    pygame.draw.rect(self.screen, COLOR_PATH, rect)
-                elif char == 'E':
-                    pygame.draw.rect(self.screen, COLOR_EXIT_BORDER, rect)
-                    inner_rect = rect.inflate(-TILE_SIZE // 4, -TILE_SIZE // 4)
-                    pygame.draw.rect(self.screen, COLOR_EXIT, inner_rect)
+        self.fast_forward = fast_forward # F toggles it while running
+        self.show_fps = show_fps
+        self.maze_surface = self._build_maze_surface()
+
+    def _build_maze_surface(self):
+        # renders the static maze once, every frame then just blits (parts of) this surface
+        # built as a numpy pixel array: one tile pattern for walls and one for paths, picked per cell
+        tile_size = self.tile_size
+        wall_tile = np.empty((tile_size, tile_size, 3), dtype=np.uint8)
+        wall_tile[:] = COLOR_WALL_BORDER
+        wall_tile[1:-1, 1:-1] = COLOR_WALL
+        path_tile = np.empty((tile_size, tile_size, 3), dtype=np.uint8)
+        path_tile[:] = COLOR_PATH
+
+        # (rows, cols, tile_y, tile_x, rgb) -> surfarray's (x, y, rgb)
+        tiles = np.where(self.walls[:, :, None, None, None], wall_tile, path_tile)
+        pixels = tiles.transpose(1, 3, 0, 2, 4).reshape(self.maze.cols * tile_size, self.maze.rows * tile_size, 3)
+        surface = pygame.surfarray.make_surface(pixels)
+
+        exit_rect = self._tile_rect(*self.maze.exit_pos)
+        pygame.draw.rect(surface, COLOR_EXIT_BORDER, exit_rect)
+        inner_rect = exit_rect.inflate(-tile_size // 4, -tile_size // 4)
+        pygame.draw.rect(surface, COLOR_EXIT, inner_rect)
+        return surface.convert()
+
+    def _tile_rect(self, row, col):
+        return pygame.Rect(col * self.tile_size, row * self.tile_size, self.tile_size, self.tile_size)
 
     def _display_text(self, text, pos, font, color=COLOR_INFO_TEXT):
         # helper to render text
@@ -56,24 +69,56 @@ class Game:
 
     def _draw_info_panel(self, agent_steps, status_text, status_color):
         # Draws the bottom panel with game information
-        panel_rect = pygame.Rect(0, self.maze.rows * TILE_SIZE, self.screen_width, INFO_PANEL_HEIGHT)
+        panel_rect = pygame.Rect(0, self.maze.rows * self.tile_size, self.screen_width, INFO_PANEL_HEIGHT)
         pygame.draw.rect(self.screen, COLOR_INFO_BG, panel_rect)
 
         # optimal vs agent Steps
         optimal_text = f"Optimal Steps: {self.maze.shortest_path_length}"
+        # per-step efficiency: how much of the steps taken so far actually got closer to the exit
+        distances = self.maze.distance_to_exit
+        progress = distances[self.maze.start_pos] - distances[self.player.row, self.player.col]
         agent_text = f"Agent Steps: {agent_steps}"
+        if agent_steps > 0:
+            agent_text += f" ({max(progress, 0) / agent_steps * 100:.0f}% on track)"
         self._display_text(optimal_text, (20, panel_rect.y + 10), self.font_small)
         self._display_text(agent_text, (20, panel_rect.y + 35), self.font_small)
 
         self._display_text(status_text, (self.screen_width // 2.5, panel_rect.y + 20), self.font_large, status_color)
         
-        controls_text = "N: Next Maze | R: Retry | Q: Quit"
+        controls_text = "N: Next Maze | R: Retry | F: Fast | Q: Quit"
         text_w = self.font_small.render(controls_text, True, COLOR_INFO_TEXT).get_width()
-        self._display_text(controls_text, (self.screen_width - text_w - 20, panel_rect.y + 25), self.font_small)
+        if self.show_fps:
+            self._display_text(controls_text, (self.screen_width - text_w - 20, panel_rect.y + 10), self.font_small)
+            fps_text = f"FPS: {self.clock.get_fps():.0f} | Frame: {self.clock.get_rawtime()} ms"
+            fps_w = self.font_small.render(fps_text, True, COLOR_INFO_TEXT).get_width()
+            self._display_text(fps_text, (self.screen_width - fps_w - 20, panel_rect.y + 35), self.font_small)
+        else:
+            self._display_text(controls_text, (self.screen_width - text_w - 20, panel_rect.y + 25), self.font_small)
+        return panel_rect
+
+    def _draw_frame(self, agent_steps, status_text, status_color, old_tile=None):
+        # redraws only what changed: the tile the player left, the tile it is on now and the info panel
+        # old_tile=None redraws the whole window
+        player_rect = self._tile_rect(self.player.row, self.player.col)
+        if old_tile is None:
+            self.screen.fill(COLOR_BACKGROUND)
+            self.screen.blit(self.maze_surface, (0, 0))
+        else:
+            old_rect = self._tile_rect(*old_tile)
+            self.screen.blit(self.maze_surface, old_rect, old_rect)
+            self.screen.blit(self.maze_surface, player_rect, player_rect)
+        self.player.draw(self.screen, self.tile_size)
+        panel_rect = self._draw_info_panel(agent_steps, status_text, status_color)
+
+        if old_tile is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update([old_rect, player_rect, panel_rect])
 
     def run(self):
         # The main loop for running the agent's solution
         self.player.reset()
+        self.agent.start_episode(self.maze)
         agent_steps = 0
         game_over = False
         status_text = "Solving..."
@@ -81,6 +126,7 @@ class Game:
 
         max_run_steps = self.maze.rows * self.maze.cols * 2 # generous step limit because it very easily gets stuck
 
+        self._draw_frame(agent_steps, status_text, status_color)
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT: return "quit"
@@ -88,7 +134,12 @@ class Game:
                     if event.key == pygame.K_q: return "quit"
                     if event.key == pygame.K_n: return "next_maze"
                     if event.key == pygame.K_r: return "retry"
+                    if event.key == pygame.K_f: self.fast_forward = not self.fast_forward
+                if event.type == pygame.VIDEOEXPOSE:
+                    # the window contents were lost, dirty rects alone won't bring them back
+                    self._draw_frame(agent_steps, status_text, status_color)
 
+            old_tile = (self.player.row, self.player.col)
             if not game_over:
                 current_state_key = self.agent._get_state_key(self.player.row, self.player.col)
                 
@@ -96,7 +147,7 @@ class Game:
                 action = self.agent.choose_action(current_state_key, exploit_only=True)
                 
                 row_delta, col_delta, _ = ACTION_MAP[action]
-                self.player.move(row_delta, col_delta, self.maze.layout)
+                self.player.move(row_delta, col_delta, self.walls)
                 agent_steps += 1
 
                 # check for win/fail conditions
@@ -105,11 +156,7 @@ class Game:
                     eff = (self.maze.shortest_path_length / agent_steps * 100) if agent_steps > 0 else 0
                     status_text = f"Success! ({eff:.1f}%)"
                     status_color = COLOR_SUCCESS if eff >= 80 else COLOR_WARNING
-                    self.screen.fill(COLOR_BACKGROUND)
-                    self._draw_maze()
-                    self.player.draw(self.screen)
-                    self._draw_info_panel(agent_steps, status_text, status_color)
-                    pygame.display.flip()
+                    self._draw_frame(agent_steps, status_text, status_color, old_tile)
 
                     return "success"
                 elif agent_steps >= max_run_steps:
@@ -118,10 +165,9 @@ class Game:
                     status_color = COLOR_FAIL
                     return "failed_timeout"
             
-            self.screen.fill(COLOR_BACKGROUND)
-            self._draw_maze()
-            self.player.draw(self.screen)
-            self._draw_info_panel(agent_steps, status_text, status_color)
-            pygame.display.flip()
-            
-            self.clock.tick(20) # can control agent animation speed
+            self._draw_frame(agent_steps, status_text, status_color, old_tile)
+
+            if self.fast_forward:
+                self.clock.tick() # uncapped, only measures the frame time
+            else:
+                self.clock.tick(20) # can control agent animation speed
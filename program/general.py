@@ -0,0 +1,179 @@
+import time
+
+import numpy as np
+
+from constants import ACTION_MAP, NUM_ACTIONS
+from agent import RLAgent
+from transitions import TransitionTable
+
+# an agent that is trained once on many mazes and then plays any maze without retraining
+# its state is not the (row, col) position but what it can see and remember from there:
+#   - each of the 4 neighbours (ACTION_MAP order): wall (the maze boundary counts as one), never visited,
+#     among the least visited open neighbours, or visited more often, in this episode; 4 ** 4 combinations
+#   - which way the exit is, the sign of the row and column difference, 3 x 3 directions
+# positions alone can't transfer between mazes, and with only walls and the direction a greedy policy runs in
+# circles as soon as the exit is behind a wall; visit counts relative to each other (not capped absolute ones)
+# keep "which way haven't I been yet" visible however long the episode gets
+# the Q-table is a fixed (NUM_NEIGHBOURHOODS, NUM_DIRECTIONS, NUM_ACTIONS) array whatever the maze size,
+# indexed by (neighbourhood, direction) just like the dense backend is indexed by (row, col)
+
+NUM_NEIGHBOURHOODS = 4 ** NUM_ACTIONS
+NUM_DIRECTIONS = 9
+
+# the actions the agent chooses between, for every neighbourhood: the moves to never or least visited neighbours
+# (all four for a cell walled in on every side)
+# that's Tremaux's rule for exploring a maze, so even an untrained agent keeps exploring instead of circling; what
+# training learns is which of those moves to try first, mostly from the exit direction
+# walls are part of what the agent sees, so it never has to waste steps finding them either
+def _legal_actions(neighbourhood):
+    codes = [(neighbourhood >> 2 * (NUM_ACTIONS - 1 - action)) & 3 for action in range(NUM_ACTIONS)]
+    return [action for action in range(NUM_ACTIONS) if codes[action] in (1, 2)] or list(range(NUM_ACTIONS))
+
+
+LEGAL_ACTIONS = [_legal_actions(neighbourhood) for neighbourhood in range(NUM_NEIGHBOURHOODS)]
+
+
+def _neighbour_cells(maze):
+    # (rows * cols, NUM_ACTIONS) flat cell of every neighbour, -1 for walls and the boundary
+    rows, cols = maze.rows, maze.cols
+    padded = np.full((rows + 2, cols + 2), -1, dtype=np.int64)
+    padded[1:-1, 1:-1] = np.where(maze.walls, -1, np.arange(rows * cols).reshape(rows, cols))
+    neighbours = np.empty((rows * cols, NUM_ACTIONS), dtype=np.int64)
+    for action in range(NUM_ACTIONS):
+        row_delta, col_delta, _ = ACTION_MAP[action]
+        neighbours[:, action] = padded[1 + row_delta:rows + 1 + row_delta, 1 + col_delta:cols + 1 + col_delta].ravel()
+    return neighbours
+
+
+def _directions(maze):
+    # (rows * cols) direction of the exit from every cell, 0..8
+    cell_rows, cell_cols = np.divmod(np.arange(maze.rows * maze.cols), maze.cols)
+    exit_row, exit_col = maze.exit_pos
+    return (np.sign(exit_row - cell_rows) + 1) * 3 + np.sign(exit_col - cell_cols) + 1
+
+
+def _observe(cell, visits, neighbours, directions):
+    # marks cell as visited and returns its state key
+    visits[cell] += 1
+    counts = [visits[neighbour] for neighbour in neighbours[cell] if neighbour >= 0]
+    least = min(counts) if counts else 0
+    neighbourhood = 0
+    for neighbour in neighbours[cell]:
+        if neighbour < 0:
+            code = 0
+        else:
+            count = visits[neighbour]
+            code = 1 if count == 0 else 2 if count == least else 3
+        neighbourhood = neighbourhood * 4 + code
+    return (neighbourhood, directions[cell])
+
+
+class GeneralAgent(RLAgent):
+    # RLAgent with observation states, see the top of this file
+    # Game and greedy_rollout ask for _get_state_key(row, col) once per step after start_episode(maze),
+    # which is where the agent counts its visits
+    def __init__(self, *args, **kwargs):
+        kwargs['q_backend'] = "dense"
+        super().__init__(*args, **kwargs)
+        self.q_table = np.zeros((NUM_NEIGHBOURHOODS, NUM_DIRECTIONS, NUM_ACTIONS), dtype=np.float32)
+        self.cols = None
+
+    def start_episode(self, maze):
+        self.cols = maze.cols
+        self.neighbours = _neighbour_cells(maze).tolist()
+        self.directions = _directions(maze).tolist()
+        self.visits = [0] * (maze.rows * maze.cols)
+
+    def _get_state_key(self, row, col):
+        return _observe(row * self.cols + col, self.visits, self.neighbours, self.directions)
+
+    def choose_action(self, state_key, exploit_only=False):
+        # epsilon greedy like RLAgent, but only over LEGAL_ACTIONS (ties go to the first, like np.argmax)
+        legal = LEGAL_ACTIONS[state_key[0]]
+        if not exploit_only and self.rng.random() < self.epsilon:
+            return legal[self.rng.randrange(len(legal))]
+        values = self.q_table[state_key].tolist()
+        return max(legal, key=values.__getitem__)
+
+    def update_q_table(self, state_key, action, reward, next_state_key):
+        # RLAgent's dense update, with the best next value also taken over legal actions only
+        # (the other actions are never updated and would otherwise make every state look worth 0)
+        neighbourhood, direction = state_key
+        old_q_value = self.q_table.item(neighbourhood, direction, action)
+        next_values = self.q_table[next_state_key].tolist()
+        max_future_q = max(next_values[a] for a in LEGAL_ACTIONS[next_state_key[0]])
+        change = self.lr * (reward + self.gamma * max_future_q - old_q_value)
+        self.q_table[neighbourhood, direction, action] = old_q_value + change
+        return abs(change)
+
+    def q_states(self):
+        return NUM_NEIGHBOURHOODS * NUM_DIRECTIONS
+
+    def train(self, maze, num_episodes, callbacks=()):
+        return self.train_many([maze], num_episodes, callbacks)
+
+    def train_many(self, mazes, episodes_per_maze, callbacks=()):
+        # Q-learning over all the mazes, one episode on each in turn so the last mazes don't just overwrite
+        # what was learned on the first ones; epsilon decays over all episodes together
+        # callbacks see one long run of episodes_per_maze * len(mazes) episodes, returns the total transitions
+        num_episodes = episodes_per_maze * len(mazes)
+        print(f"Starting training on {len(mazes)} mazes for {num_episodes} episodes...")
+        self.epsilon = self.epsilon_start
+        total_steps = 0
+
+        # per maze: transition table lookups like RLAgent.train, plus what _observe needs
+        worlds = []
+        for maze in mazes:
+            table = TransitionTable(maze, self.step_penalty, self.reward_shaping)
+            next_cells, rewards, terminal = table.as_lists()
+            worlds.append((table.start_cell, _neighbour_cells(maze).tolist(), _directions(maze).tolist(),
+                           next_cells, rewards, terminal, maze.rows * maze.cols))
+
+        callbacks = self._start_training(mazes[0], num_episodes, callbacks)
+        train_start = time.perf_counter()
+        for episode in range(num_episodes):
+            episode_start = time.perf_counter()
+            cell, neighbours, directions, next_cells, rewards, terminal, size = worlds[episode % len(worlds)]
+            visits = [0] * size
+            state_key = _observe(cell, visits, neighbours, directions)
+            total_reward = 0
+            max_delta_q = 0.0
+
+            for step in range(size):
+                action = self.choose_action(state_key)
+                reward = rewards[cell][action]
+                done = terminal[cell][action]
+                cell = next_cells[cell][action]
+                next_state_key = _observe(cell, visits, neighbours, directions)
+                total_reward += reward
+
+                delta_q = self.update_q_table(state_key, action, reward, next_state_key)
+                if delta_q > max_delta_q:
+                    max_delta_q = delta_q
+                state_key = next_state_key
+
+                if done:
+                    break
+
+            total_steps += step + 1
+            if self.epsilon > self.epsilon_end:
+                self.epsilon *= self.epsilon_decay
+
+            seconds = time.perf_counter() - episode_start
+            stats = {
+                'episode': episode + 1,
+                'steps': step + 1,
+                'reward': total_reward,
+                'epsilon': self.epsilon,
+                'seconds': seconds,
+                'transitions_per_sec': (step + 1) / seconds if seconds > 0 else 0.0,
+                'q_states': self.q_states(),
+                'max_delta_q': max_delta_q,
+            }
+            for callback in callbacks:
+                callback.on_episode_end(self, stats)
+            if self.stop_training:
+                break
+
+        self._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+        return total_steps
@@ -0,0 +1,248 @@
+import random
+import numpy as np
+
+# maze generation algorithms
+# every generator takes the (odd) grid size and returns a (rows, cols) bool array, True = wall
+# cells live on odd (row, col) coordinates and the walls between them on the even ones in between
+#
+# internally they work on "cell numbers": cell k is at grid (2 * (k // width) + 1, 2 * (k % width) + 1)
+# and the grid itself is a flat bytearray (1 = wall) until it is handed back as a numpy array
+#
+# rng is anything with the random module's interface (random.Random(seed) for reproducible mazes)
+
+
+def _empty_grid(rows, cols):
+    # all walls, plus the number of cells across and down
+    return bytearray(b'\x01') * (rows * cols), (rows - 1) // 2, (cols - 1) // 2
+
+
+def _cell_to_grid(cell, width, cols):
+    row, col = divmod(cell, width)
+    return (2 * row + 1) * cols + 2 * col + 1
+
+
+def _to_array(grid, rows, cols):
+    return np.frombuffer(bytes(grid), dtype=np.uint8).reshape(rows, cols).astype(bool)
+
+
+def _neighbors(cell, height, width):
+    # in the same order as the original (-2, 0), (2, 0), (0, -2), (0, 2) checks: up, down, left, right
+    row, col = divmod(cell, width)
+    result = []
+    if row > 0:
+        result.append(cell - width)
+    if row < height - 1:
+        result.append(cell + width)
+    if col > 0:
+        result.append(cell - 1)
+    if col < width - 1:
+        result.append(cell + 1)
+    return result
+
+
+def recursive_backtracker(rows, cols, rng=None):
+    # depth first search with an explicit stack: keep walking to random unvisited neighbours,
+    # and back up to the last cell that still has one when stuck
+    # long winding corridors with few branches
+    # this one runs directly on grid indices (a cell is unvisited while it is still a wall)
+    # because it is the default and the hottest loop of generation
+    rng = rng or random
+    grid, _, _ = _empty_grid(rows, cols)
+    up_limit = cols # cells above row 1 don't exist
+    down_limit = (rows - 1) * cols # and neither do cells below row rows - 2
+
+    start = cols + 1
+    grid[start] = 0
+    stack = [start]
+    while stack:
+        current = stack[-1]
+        col = current % cols
+        # up, down, left, right, same order as the original (-2, 0), (2, 0), (0, -2), (0, 2)
+        neighbors = []
+        if current - 2 * cols > up_limit and grid[current - 2 * cols]:
+            neighbors.append(current - 2 * cols)
+        if current + 2 * cols < down_limit and grid[current + 2 * cols]:
+            neighbors.append(current + 2 * cols)
+        if col > 1 and grid[current - 2]:
+            neighbors.append(current - 2)
+        if col + 2 < cols - 1 and grid[current + 2]:
+            neighbors.append(current + 2)
+
+        if neighbors:
+            chosen = rng.choice(neighbors)
+            grid[(current + chosen) // 2] = 0 # wall between the two
+            grid[chosen] = 0
+            stack.append(chosen)
+        else:
+            stack.pop()
+    return _to_array(grid, rows, cols)
+
+
+def kruskal(rows, cols, rng=None):
+    # every wall between two cells is a candidate edge, taken in random order
+    # an edge is opened when its two cells are not connected yet (union-find keeps track)
+    # lots of short dead ends
+    rng = rng or random
+    grid, height, width = _empty_grid(rows, cols)
+    for cell in range(height * width):
+        grid[_cell_to_grid(cell, width, cols)] = 0
+
+    # edge e joins cell e // 2 to its right (even e) or lower (odd e) neighbour
+    edges = [2 * cell for cell in range(height * width) if cell % width < width - 1]
+    edges += [2 * cell + 1 for cell in range((height - 1) * width)]
+    rng.shuffle(edges)
+
+    parent = list(range(height * width))
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]] # path halving
+            cell = parent[cell]
+        return cell
+
+    for edge in edges:
+        cell = edge // 2
+        other = cell + (width if edge & 1 else 1)
+        root, other_root = find(cell), find(other)
+        if root != other_root:
+            parent[other_root] = root
+            grid[(_cell_to_grid(cell, width, cols) + _cell_to_grid(other, width, cols)) // 2] = 0
+    return _to_array(grid, rows, cols)
+
+
+def prim(rows, cols, rng=None):
+    # grows the maze outwards from one cell: pick a random frontier cell,
+    # connect it to a random neighbour already in the maze, and add its own neighbours to the frontier
+    rng = rng or random
+    grid, height, width = _empty_grid(rows, cols)
+    state = bytearray(height * width) # 0 = untouched, 1 = frontier, 2 = in the maze
+
+    state[0] = 2
+    grid[_cell_to_grid(0, width, cols)] = 0
+    frontier = _neighbors(0, height, width)
+    for cell in frontier:
+        state[cell] = 1
+
+    while frontier:
+        # swap-remove a random frontier cell
+        index = rng.randrange(len(frontier))
+        frontier[index], frontier[-1] = frontier[-1], frontier[index]
+        cell = frontier.pop()
+
+        neighbors = _neighbors(cell, height, width)
+        connected = [n for n in neighbors if state[n] == 2]
+        other = rng.choice(connected)
+        cell_index = _cell_to_grid(cell, width, cols)
+        grid[cell_index] = 0
+        grid[(cell_index + _cell_to_grid(other, width, cols)) // 2] = 0
+        state[cell] = 2
+
+        for n in neighbors:
+            if state[n] == 0:
+                state[n] = 1
+                frontier.append(n)
+    return _to_array(grid, rows, cols)
+
+
+def iter_eller_rows(rows, cols, rng=None):
+    # Eller's algorithm, yielding the maze one grid row (a (cols,) bool array) at a time
+    # only the set labels of the current row are kept, so memory is O(cols) no matter how many rows
+    rng = rng or random
+    height, width = (rows - 1) // 2, (cols - 1) // 2
+
+    yield np.ones(cols, dtype=bool) # top border
+
+    labels = list(range(width)) # set label of every cell in the current row
+    members = {label: [col] for col, label in enumerate(labels)} # label -> columns in this row
+    next_label = width
+
+    for row in range(height):
+        last_row = row == height - 1
+        cell_row = np.ones(cols, dtype=bool)
+        cell_row[1:2 * width:2] = False
+
+        # randomly join neighbours that are in different sets (the last row joins all of them)
+        for col in range(width - 1):
+            left, right = labels[col], labels[col + 1]
+            if left != right and (last_row or rng.random() < 0.5):
+                cell_row[2 * col + 2] = False
+                # relabel the smaller set
+                if len(members[left]) < len(members[right]):
+                    left, right = right, left
+                for member in members[right]:
+                    labels[member] = left
+                members[left].extend(members.pop(right))
+        yield cell_row
+
+        if last_row:
+            break
+
+        # every set carries on downwards through at least one random cell
+        below_row = np.ones(cols, dtype=bool)
+        next_labels = [None] * width
+        for label, columns in members.items():
+            rng.shuffle(columns)
+            for i, col in enumerate(columns):
+                if i == 0 or rng.random() < 0.5:
+                    below_row[2 * col + 1] = False
+                    next_labels[col] = label
+        yield below_row
+
+        # cells that were not joined from above start their own set
+        for col in range(width):
+            if next_labels[col] is None:
+                next_labels[col] = next_label
+                next_label += 1
+        labels = next_labels
+        members = {}
+        for col, label in enumerate(labels):
+            members.setdefault(label, []).append(col)
+
+    yield np.ones(cols, dtype=bool) # bottom border
+
+
+def eller(rows, cols, rng=None):
+    return np.vstack(list(iter_eller_rows(rows, cols, rng)))
+
+
+def wilson(rows, cols, rng=None):
+    # loop-erased random walks: walk randomly from a cell outside the maze until the maze is hit,
+    # then carve the walk (remembering only the last exit from every cell erases the loops)
+    # unbiased, every possible maze is equally likely
+    rng = rng or random
+    grid, height, width = _empty_grid(rows, cols)
+    num_cells = height * width
+    in_maze = bytearray(num_cells)
+    walk_next = [0] * num_cells
+
+    first = rng.randrange(num_cells)
+    in_maze[first] = 1
+    grid[_cell_to_grid(first, width, cols)] = 0
+
+    for start in range(num_cells):
+        if in_maze[start]:
+            continue
+        cell = start
+        while not in_maze[cell]:
+            next_cell = rng.choice(_neighbors(cell, height, width))
+            walk_next[cell] = next_cell
+            cell = next_cell
+
+        cell = start
+        while not in_maze[cell]:
+            in_maze[cell] = 1
+            cell_index = _cell_to_grid(cell, width, cols)
+            next_index = _cell_to_grid(walk_next[cell], width, cols)
+            grid[cell_index] = 0
+            grid[(cell_index + next_index) // 2] = 0
+            cell = walk_next[cell]
+    return _to_array(grid, rows, cols)
+
+
+GENERATORS = {
+    'backtracker': recursive_backtracker,
+    'kruskal': kruskal,
+    'prim': prim,
+    'eller': eller,
+    'wilson': wilson,
+}
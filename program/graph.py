@@ -0,0 +1,158 @@
+import heapq
+
+import numpy as np
+
+from constants import NUM_ACTIONS
+
+# the maze as a graph of its junctions instead of its cells
+# generated mazes are mostly one cell wide corridors, where there is nothing to decide, so each corridor becomes an edge:
+#   nodes  junctions (3 or 4 open neighbours), dead ends (1), and always the start and the exit
+#   edges  for every node and open direction, the node at the other end of that corridor and its length in steps
+# every edge remembers the cells it passes and the moves between them (walk()), so a route found on the graph
+# can be played cell by cell again
+# with prune_dead_ends, dead end branches are filled in first: no start -> exit path can go into one, and in a
+# perfect maze only the solution path is left
+# cells are flat (row * cols + col) like in pathfinding.py
+
+
+def _open_neighbour_counts(open_grid):
+    rows, cols = open_grid.shape
+    padded = np.zeros((rows + 2, cols + 2), dtype=np.int8)
+    padded[1:-1, 1:-1] = open_grid
+    return padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+
+
+def _step(cell, action, cols, size):
+    # the neighbouring flat cell in direction action, -1 off the grid
+    if action == 0:
+        return cell - cols if cell >= cols else -1
+    if action == 1:
+        return cell + cols if cell + cols < size else -1
+    if action == 2:
+        return cell - 1 if cell % cols > 0 else -1
+    return cell + 1 if cell % cols < cols - 1 else -1
+
+
+def fill_dead_ends(open_grid, keep):
+    # open_grid with every dead end branch filled in (cells in keep, e.g. start and exit, are never filled)
+    # a dead end is filled, which can turn its neighbour into one, and so on up the branch
+    rows, cols = open_grid.shape
+    size = rows * cols
+    open_cells = open_grid.ravel().tolist()
+    degrees = (_open_neighbour_counts(open_grid) * open_grid).ravel().tolist()
+    keep = set(keep)
+    stack = [cell for cell in np.flatnonzero(open_grid.ravel() & (np.asarray(degrees) <= 1)).tolist() if cell not in keep]
+    while stack:
+        cell = stack.pop()
+        open_cells[cell] = False
+        for action in range(NUM_ACTIONS):
+            neighbour = _step(cell, action, cols, size)
+            if neighbour >= 0 and open_cells[neighbour]:
+                degrees[neighbour] -= 1
+                if degrees[neighbour] == 1 and neighbour not in keep:
+                    stack.append(neighbour)
+    return np.array(open_cells, dtype=bool).reshape(rows, cols)
+
+
+class MazeGraph:
+    def __init__(self, maze, prune_dead_ends=False):
+        self.rows, self.cols = rows, cols = maze.rows, maze.cols
+        size = rows * cols
+        start = maze.start_pos[0] * cols + maze.start_pos[1]
+        exit_cell = maze.exit_pos[0] * cols + maze.exit_pos[1]
+        open_grid = ~maze.walls
+        if prune_dead_ends:
+            open_grid = fill_dead_ends(open_grid, (start, exit_cell))
+
+        is_node = (open_grid & (_open_neighbour_counts(open_grid) != 2)).ravel()
+        is_node[[start, exit_cell]] = True
+        self.node_cells = np.flatnonzero(is_node).tolist()
+        node_index = np.full(size, -1, dtype=np.int64)
+        node_index[self.node_cells] = np.arange(len(self.node_cells))
+        self.start_node = int(node_index[start])
+        self.exit_node = int(node_index[exit_cell])
+
+        # next_node[n][a] / lengths[n][a]: where direction a from node n leads and in how many steps (-1 / 0: nowhere)
+        # edge n * NUM_ACTIONS + a walks walk_cells[offsets[e]:offsets[e + 1]], taking walk_actions from each of them
+        num_nodes = len(self.node_cells)
+        self.next_node = [[-1] * NUM_ACTIONS for _ in range(num_nodes)]
+        self.lengths = [[0] * NUM_ACTIONS for _ in range(num_nodes)]
+        self.offsets = [0] * (num_nodes * NUM_ACTIONS + 1)
+        walk_cells = []
+        walk_actions = []
+        open_cells = open_grid.ravel().tolist()
+        node_of = node_index.tolist()
+        for node, node_cell in enumerate(self.node_cells):
+            for action in range(NUM_ACTIONS):
+                self.offsets[node * NUM_ACTIONS + action] = len(walk_cells)
+                cell = _step(node_cell, action, cols, size)
+                if cell < 0 or not open_cells[cell]:
+                    continue
+                walk_cells.append(node_cell)
+                walk_actions.append(action)
+                previous = node_cell
+                # a corridor cell has exactly two open neighbours, carry on through the one not just come from
+                while node_of[cell] < 0:
+                    for move in range(NUM_ACTIONS):
+                        neighbour = _step(cell, move, cols, size)
+                        if neighbour >= 0 and neighbour != previous and open_cells[neighbour]:
+                            break
+                    walk_cells.append(cell)
+                    walk_actions.append(move)
+                    previous, cell = cell, neighbour
+                self.next_node[node][action] = node_of[cell]
+                self.lengths[node][action] = len(walk_cells) - self.offsets[node * NUM_ACTIONS + action]
+        self.offsets[-1] = len(walk_cells)
+        self.walk_cells = np.array(walk_cells, dtype=np.int64)
+        self.walk_actions = np.array(walk_actions, dtype=np.int64)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_cells)
+
+    def num_edges(self):
+        # corridors, each one counted once (walk() can go along it either way)
+        return sum(target >= 0 for targets in self.next_node for target in targets) // 2
+
+    def walk(self, node, action):
+        # (cells, actions) along the edge, cells[i] is left with actions[i]; the end node's cell is not included
+        edge = node * NUM_ACTIONS + action
+        start, end = self.offsets[edge], self.offsets[edge + 1]
+        return self.walk_cells[start:end], self.walk_actions[start:end]
+
+    def position(self, cell):
+        return divmod(int(cell), self.cols)
+
+    def shortest_path(self):
+        # Dijkstra from the start node to the exit node, edges weighted by their length
+        # returns the path as (row, col) cells, both ends included, or None when the exit can't be reached
+        distances = {self.start_node: 0}
+        came_from = {self.start_node: None}
+        heap = [(0, self.start_node)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node == self.exit_node:
+                break
+            if distance > distances[node]:
+                continue # already reached by a shorter route
+            for action, target in enumerate(self.next_node[node]):
+                if target < 0:
+                    continue
+                new_distance = distance + self.lengths[node][action]
+                if new_distance < distances.get(target, new_distance + 1):
+                    distances[target] = new_distance
+                    came_from[target] = (node, action)
+                    heapq.heappush(heap, (new_distance, target))
+        if self.exit_node not in came_from:
+            return None
+
+        edges = []
+        node = self.exit_node
+        while came_from[node] is not None:
+            node, action = came_from[node]
+            edges.append((node, action))
+        path = []
+        for node, action in reversed(edges):
+            path.extend(self.position(cell) for cell in self.walk(node, action)[0])
+        path.append(self.position(self.node_cells[self.exit_node]))
+        return path
@@ -0,0 +1,96 @@
+import importlib.util
+
+import numpy as np
+
+# compiled Q-learning kernel for RLAgent.train_jit
+# runs whole episodes over a dense (rows * cols, NUM_ACTIONS) Q array and a transitions.TransitionTable,
+# with the same update rule as RLAgent.train but its own seeded random numbers (splitmix64), since the
+# random module can't be called from compiled code
+# numba is optional: without it HAVE_NUMBA is False and train_jit falls back to the python trainer
+# importing numba takes longer than everything else the agent needs together, so it is only looked up here and
+# imported by the first get_train_episodes() call, which is the first train_jit
+
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_TO_UNIT = 1.0 / 9007199254740992.0 # 2 ** -53
+
+
+def _splitmix64(state):
+    # returns (new state, 64 random bits)
+    state = state + _GOLDEN
+    z = state
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return state, z ^ (z >> np.uint64(31))
+
+
+def _train_episodes(q, next_cells, rewards, terminal, start_cell, num_episodes, max_steps,
+                    lr, gamma, epsilon, epsilon_end, epsilon_decay, rng_state,
+                    episode_steps, episode_rewards, episode_max_delta_q):
+    # trains num_episodes episodes in place on q, per-episode stats go into the three output arrays
+    # rng_state is a 1 element uint64 array, updated in place so the next call carries on from it
+    # returns (transitions, epsilon)
+    num_actions = q.shape[1]
+    state = rng_state[0]
+    total_steps = 0
+    for episode in range(num_episodes):
+        cell = start_cell
+        total_reward = 0.0
+        max_delta_q = 0.0
+        steps = 0
+        for step in range(max_steps):
+            # epsilon greedy, ties go to the first action like np.argmax
+            state, bits = _splitmix64(state)
+            if (bits >> np.uint64(11)) * _TO_UNIT < epsilon:
+                state, bits = _splitmix64(state)
+                action = np.int64(bits >> np.uint64(62)) # NUM_ACTIONS is 4, the top 2 bits pick one
+            else:
+                action = 0
+                for a in range(1, num_actions):
+                    if q[cell, a] > q[cell, action]:
+                        action = a
+
+            reward = rewards[cell, action]
+            next_cell = next_cells[cell, action]
+            max_future_q = q[next_cell, 0]
+            for a in range(1, num_actions):
+                if q[next_cell, a] > max_future_q:
+                    max_future_q = q[next_cell, a]
+
+            old_q_value = np.float64(q[cell, action])
+            change = lr * (reward + gamma * max_future_q - old_q_value)
+            q[cell, action] = old_q_value + change
+            if abs(change) > max_delta_q:
+                max_delta_q = abs(change)
+            total_reward += reward
+            steps = step + 1
+            done = terminal[cell, action]
+            cell = next_cell
+            if done:
+                break
+
+        episode_steps[episode] = steps
+        episode_rewards[episode] = total_reward
+        episode_max_delta_q[episode] = max_delta_q
+        total_steps += steps
+        if epsilon > epsilon_end:
+            epsilon *= epsilon_decay
+    rng_state[0] = state
+    return total_steps, epsilon
+
+
+_compiled_train_episodes = None
+
+
+def get_train_episodes():
+    # the compiled _train_episodes, None without numba
+    # cache=True keeps the compiled code in __pycache__, so only the very first run pays for compiling
+    global _splitmix64, _compiled_train_episodes
+    if HAVE_NUMBA and _compiled_train_episodes is None:
+        from numba import njit
+        _splitmix64 = njit(cache=True)(_splitmix64) # before _train_episodes is compiled, which calls it
+        _compiled_train_episodes = njit(cache=True)(_train_episodes)
+    return _compiled_train_episodes
@@ -0,0 +1,89 @@
+import json
+import math
+import time
+import asyncio
+import argparse
+
+# load test for service.py: --connections clients send --requests requests between them, each client sending
+# its next request once the previous one is done, and the latency of a request is from sending it to its
+# "done" (or "error") line
+# the requests cycle through --distinct seeds, so with fewer seeds than requests the repeats measure the
+# service's deduplication and Q-table cache rather than training
+#
+#   python service.py &
+#   python loadtest.py --requests 500 --connections 16 --rows 11 --cols 15 --episodes 500
+
+
+def percentile(values, p):
+    # nearest rank percentile of a sorted list
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def run_client(host, port, requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("service closed the connection")
+                reply = json.loads(line)
+                if reply['event'] in ("done", "error"):
+                    break
+            latencies.append(time.perf_counter() - start)
+            if reply['event'] == "error":
+                errors.append(reply['error'])
+    finally:
+        writer.close()
+
+
+async def fetch_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({'type': "stats"}).encode() + b"\n")
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+
+def get_loadtest_config():
+    parser = argparse.ArgumentParser(description="Load test for service.py.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address of the service.")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the service.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests to send in total.")
+    parser.add_argument("--connections", type=int, default=8, help="Clients sending requests side by side.")
+    parser.add_argument("--distinct", type=int, default=20, help="Different seeds to cycle through.")
+    parser.add_argument("--type", choices=["generate", "train", "solve"], default="solve", help="Request type.")
+    parser.add_argument("--rows", type=int, default=11, help="Number of rows in each maze.")
+    parser.add_argument("--cols", type=int, default=15, help="Number of columns in each maze.")
+    parser.add_argument("--episodes", type=int, default=500, help="Training episodes per maze.")
+    return vars(parser.parse_args())
+
+
+async def load_test(config):
+    requests = [{'id': index, 'type': config['type'], 'rows': config['rows'], 'cols': config['cols'],
+                 'episodes': config['episodes'], 'seed': index % config['distinct']} for index in range(config['requests'])]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(config['host'], config['port'], requests[client::config['connections']], latencies, errors)
+                           for client in range(config['connections'])))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    print(f"{len(latencies)} requests ({len(errors)} errors) over {config['connections']} connections in {elapsed:.2f}s")
+    print(f"  throughput: {len(latencies) / elapsed:.1f} requests/sec")
+    print(f"  latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, p90 {percentile(latencies, 90) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms, max {latencies[-1] * 1000 if latencies else 0.0:.1f} ms")
+    if errors:
+        print(f"  first error: {errors[0]}")
+    print(f"  service:    {await fetch_stats(config['host'], config['port'])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(load_test(get_loadtest_config()))
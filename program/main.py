@@ -1,12 +1,14 @@
-import pygame
 import sys
 import argparse
-from random import randint
+import random
+from concurrent.futures import ProcessPoolExecutor
 
 from constants import *
-from maze import Maze
-from agent import RLAgent
-from game import Game
+from agent import Q_BACKENDS, REWARD_SHAPINGS
+from generators import GENERATORS
+from compact import COMPACT_DTYPES
+from planning import SOLVERS
+from session import create_cache, derive_seed, generate_maze, prepare_maze, prepare_general_agent, train_maze_job, unpack_job_result
 
 def get_user_config():
     print("--- Configuration Setup ---")
@@ -52,7 +54,37 @@ def get_user_config():
         'gamma': get_float_input("Discount Factor (e.g., 0.99)", default_gamma),
         'epsilon_decay': get_float_input("Epsilon Decay (e.g., 0.9998)", default_epsilon_decay),
         'num_mazes': get_int_input("Number of mazes to solve?", default_num_mazes),
-        'no_cache': False  # not user configurable
+        'no_cache': False,  # not user configurable
+        'cache_dir': "q_cache",
+        'cache_size_mb': 256,
+        'q_backend': "dict",
+        'compact_dtype': "float16",
+        'mask_actions': False,
+        'num_envs': 1,
+        'workers': 0,
+        'algorithm': "backtracker",
+        'reward_shaping': "manhattan",
+        'q_dtype': "float32",
+        'fast': False,
+        'show_fps': False,
+        'metrics_file': None,
+        'metrics_every': 1,
+        'profile': None,
+        'early_stop': False,
+        'early_stop_every': 50,
+        'early_stop_patience': 3,
+        'early_stop_tolerance': 0.0,
+        'early_stop_delta_q': None,
+        'solver': "q_learning",
+        'planning_steps': 10,
+        'prune_dead_ends': False,
+        'trace_lambda': 0.8,
+        'jit': False,
+        'seed': None,
+        'general': False,
+        'general_mazes': 40,
+        'general_episodes': 100,
+        'general_model': None
     }
 
     return config
@@ -64,11 +96,41 @@ def get_cli_config():
     parser.add_argument("--cols", type=int, default=31, help="Number of columns in the maze.")
     parser.add_argument("--episodes", type=int, default=20000, help="Number of training episodes per maze.")
     parser.add_argument("--step_penalty", type=float, default=-0.1, help="Penalty for each step taken.")
+    parser.add_argument("--reward_shaping", choices=REWARD_SHAPINGS, default="manhattan", help="Distance used to reward moving toward the exit.")
     parser.add_argument("--lr", type=float, default=0.5, help="Learning Rate for the agent.")
     parser.add_argument("--gamma", type=float, default=0.99, help="Discount Factor for future rewards.")
     parser.add_argument("--epsilon_decay", type=float, default=0.9998, help="Decay rate for exploration.")
+    parser.add_argument("--algorithm", choices=GENERATORS, default="backtracker", help="Maze generation algorithm.")
     parser.add_argument("--num_mazes", type=int, default=5, help="Number of mazes to solve in a session.")
     parser.add_argument("--no_cache", action="store_true", help="Force retraining; do not use a cached Q-table.")
+    parser.add_argument("--cache_dir", default="q_cache", help="Directory for cached Q-tables.")
+    parser.add_argument("--cache_size_mb", type=float, default=256, help="Size budget of the Q-table cache, least recently used tables are deleted past it.")
+    parser.add_argument("--q_backend", choices=Q_BACKENDS, default="dict", help="Q-table storage: per-cell dict, one dense array, or compact rows for open cells only.")
+    parser.add_argument("--compact_dtype", choices=COMPACT_DTYPES, default="float16", help="Precision of the compact Q-table backend.")
+    parser.add_argument("--mask_actions", action="store_true", help="Compact backend: never try moves into walls.")
+    parser.add_argument("--fast", action="store_true", help="Play the solutions back as fast as possible (toggle with F).")
+    parser.add_argument("--show_fps", action="store_true", help="Show frame rate and frame time in the info panel.")
+    parser.add_argument("--workers", type=int, default=0, help="Background processes training upcoming mazes (0 = train each maze when it is reached).")
+    parser.add_argument("--q_dtype", choices=["float32", "float16"], default="float32", help="Precision of saved Q-table files.")
+    parser.add_argument("--metrics_file", help="Append per-episode training metrics to this .csv or .jsonl file.")
+    parser.add_argument("--metrics_every", type=int, default=1, help="Only record every Nth episode in the metrics file.")
+    parser.add_argument("--profile", help="Profile training with cProfile and write the stats to this file.")
+    parser.add_argument("--early_stop", action="store_true", help="Stop training once the greedy path is optimal and stable.")
+    parser.add_argument("--early_stop_every", type=int, default=50, help="Episodes between early stopping checks.")
+    parser.add_argument("--early_stop_patience", type=int, default=3, help="Checks in a row that must pass before stopping.")
+    parser.add_argument("--early_stop_tolerance", type=float, default=0.0, help="Allowed fraction of extra steps over the shortest path.")
+    parser.add_argument("--early_stop_delta_q", type=float, help="Also require every Q-value change between checks to stay below this.")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible maze sizes, mazes and training.")
+    parser.add_argument("--jit", action="store_true", help="Train with the compiled numba kernel (falls back to python without numba).")
+    parser.add_argument("--solver", choices=SOLVERS, default="q_learning", help="Model free Q-learning, or planning with the known maze model.")
+    parser.add_argument("--planning_steps", type=int, default=10, help="Simulated updates per real step with --solver dyna_q or prioritized_sweeping.")
+    parser.add_argument("--prune_dead_ends", action="store_true", help="With --solver graph_q, leave dead end branches out of the junction graph.")
+    parser.add_argument("--trace_lambda", type=float, default=0.8, help="Trace decay of --solver q_lambda (0 is one-step Q-learning without wall moves), cuts the episodes needed most with a fast --epsilon_decay.")
+    parser.add_argument("--general", action="store_true", help="Train one agent on many small mazes up front and let it solve every maze without retraining.")
+    parser.add_argument("--general_mazes", type=int, default=40, help="Number of training mazes with --general.")
+    parser.add_argument("--general_episodes", type=int, default=100, help="Training episodes per training maze with --general.")
+    parser.add_argument("--general_model", help="Q-table file of the --general agent: loaded if it exists, written after training otherwise.")
+    parser.add_argument("--num_envs", type=int, default=1, help="Episodes trained side by side (>1 uses the batched trainer and the dense backend).")
     args = parser.parse_args()
     return vars(args) # returns as dictionary
 
@@ -88,36 +150,44 @@ if __name__ == "__main__":
 
     stats = {'success': 0, 'failed': 0, 'total': 0}
 
-    for i in range(config['num_mazes']):
+    # random maze sizes for variety, picked up front so background workers know what to build
+    # with --seed the whole session (sizes, mazes and training) plays out the same way every time
+    session_rng = random.Random(config['seed'])
+    maze_sizes = [(max(7, config['rows'] + session_rng.randint(-2, 2) * 2), max(7, config['cols'] + session_rng.randint(-3, 3) * 2))
+                  for _ in range(config['num_mazes'])]
+    maze_seeds = [derive_seed(config['seed'], "maze", i) for i in range(config['num_mazes'])]
+
+    cache = create_cache(config)
+
+    # general mode: one agent, trained once, plays every maze (there's nothing left for workers to do)
+    general_agent = prepare_general_agent(config, config['seed']) if config['general'] else None
+
+    # pipelined mode: workers generate and train every maze while earlier ones are being displayed
+    executor = None
+    if config['workers'] > 0 and not general_agent:
+        executor = ProcessPoolExecutor(max_workers=config['workers'])
+        futures = [executor.submit(train_maze_job, config, rows, cols, seed) for (rows, cols), seed in zip(maze_sizes, maze_seeds)]
+        print(f"-> Training {len(futures)} mazes in the background on {config['workers']} worker(s).")
+
+    # the window is only needed from here on, so --help, the prompts and the workers starting up don't wait for pygame
+    import pygame
+    from game import Game
+
+    for i, (rows, cols) in enumerate(maze_sizes):
         print(f"\n--- Maze {i+1}/{config['num_mazes']} ---")
         stats['total'] += 1
-        
-        # random maze size for variety
-        current_rows = config['rows'] + randint(-2, 2) * 2
-        current_cols = config['cols'] + randint(-3, 3) * 2
-        
-        maze = Maze(rows=max(7, current_rows), cols=max(7, current_cols))
-
-        agent = RLAgent(
-            learning_rate=config['lr'],
-            discount_factor=config['gamma'],
-            epsilon_start=1.0,
-            epsilon_end=0.01,
-            epsilon_decay=config['epsilon_decay'],
-            step_penalty=config['step_penalty']
-        )
-        
-        q_table_filename = f"q_table_{maze.rows}x{maze.cols}.pkl"
-        
-        if not config['no_cache'] and agent.load_q_table(q_table_filename):
-            pass # Q-table loaded, no training needed
+
+        if general_agent:
+            maze, agent = generate_maze(config, rows, cols, maze_seeds[i]), general_agent
+        elif executor:
+            maze, agent = unpack_job_result(config, futures[i].result(), cache)
+            print(f"-> Received {maze.rows}x{maze.cols} maze from worker, optimal path length is {maze.shortest_path_length} steps.")
         else:
-            agent.train(maze, num_episodes=config['episodes'])
-            agent.save_q_table(q_table_filename)
+            maze, agent = prepare_maze(config, rows, cols, cache, maze_seeds[i])
 
         # this loop handles retries
         while True:
-            game = Game(maze, agent)
+            game = Game(maze, agent, fast_forward=config['fast'], show_fps=config['show_fps'])
             result = game.run() # this loop runs until a key press (N, R, Q) or game over
 
             if result in ["success", "failed_timeout"]:
@@ -163,10 +233,16 @@ if __name__ == "__main__":
             print("-> User chose to quit the session.")
             break
             
+    if executor:
+        # don't wait for mazes nobody is going to look at
+        executor.shutdown(wait=False, cancel_futures=True)
+
     print("\n--- Session Summary ---")
     print(f"Mazes Attempted: {stats['total']}")
     print(f"Successful Solves: {stats['success']}")
     print(f"Failed Solves: {stats['failed']}")
+    cache_stats = cache.stats()
+    print(f"Q-table Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
     print("Exiting.")
     
     pygame.quit()
@@ -1,127 +1,151 @@
-from collections import deque
-from random import choice
+import random
+import numpy as np
 from constants import ACTION_MAP
+from generators import GENERATORS
+from pathfinding import bidirectional_bfs, distance_field
 
 class Maze:
     # handles maze generation, storage, and pathfinding
-    def __init__(self, rows, cols):
+    # the grid is stored as a numpy bool array (True = wall), the old list of strings
+    # is still available as maze.layout but only built when something asks for it
+    def __init__(self, rows, cols, packed=False, algorithm="backtracker", seed=None, verbose=True):
+        if algorithm not in GENERATORS:
+            raise ValueError(f"Unknown maze algorithm '{algorithm}', expected one of {tuple(GENERATORS)}")
         if rows % 2 == 0:
             rows += 1
         if cols % 2 == 0:
             cols += 1
         self.rows = rows
         self.cols = cols
-        
-        print(f"Generating a {self.rows}x{self.cols} maze...")
-        self.layout, self.start_pos, self.exit_pos = self._generate_layout()
-        print(f"-> Player Start: {self.start_pos}, Exit: {self.exit_pos}")
+        self.algorithm = algorithm
+        self.seed = seed # the same seed always generates the same maze, None draws from the random module
+        self._layout = None
+        self._distance_to_exit = None
+
+        # verbose=False skips the progress prints (bulk generation, see corpus.py), the warning still shows
+        if verbose:
+            print(f"Generating a {self.rows}x{self.cols} maze ({algorithm})...")
+        walls, self.start_pos, self.exit_pos = self._generate_layout()
+        self._set_walls(walls, packed)
+        if verbose:
+            print(f"-> Player Start: {self.start_pos}, Exit: {self.exit_pos}")
 
         self.shortest_path_length = self._find_shortest_path_bfs()
         if self.shortest_path_length == -1:
             print("!!! WARNING: Generated an unsolvable maze. This is rare and should not happen with this algorithm.")
-        else:
+        elif verbose:
             print(f"-> Optimal path length is {self.shortest_path_length} steps.")
 
+    def _set_walls(self, walls, packed):
+        # packed mazes keep only 1 bit per cell and unpack on demand (for very large mazes)
+        if packed:
+            self._walls = None
+            self._packed_walls = np.packbits(walls, axis=1)
+        else:
+            self._walls = walls
+            self._packed_walls = None
+
+    @property
+    def walls(self):
+        # (rows, cols) bool array, True where there is a wall
+        # for packed mazes this unpacks a fresh copy, so fetch it once outside of loops
+        if self._walls is not None:
+            return self._walls
+        return np.unpackbits(self._packed_walls, axis=1, count=self.cols).view(bool)
+
+    @property
+    def packed_walls(self):
+        # the wall grid at 1 bit per cell, rows padded to whole bytes (see Maze.from_packed)
+        if self._packed_walls is not None:
+            return self._packed_walls
+        return np.packbits(self._walls, axis=1)
+
+    @property
+    def layout(self):
+        # the original list of strings view: 'W' wall, ' ' path, 'P' start, 'E' exit
+        if self._layout is None:
+            chars = np.where(self.walls, ord('W'), ord(' ')).astype(np.uint8)
+            chars[self.start_pos] = ord('P')
+            chars[self.exit_pos] = ord('E')
+            self._layout = [row.tobytes().decode("ascii") for row in chars]
+        return self._layout
+
+    @classmethod
+    def from_walls(cls, walls, start_pos, exit_pos, shortest_path_length=None, packed=False):
+        # rebuilds an already generated maze (e.g. one handed back by a worker process)
+        walls = np.asarray(walls, dtype=bool)
+        maze = cls._rebuilt(*walls.shape, start_pos, exit_pos)
+        maze._set_walls(walls, packed)
+        if shortest_path_length is None:
+            shortest_path_length = maze._find_shortest_path_bfs()
+        maze.shortest_path_length = shortest_path_length
+        return maze
+
+    @classmethod
+    def _rebuilt(cls, rows, cols, start_pos, exit_pos, algorithm=None, seed=None):
+        # a Maze with everything but the walls and the shortest path length set, without generating anything
+        maze = cls.__new__(cls)
+        maze.rows, maze.cols = rows, cols
+        maze.algorithm = algorithm # None when unknown, it was generated elsewhere
+        maze.seed = seed
+        maze._layout = None
+        maze._distance_to_exit = None
+        maze.start_pos = tuple(start_pos)
+        maze.exit_pos = tuple(exit_pos)
+        return maze
+
+    @classmethod
+    def from_layout(cls, layout, start_pos, exit_pos, shortest_path_length=None):
+        walls = np.array([[char == 'W' for char in row] for row in layout], dtype=bool)
+        return cls.from_walls(walls, start_pos, exit_pos, shortest_path_length)
+
+    @classmethod
+    def from_packed(cls, packed_walls, cols, start_pos, exit_pos, shortest_path_length=None, packed=False):
+        walls = np.unpackbits(np.asarray(packed_walls, dtype=np.uint8), axis=1, count=cols).view(bool)
+        return cls.from_walls(walls, start_pos, exit_pos, shortest_path_length, packed)
+
+    @classmethod
+    def from_arrays(cls, packed_walls, rows, cols, start_pos, exit_pos, shortest_path_length, algorithm=None, seed=None, packed=False):
+        # rebuilds a maze from stored arrays (the corpus shards of corpus.py): the bit-packed grid and its metadata
+        # nothing is generated or searched, and with packed=True the packed grid is kept as it is
+        packed_walls = np.asarray(packed_walls, dtype=np.uint8).reshape(rows, (cols + 7) // 8)
+        maze = cls._rebuilt(rows, cols, start_pos, exit_pos, algorithm, seed)
+        if packed:
+            maze._walls = None
+            maze._packed_walls = packed_walls
+        else:
+            maze._set_walls(np.unpackbits(packed_walls, axis=1, count=cols).view(bool), False)
+        maze.shortest_path_length = int(shortest_path_length)
+        return maze
+
     def _generate_layout(self):
-        # algorithm called recursive backtracking
-        # dont FULLY understand this yet
-        # TODO read more about the algorithms
-        # understand the steps taken, but not how they make a maze
-
-        maze = [['W' for _ in range(self.cols)] for _ in range(self.rows)] # fill with walls initially
-        # stacks of trails left behid
-        stack = []
-
-        start_row, start_col = (1, 1)
-        # turns our starting point into a path (not wall)
-        maze[start_row][start_col] = ' '
-        stack.append((start_row, start_col)) # add to the trail stack
-
-        # as long as there are trails that haven't been backtracked to
-        while stack:
-            # our position is the last trail we left
-            current_row, current_col = stack[-1]
-
-            # find unvisited neighbors 2 cells away
-            # this list stores the possible coordinates to make a path to
-            neighbors = []
-            # it checks up down left and right TWO spots away not one
-            for row_delta, col_delta in [(-2, 0), (2, 0), (0, -2), (0, 2)]:
-                neighbor_row, neighbor_col = current_row + row_delta, current_col + col_delta
-                # if it's in bounds and available to make a path
-                if 0 < neighbor_row < self.rows-1 and 0 < neighbor_col < self.cols-1 and maze[neighbor_row][neighbor_col] == 'W':
-                    neighbors.append((neighbor_row, neighbor_col))
-
-            # if there ARE points to make a path to:
-            if neighbors:
-                # random choice of available points to make a path to (crucial for variation)
-                next_row, next_col = choice(neighbors)
-
-                # break wall between current cell and chosen neighbor
-                wall_row = current_row + (next_row - current_row) // 2
-                wall_col = current_col + (next_col - current_col) // 2
-                maze[wall_row][wall_col] = ' ' # turn wall into a path
-                
-                maze[next_row][next_col] = ' '
-                # leave another trail in the stack
-                stack.append((next_row, next_col))
-            else:
-                # if there aren't any neighbours available to go to
-                # then simply go back to the last point where you WERE able to make a trail
-                # and simply try another path
-                stack.pop()
+        # the actual carving is done by one of the algorithms in generators.py
+        rng = random.Random(self.seed) if self.seed is not None else None
+        maze = GENERATORS[self.algorithm](self.rows, self.cols, rng)
 
         # MAZE GENERATION COMPLETE
         # now player, entry, exit
+        return maze, (1, 1), self._farthest_exit((1, 1))
 
-        player_start_pos = (1, 1)
-        
+    def _farthest_exit(self, player_start_pos):
         # make a point of exit far from the starting point
-        # choose from a list of possible exits stored in this list
-        possible_exits = []
-        # Iterate over all valid path cells to find a valid exit
-        for r in range(1, self.rows, 2):
-            for c in range(1, self.cols, 2):
-                if (r, c) != player_start_pos:
-                    possible_exits.append((r, c))
-        
-        # now calculate which one is the furtherest
-        farthest_exit = None
-        max_dist = -1
-
-        for pos in possible_exits:
-            # how many steps up/down and how many steps left/right?
-            # then add these two to find total distance
-            distance = abs(pos[0] - player_start_pos[0]) + abs(pos[1] - player_start_pos[1])
-            # if this distance is more than the last highest, its the new highest
-            if distance > max_dist:
-                max_dist = distance
-                farthest_exit = pos
-        exit_pos = farthest_exit
-
-        # Mark player and exit on the layout
-        maze[player_start_pos[0]][player_start_pos[1]] = 'P'
-        maze[exit_pos[0]][exit_pos[1]] = 'E'
-        
-        return ["".join(row) for row in maze], player_start_pos, exit_pos
+        # every odd (row, col) is a path cell, pick the one with the biggest
+        # manhattan distance (steps up/down + steps left/right) from the start
+        cell_rows = np.arange(1, self.rows, 2)
+        cell_cols = np.arange(1, self.cols, 2)
+        distance = np.abs(cell_rows[:, None] - player_start_pos[0]) + np.abs(cell_cols[None, :] - player_start_pos[1])
+        r, c = np.unravel_index(np.argmax(distance), distance.shape)
+        return (int(cell_rows[r]), int(cell_cols[c]))
+
+    @property
+    def distance_to_exit(self):
+        # (rows, cols) int32 array of steps from every cell to the exit (-1 for walls), computed once
+        if self._distance_to_exit is None:
+            self._distance_to_exit = distance_field(self.walls, self.exit_pos)
+        return self._distance_to_exit
 
     def _find_shortest_path_bfs(self):
-        # Finds the shortest path from start to exit using Breadth-First Search
-        queue = deque([(self.start_pos, 0)]) # ((row, col), distance)
-        visited = {self.start_pos}
-        
-        while queue:
-            (row, col), distance = queue.popleft()
-            
-            if (row, col) == self.exit_pos: 
-                return distance
-            
-            for row_delta, col_delta, _ in ACTION_MAP.values():
-                next_row, next_col = row + row_delta, col + col_delta
-                
-                # Check if the next cell is valid and unvisited
-                if 0 <= next_row < self.rows and 0 <= next_col < self.cols and \
-                   self.layout[next_row][next_col] != 'W' and (next_row, next_col) not in visited:
-                    visited.add((next_row, next_col))
-                    queue.append(((next_row, next_col), distance + 1))
-        return -1 # Should not be reached in a valid maze
+        # Finds the shortest path from start to exit using Breadth-First Search (from both ends at once)
+        if self._distance_to_exit is not None:
+            return int(self._distance_to_exit[self.start_pos])
+        return bidirectional_bfs(self.walls, self.start_pos, self.exit_pos)
@@ -0,0 +1,166 @@
+import os
+import csv
+import json
+import pstats
+import cProfile
+from contextlib import contextmanager
+
+# training instrumentation
+# RLAgent.train / train_batched call every callback after each episode with a dict of stats:
+#   episode, steps, reward, epsilon, seconds (wall clock of the episode), transitions_per_sec,
+#   q_states (states in the Q-table) and max_delta_q (largest |change| of a Q-value in the episode)
+# callbacks only pay for what they do with it, the training loop itself just fills the dict
+
+EPISODE_FIELDS = ['episode', 'steps', 'reward', 'epsilon', 'seconds', 'transitions_per_sec', 'q_states', 'max_delta_q']
+
+# the functions of the training hot loop, these are what the profiler summary shows
+# (moves and rewards are table lookups inside the training loops themselves, see transitions.py)
+HOT_LOOP_FUNCTIONS = ('choose_action', 'update_q_table', 'train', 'dyna_q')
+
+
+class TrainingCallback:
+    # base class, override whichever hooks are needed
+    def on_train_begin(self, agent, maze, num_episodes):
+        pass
+
+    def on_episode_end(self, agent, stats):
+        pass
+
+    def on_train_end(self, agent, summary):
+        # summary has episodes, transitions, seconds and transitions_per_sec for the whole run
+        pass
+
+
+class ProgressPrinter(TrainingCallback):
+    # the classic "...Episode:" lines, 20 of them per training run
+    def on_train_begin(self, agent, maze, num_episodes):
+        self.num_episodes = num_episodes
+        self.every = num_episodes // 20 or 1
+
+    def on_episode_end(self, agent, stats):
+        if stats['episode'] % self.every == 0:
+            print(f"  ...Episode: {stats['episode']:>6}/{self.num_episodes}, Steps: {stats['steps']:<4}, Reward: {stats['reward']:6.1f}, Epsilon: {stats['epsilon']:.4f}")
+
+
+class MetricsSink(TrainingCallback):
+    # writes every `every`-th episode's stats to a .csv or .jsonl file (picked by the extension)
+    # rows are buffered by the file object, so sampling every episode is still cheap
+    def __init__(self, filepath, every=1, label=None):
+        self.filepath = filepath
+        self.every = max(1, every)
+        self.label = label # e.g. which maze, written as an extra column
+        self.jsonl = filepath.endswith(".jsonl")
+        self.file = None
+        self.writer = None
+
+    def on_train_begin(self, agent, maze, num_episodes):
+        new_file = not os.path.exists(self.filepath) or os.path.getsize(self.filepath) == 0
+        self.file = open(self.filepath, 'a', newline='')
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=['label'] + EPISODE_FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def on_episode_end(self, agent, stats):
+        if stats['episode'] % self.every:
+            return
+        row = {'label': self.label, **stats}
+        if self.jsonl:
+            self.file.write(json.dumps(row) + "\n")
+        else:
+            self.writer.writerow(row)
+
+    def on_train_end(self, agent, summary):
+        self.file.close()
+
+
+class MetricsRecorder(TrainingCallback):
+    # keeps every `every`-th episode's stats in memory (self.rows), for callers that send them on elsewhere
+    def __init__(self, every=1):
+        self.every = max(1, every)
+        self.rows = []
+        self.summary = None # on_train_end's summary, None until training finished (or when nothing was trained)
+
+    def on_episode_end(self, agent, stats):
+        if stats['episode'] % self.every == 0:
+            self.rows.append(dict(stats))
+
+    def on_train_end(self, agent, summary):
+        self.summary = summary
+
+
+class EarlyStopping(TrainingCallback):
+    # stops training once the agent has converged instead of always running every episode
+    # every check_every episodes the greedy policy is played out (agent.greedy_rollout) and the check passes when
+    #   - it reaches the exit in at most shortest_path_length * (1 + tolerance) steps
+    #     (mazes without a known shortest path only need to reach the exit)
+    #   - it takes the same number of steps as at the previous check
+    #   - with delta_q_tolerance set, no Q-value changed by more than that since the previous check
+    # patience checks passing in a row stop training
+    def __init__(self, check_every=50, patience=3, tolerance=0.0, delta_q_tolerance=None, verbose=True):
+        self.check_every = max(1, check_every)
+        self.patience = max(1, patience)
+        self.tolerance = tolerance
+        self.delta_q_tolerance = delta_q_tolerance
+        self.verbose = verbose
+
+    def on_train_begin(self, agent, maze, num_episodes):
+        self.maze = maze
+        self.num_episodes = num_episodes
+        self.max_steps = None
+        if maze.shortest_path_length is not None and maze.shortest_path_length > 0:
+            self.max_steps = int(maze.shortest_path_length * (1 + self.tolerance))
+        self.passed = 0
+        self.last_steps = None
+        self.window_delta_q = 0.0
+        self.stopped_episode = None
+        self.reason = None
+
+    def on_episode_end(self, agent, stats):
+        self.window_delta_q = max(self.window_delta_q, stats['max_delta_q'])
+        if stats['episode'] % self.check_every:
+            return
+
+        # a policy longer than max_steps fails anyway, so the rollout doesn't need to go further
+        solved, steps = agent.greedy_rollout(self.maze, max_steps=self.max_steps)
+        stable = solved and steps == self.last_steps
+        if self.delta_q_tolerance is not None and self.window_delta_q > self.delta_q_tolerance:
+            stable = False
+        self.passed = self.passed + 1 if stable else 0
+        self.last_steps = steps if solved else None
+        window_delta_q, self.window_delta_q = self.window_delta_q, 0.0
+
+        if self.passed >= self.patience:
+            self.stopped_episode = stats['episode']
+            self.reason = f"greedy path of {steps} steps"
+            if self.maze.shortest_path_length:
+                self.reason += f" (shortest {self.maze.shortest_path_length})"
+            self.reason += f" unchanged for {self.patience} checks, max |dQ| {window_delta_q:.4g}"
+            agent.stop_training = True
+
+    def on_train_end(self, agent, summary):
+        if self.verbose and self.stopped_episode is not None:
+            saved = self.num_episodes - self.stopped_episode
+            print(f"Early stop at episode {self.stopped_episode}/{self.num_episodes}: {self.reason}, "
+                  f"saved {saved} episodes ({saved / self.num_episodes:.0%})")
+
+    def episodes_saved(self):
+        return 0 if self.stopped_episode is None else self.num_episodes - self.stopped_episode
+
+
+@contextmanager
+def profiled(filepath=None, top=15):
+    # cProfile around a block (normally one training run)
+    # prints the hot loop functions and, with a filepath, dumps the full stats for snakeviz / pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if filepath:
+            profiler.dump_stats(filepath)
+            print(f"Profile written to {filepath}")
+        stats = pstats.Stats(profiler).sort_stats("tottime")
+        print("--- Training hot loop ---")
+        stats.print_stats("|".join(HOT_LOOP_FUNCTIONS), top)
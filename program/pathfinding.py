@@ -0,0 +1,109 @@
+import heapq
+import numpy as np
+
+# shortest path search on a (rows, cols) bool wall grid
+# cells are flat integers (row * cols + col) instead of (row, col) tuples, and the grid is a flat
+# list of bools, which is the cheapest thing to index one cell at a time in python
+
+
+def _flat_open_cells(walls):
+    # flat list with True for every cell that is not a wall
+    walls = np.asarray(walls, dtype=bool)
+    rows, cols = walls.shape
+    return (~walls).ravel().tolist(), rows, cols
+
+
+def _neighbors(cell, open_cells, cols, size):
+    # up, down, left, right (the ACTION_MAP order), skipping walls and the edge of the grid
+    col = cell % cols
+    if cell >= cols and open_cells[cell - cols]:
+        yield cell - cols
+    if cell + cols < size and open_cells[cell + cols]:
+        yield cell + cols
+    if col > 0 and open_cells[cell - 1]:
+        yield cell - 1
+    if col < cols - 1 and open_cells[cell + 1]:
+        yield cell + 1
+
+
+def bidirectional_bfs(walls, start, goal):
+    # length of the shortest start -> goal path, or -1 if there is none
+    # grows one BFS frontier from each end (always the smaller one) until they meet
+    open_cells, rows, cols = _flat_open_cells(walls)
+    size = rows * cols
+    start = start[0] * cols + start[1]
+    goal = goal[0] * cols + goal[1]
+    if start == goal:
+        return 0
+
+    # distance of every reached cell, from its own side
+    seen_from = [{start: 0}, {goal: 0}]
+    frontiers = [[start], [goal]]
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        seen, other_seen = seen_from[side], seen_from[1 - side]
+        next_frontier = []
+        for cell in frontiers[side]:
+            distance = seen[cell] + 1
+            for neighbor in _neighbors(cell, open_cells, cols, size):
+                if neighbor in other_seen:
+                    return distance + other_seen[neighbor]
+                if neighbor not in seen:
+                    seen[neighbor] = distance
+                    next_frontier.append(neighbor)
+        frontiers[side] = next_frontier
+    return -1
+
+
+def astar(walls, start, goal):
+    # shortest start -> goal path as a list of (row, col), both ends included, or None
+    # A* with the manhattan distance, which never overestimates on a 4-connected grid
+    open_cells, rows, cols = _flat_open_cells(walls)
+    size = rows * cols
+    goal_row, goal_col = goal
+    start = start[0] * cols + start[1]
+    goal = goal_row * cols + goal_col
+
+    came_from = {start: None}
+    cost = {start: 0}
+    heap = [(0, start)]
+    while heap:
+        _, cell = heapq.heappop(heap)
+        if cell == goal:
+            path = []
+            while cell is not None:
+                path.append(divmod(cell, cols))
+                cell = came_from[cell]
+            return path[::-1]
+        next_cost = cost[cell] + 1
+        for neighbor in _neighbors(cell, open_cells, cols, size):
+            if next_cost < cost.get(neighbor, size):
+                cost[neighbor] = next_cost
+                came_from[neighbor] = cell
+                row, col = divmod(neighbor, cols)
+                heapq.heappush(heap, (next_cost + abs(row - goal_row) + abs(col - goal_col), neighbor))
+    return None
+
+
+def distance_field(walls, target):
+    # BFS outwards from target: a (rows, cols) int32 array with the number of steps from every cell
+    # to target, -1 for walls and cells that can't reach it
+    open_cells, rows, cols = _flat_open_cells(walls)
+    size = rows * cols
+    distances = [-1] * size
+    target = target[0] * cols + target[1]
+    distances[target] = 0
+
+    frontier = [target]
+    distance = 0
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for cell in frontier:
+            for neighbor in _neighbors(cell, open_cells, cols, size):
+                if distances[neighbor] == -1:
+                    distances[neighbor] = distance
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return np.array(distances, dtype=np.int32).reshape(rows, cols)
+
@@ -0,0 +1,486 @@
+import time
+import heapq
+
+import numpy as np
+
+from constants import NUM_ACTIONS
+from graph import MazeGraph
+from transitions import TransitionTable
+
+# alternatives to RLAgent.train
+# the maze is fully known, so instead of sampling transitions one at a time the agent can plan with the
+# exact model Player.move and get_reward apply (transitions.TransitionTable):
+#   "value_iteration" sweeps Bellman updates over every cell at once with numpy until the values settle
+#   "dyna_q"          is Q-learning on real episodes, plus planning_steps replayed transitions from a learned
+#                     model after every real step
+#   "graph_q"         is Q-learning on the junction graph (graph.MazeGraph), one decision per corridor instead of
+#                     one per cell
+#   "prioritized_sweeping"  is like dyna_q, but the planning steps go backward from the exit through the states'
+#                     known predecessors, largest value change first
+# and one that changes the update itself:
+#   "q_lambda"        is Watkins's Q(lambda), every TD error also updates the steps that led up to it
+# one-step Q-learning moves the exit reward back one cell per visit, these move it along the whole path
+# all of them leave a normal Q-table on the agent, so choose_action(exploit_only=True) and Game play them as usual
+
+SOLVERS = ("q_learning", "value_iteration", "dyna_q", "graph_q", "q_lambda", "prioritized_sweeping")
+
+
+def value_iteration(agent, maze, tolerance=1e-4, max_sweeps=None):
+    # Q(s, a) = r(s, a) + gamma * max Q(s', .) for every open cell and action in one vectorized sweep,
+    # repeated until no value moves by more than tolerance
+    # the exit is terminal (its values stay 0, like in train() where no step is ever taken from it)
+    # installs the table on agent and returns the number of sweeps
+    print("Starting value iteration...")
+    start = time.perf_counter()
+    table = TransitionTable(maze, agent.step_penalty, agent.reward_shaping)
+    open_cells = np.flatnonzero(~maze.walls.ravel())
+    open_cells = open_cells[open_cells != table.exit_cell]
+    next_cells, rewards = table.next_cells[open_cells], table.rewards[open_cells]
+
+    # walls and the exit are never updated and keep a value of 0
+    values = np.zeros(maze.rows * maze.cols)
+    # nothing has settled before the exit reward has reached every cell, which takes as many sweeps as
+    # the longest distance to the exit (the step penalties alone can fall below tolerance before that)
+    min_sweeps = int(maze.distance_to_exit.max()) + 1
+    max_sweeps = max_sweeps or maze.rows * maze.cols * 4
+    for sweep in range(1, max_sweeps + 1):
+        q_values = rewards + agent.gamma * values[next_cells]
+        new_values = q_values.max(axis=1)
+        change = np.abs(new_values - values[open_cells]).max() if len(open_cells) else 0.0
+        values[open_cells] = new_values
+        if change < tolerance and sweep >= min_sweeps:
+            break
+
+    q_table = np.zeros((maze.rows * maze.cols, NUM_ACTIONS), dtype=np.float32)
+    q_table[open_cells] = rewards + agent.gamma * values[next_cells]
+    agent.prepare_q_table(maze)
+    agent.set_q_table(q_table.reshape(maze.rows, maze.cols, NUM_ACTIONS), (maze.rows, maze.cols))
+    agent.episodes_trained = 0
+    print(f"Value iteration converged after {sweep} sweeps ({time.perf_counter() - start:.2f}s).")
+    return sweep
+
+
+def dyna_q(agent, maze, num_episodes, planning_steps=10, callbacks=()):
+    # Dyna-Q: every real step updates Q and records (reward, next state) in the model, then planning_steps
+    # transitions picked at random from the model are replayed through the same update
+    # episodes, callbacks (and so early stopping) and the return value work like RLAgent.train
+    print(f"Starting Dyna-Q training for {num_episodes} episodes ({planning_steps} planning steps per step)...")
+    agent.epsilon = agent.epsilon_start
+    agent.prepare_q_table(maze)
+    total_steps = 0
+
+    # real steps are looked up in the transition table like in RLAgent.train
+    table = TransitionTable(maze, agent.step_penalty, agent.reward_shaping)
+    next_cells, rewards, terminal = table.as_lists()
+    keys = agent._state_keys(table)
+    max_steps_per_episode = maze.rows * maze.cols
+    # (state, action) -> (reward, next state), plus the keys in a list to sample from
+    model = {}
+    observed = []
+    randrange = agent.rng.randrange
+
+    callbacks = agent._start_training(maze, num_episodes, callbacks)
+    train_start = time.perf_counter()
+    for episode in range(num_episodes):
+        episode_start = time.perf_counter()
+        cell = table.start_cell
+        state_key = keys[cell]
+        total_reward = 0
+        max_delta_q = 0.0
+
+        for step in range(max_steps_per_episode):
+            action = agent.choose_action(state_key)
+            reward = rewards[cell][action]
+            done = terminal[cell][action]
+            cell = next_cells[cell][action]
+            next_state_key = keys[cell]
+            total_reward += reward
+            delta_q = agent.update_q_table(state_key, action, reward, next_state_key)
+            if delta_q > max_delta_q:
+                max_delta_q = delta_q
+
+            if (state_key, action) not in model:
+                observed.append((state_key, action))
+            model[state_key, action] = (reward, next_state_key)
+            for _ in range(planning_steps):
+                planned_state, planned_action = observed[randrange(len(observed))]
+                planned_reward, planned_next = model[planned_state, planned_action]
+                agent.update_q_table(planned_state, planned_action, planned_reward, planned_next)
+
+            state_key = next_state_key
+            if done:
+                break
+
+        total_steps += step + 1
+        if agent.epsilon > agent.epsilon_end:
+            agent.epsilon *= agent.epsilon_decay
+
+        seconds = time.perf_counter() - episode_start
+        stats = {
+            'episode': episode + 1,
+            'steps': step + 1,
+            'reward': total_reward,
+            'epsilon': agent.epsilon,
+            'seconds': seconds,
+            'transitions_per_sec': (step + 1) / seconds if seconds > 0 else 0.0,
+            'q_states': agent.q_states(),
+            'max_delta_q': max_delta_q,
+        }
+        for callback in callbacks:
+            callback.on_episode_end(agent, stats)
+        if agent.stop_training:
+            break
+
+    agent._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+    return total_steps
+
+
+def _edge_returns(graph, table, gamma):
+    # for every step i of every edge walk, the discounted reward from there to the end of the edge and
+    # gamma ** (steps left); at i = 0 that's the whole edge as one SMDP transition
+    rewards = table.rewards[graph.walk_cells, graph.walk_actions].tolist()
+    returns = [0.0] * len(rewards)
+    discounts = [0.0] * len(rewards)
+    offsets = graph.offsets
+    for edge in range(len(offsets) - 1):
+        value, discount = 0.0, 1.0
+        for i in range(offsets[edge + 1] - 1, offsets[edge] - 1, -1):
+            value = rewards[i] + gamma * value
+            discount *= gamma
+            returns[i] = value
+            discounts[i] = discount
+    return rewards, returns, discounts
+
+
+def _expand_graph_q(graph, node_q, returns, discounts, size):
+    # cell level (size, NUM_ACTIONS) Q-table from the node Q-values:
+    #   node cells         Q(node, a) as learned
+    #   cells of an edge   the rest of the edge's reward plus the discounted value of the node it ends at,
+    #                      for both ways along the corridor
+    #   everything else    -inf, so walls (and pruned branches) are never the greedy move
+    num_actions = NUM_ACTIONS
+    node_values = [0.0 if node == graph.exit_node else max(values) for node, values in enumerate(node_q)]
+    edge_targets = np.array(graph.next_node).ravel()
+    edge_lengths = np.diff(graph.offsets)
+    entry_targets = np.repeat(edge_targets, edge_lengths)
+    q_table = np.full((size, num_actions), -np.inf, dtype=np.float32)
+    q_table[graph.walk_cells, graph.walk_actions] = (np.asarray(returns)
+                                                      + np.asarray(discounts) * np.asarray(node_values)[entry_targets])
+    q_table[graph.node_cells] = node_q
+    return q_table
+
+
+def graph_q(agent, maze, num_episodes, prune_dead_ends=False, callbacks=()):
+    # SMDP Q-learning on the junction graph: in every node the agent picks a corridor, and that whole corridor is
+    # one update with its discounted reward sum R and gamma ** length as the discount:
+    #   Q(n, a) += lr * (R + gamma ** length * max Q(n', .) - Q(n, a))
+    # the rewards are the ones train() would collect cell by cell (TransitionTable); moves into walls don't exist
+    # on the graph, so only junctions are ever decided on
+    # the node values are expanded into a normal cell level Q-table afterwards (_expand_graph_q), and with
+    # callbacks after every episode too, so early stopping and Game play it like any other
+    # episodes, steps and rewards are counted in cells like RLAgent.train; q_states is the number of nodes
+    print(f"Starting graph Q-learning for {num_episodes} episodes...")
+    build_start = time.perf_counter()
+    graph = MazeGraph(maze, prune_dead_ends=prune_dead_ends)
+    table = TransitionTable(maze, agent.step_penalty, agent.reward_shaping)
+    rewards, returns, discounts = _edge_returns(graph, table, agent.gamma)
+    print(f"Junction graph: {graph.num_nodes} nodes and {graph.num_edges()} corridors for "
+          f"{int((~maze.walls).sum())} open cells ({time.perf_counter() - build_start:.2f}s).")
+
+    # per node and direction: (target node, length, R, gamma ** length, undiscounted reward, reaches the exit)
+    edges = []
+    for node in range(graph.num_nodes):
+        node_edges = []
+        for action in range(NUM_ACTIONS):
+            target = graph.next_node[node][action]
+            if target < 0:
+                node_edges.append(None)
+                continue
+            start, end = graph.offsets[node * NUM_ACTIONS + action], graph.offsets[node * NUM_ACTIONS + action + 1]
+            node_edges.append((target, end - start, returns[start], discounts[start], sum(rewards[start:end]),
+                               target == graph.exit_node))
+        edges.append(node_edges)
+    legal = [[action for action in range(NUM_ACTIONS) if node_edges[action]] for node_edges in edges]
+    node_q = [[0.0 if node_edges[action] else -np.inf for action in range(NUM_ACTIONS)] for node_edges in edges]
+    size = maze.rows * maze.cols
+
+    agent.epsilon = agent.epsilon_start
+    agent.prepare_q_table(maze)
+    rng = agent.rng
+    user_callbacks = bool(callbacks)
+    total_steps = 0
+    callbacks = agent._start_training(maze, num_episodes, callbacks)
+    train_start = time.perf_counter()
+    for episode in range(num_episodes):
+        episode_start = time.perf_counter()
+        node = graph.start_node
+        steps = 0
+        decisions = 0
+        total_reward = 0
+        max_delta_q = 0.0
+
+        while steps < size and legal[node] and node != graph.exit_node:
+            if rng.random() < agent.epsilon:
+                action = legal[node][rng.randrange(len(legal[node]))]
+            else:
+                action = max(legal[node], key=node_q[node].__getitem__)
+            target, length, edge_return, discount, edge_reward, done = edges[node][action]
+            future = 0.0 if done else discount * max(node_q[target])
+            change = agent.lr * (edge_return + future - node_q[node][action])
+            node_q[node][action] += change
+            if abs(change) > max_delta_q:
+                max_delta_q = abs(change)
+            steps += length
+            decisions += 1
+            total_reward += edge_reward
+            node = target
+
+        total_steps += steps
+        if agent.epsilon > agent.epsilon_end:
+            agent.epsilon *= agent.epsilon_decay
+        if user_callbacks:
+            agent.set_q_table(_expand_graph_q(graph, node_q, returns, discounts, size).reshape(maze.rows, maze.cols, NUM_ACTIONS),
+                              (maze.rows, maze.cols))
+
+        seconds = time.perf_counter() - episode_start
+        stats = {
+            'episode': episode + 1,
+            'steps': steps,
+            'reward': total_reward,
+            'epsilon': agent.epsilon,
+            'seconds': seconds,
+            'transitions_per_sec': decisions / seconds if seconds > 0 else 0.0,
+            'q_states': graph.num_nodes,
+            'max_delta_q': max_delta_q,
+        }
+        for callback in callbacks:
+            callback.on_episode_end(agent, stats)
+        if agent.stop_training:
+            break
+
+    agent.set_q_table(_expand_graph_q(graph, node_q, returns, discounts, size).reshape(maze.rows, maze.cols, NUM_ACTIONS),
+                      (maze.rows, maze.cols))
+    agent._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+    return total_steps
+
+
+def q_lambda(agent, maze, num_episodes, trace_lambda=0.8, trace_cutoff=1e-3, callbacks=()):
+    # Watkins's Q(lambda) with replacing traces: the TD error of every step also updates the state/actions
+    # before it in the episode, weighted by (gamma * lambda) ** steps ago
+    #   replacing  a state keeps a trace only for the action taken at its latest visit, at weight 1 again
+    #   Watkins    the traces are cut after an exploratory action, the steps before it weren't the greedy policy
+    #   masked     moves into walls are -inf and never explored, like graph_q and --mask_actions: with the table
+    #              starting at 0, a wall bump's -10 would otherwise be pushed back along the trace onto the moves
+    #              before it, and once epsilon is low the greedy policy can get stuck without ever reaching the exit
+    # what that buys, in episodes to an optimal greedy path (python bench.py credit / solvers):
+    #   - with a fast epsilon decay (0.99) the traces carry the exit reward back along whole corridors, about
+    #     2-4x fewer episodes than one-step Q-learning and than this with lambda 0
+    #   - with a slow decay (0.9998) exploration cuts the traces almost every step, and the gain over one-step
+    #     Q-learning (up to 4x on small mazes, little on big ones) comes from the masking, not the traces
+    #   - each step updates the whole window instead of one value, so an episode costs several times a one-step
+    #     one and the wall clock time is mostly no better than one-step Q-learning in this python loop
+    # the trace is the window of the last steps with a weight above trace_cutoff (since the last cut), kept as
+    # arrays of the episode's cells and actions, so one step's update is a single fancy indexed add
+    # episodes, callbacks and the return value work like RLAgent.train
+    if agent.q_backend != "dense":
+        raise ValueError("Q(lambda) needs the dense Q-table backend")
+    if not 0 <= trace_lambda <= 1:
+        raise ValueError("trace_lambda must be between 0 and 1")
+    print(f"Starting Q(lambda) training for {num_episodes} episodes (lambda {trace_lambda})...")
+    agent.epsilon = agent.epsilon_start
+    agent.prepare_q_table(maze)
+    # one row per flat cell, a view so updates land in agent.q_table
+    q = agent.q_table.reshape(-1, NUM_ACTIONS)
+    total_steps = 0
+
+    table = TransitionTable(maze, agent.step_penalty, agent.reward_shaping)
+    next_cells, rewards, terminal = table.as_lists()
+    max_steps_per_episode = maze.rows * maze.cols
+    # a move that stays in its cell ran into a wall (or the edge of the grid)
+    blocked = table.next_cells == np.arange(max_steps_per_episode)[:, None]
+    q[blocked] = -np.inf
+    legal = [np.flatnonzero(~row).tolist() for row in blocked]
+    decay = agent.gamma * trace_lambda
+    window = int(np.ceil(np.log(trace_cutoff) / np.log(decay))) if 0 < decay < 1 else max_steps_per_episode
+    window = max(1, min(window, max_steps_per_episode))
+    # weights[k] is the trace of the step k steps ago
+    weights = decay ** np.arange(window)
+    visited_cells = np.empty(max_steps_per_episode, dtype=np.int64)
+    visited_actions = np.empty(max_steps_per_episode, dtype=np.int64)
+    steps_taken = np.arange(max_steps_per_episode)
+    rng = agent.rng
+
+    callbacks = agent._start_training(maze, num_episodes, callbacks)
+    train_start = time.perf_counter()
+    for episode in range(num_episodes):
+        episode_start = time.perf_counter()
+        # the step of every cell's latest visit this episode
+        last_visit = np.full(maze.rows * maze.cols, -1, dtype=np.int64)
+        trace_start = 0
+        cell = table.start_cell
+        if rng.random() < agent.epsilon:
+            action = legal[cell][rng.randrange(len(legal[cell]))]
+        else:
+            values = q[cell].tolist()
+            action = values.index(max(values))
+        total_reward = 0
+        max_delta_q = 0.0
+
+        for step in range(max_steps_per_episode):
+            reward = rewards[cell][action]
+            done = terminal[cell][action]
+            next_cell = next_cells[cell][action]
+            total_reward += reward
+            visited_cells[step] = cell
+            visited_actions[step] = action
+            last_visit[cell] = step
+
+            next_values = q[next_cell].tolist()
+            best_value = max(next_values)
+            delta = (reward if done else reward + agent.gamma * best_value) - q.item(cell, action)
+            if not done:
+                # the next action is picked before the update, Watkins's cut depends on it
+                if rng.random() < agent.epsilon:
+                    moves = legal[next_cell]
+                    next_action = moves[rng.randrange(len(moves))]
+                else:
+                    next_action = next_values.index(best_value)
+
+            first = max(trace_start, step - window + 1)
+            cells = visited_cells[first:step + 1]
+            live = last_visit[cells] == steps_taken[first:step + 1]
+            q[cells[live], visited_actions[first:step + 1][live]] += agent.lr * delta * weights[step - first::-1][live]
+            if abs(agent.lr * delta) > max_delta_q:
+                max_delta_q = abs(agent.lr * delta)
+
+            if done:
+                break
+            if next_values[next_action] < best_value:
+                trace_start = step + 1
+            cell, action = next_cell, next_action
+
+        total_steps += step + 1
+        if agent.epsilon > agent.epsilon_end:
+            agent.epsilon *= agent.epsilon_decay
+
+        seconds = time.perf_counter() - episode_start
+        stats = {
+            'episode': episode + 1,
+            'steps': step + 1,
+            'reward': total_reward,
+            'epsilon': agent.epsilon,
+            'seconds': seconds,
+            'transitions_per_sec': (step + 1) / seconds if seconds > 0 else 0.0,
+            'q_states': agent.q_states(),
+            'max_delta_q': max_delta_q,
+        }
+        for callback in callbacks:
+            callback.on_episode_end(agent, stats)
+        if agent.stop_training:
+            break
+
+    agent._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+    return total_steps
+
+
+def prioritized_sweeping(agent, maze, num_episodes, planning_steps=10, threshold=1e-4, callbacks=()):
+    # Q-learning on real episodes plus up to planning_steps model updates after every real step, like dyna_q,
+    # but the updates go where values are changing instead of to random remembered transitions:
+    # the model is known, so is every state's list of predecessors (the state/actions that lead into it);
+    # whenever a state's value changes, its predecessors are queued by how much their own value would change
+    # (if more than threshold), and the biggest changes are applied first
+    # the queue starts out with the moves into the exit, so the exit reward sweeps backward from the first step on
+    # episodes, callbacks and the return value work like RLAgent.train
+    if agent.q_backend != "dense":
+        raise ValueError("Prioritized sweeping needs the dense Q-table backend")
+    print(f"Starting prioritized sweeping for {num_episodes} episodes ({planning_steps} planning steps per step)...")
+    agent.epsilon = agent.epsilon_start
+    agent.prepare_q_table(maze)
+    q = agent.q_table.reshape(-1, NUM_ACTIONS)
+    total_steps = 0
+
+    table = TransitionTable(maze, agent.step_penalty, agent.reward_shaping)
+    next_cells, rewards, terminal = table.as_lists()
+    keys = agent._state_keys(table)
+    max_steps_per_episode = maze.rows * maze.cols
+    gamma, lr = agent.gamma, agent.lr
+    # every open cell but the exit can be left (walking into a wall leads back to the same cell)
+    predecessors = [[] for _ in range(max_steps_per_episode)]
+    for cell in np.flatnonzero(~maze.walls.ravel()).tolist():
+        if cell != table.exit_cell:
+            for action in range(NUM_ACTIONS):
+                predecessors[next_cells[cell][action]].append((cell, action))
+    # heap of (-priority, cell, action), and the priority each queued state/action was last pushed with
+    # (older, smaller entries for it are skipped when popped)
+    queue = []
+    queued = {}
+
+    def error(cell, action):
+        reward = rewards[cell][action]
+        target = reward if terminal[cell][action] else reward + gamma * max(q[next_cells[cell][action]].tolist())
+        return target - q.item(cell, action)
+
+    def push_predecessors(cell):
+        for previous, action in predecessors[cell]:
+            priority = abs(error(previous, action))
+            if priority > threshold and priority > queued.get((previous, action), 0.0):
+                queued[previous, action] = priority
+                heapq.heappush(queue, (-priority, previous, action))
+
+    push_predecessors(table.exit_cell)
+
+    callbacks = agent._start_training(maze, num_episodes, callbacks)
+    train_start = time.perf_counter()
+    for episode in range(num_episodes):
+        episode_start = time.perf_counter()
+        cell = table.start_cell
+        total_reward = 0
+        max_delta_q = 0.0
+
+        for step in range(max_steps_per_episode):
+            action = agent.choose_action(keys[cell])
+            reward = rewards[cell][action]
+            done = terminal[cell][action]
+            change = lr * error(cell, action)
+            q[cell, action] += change
+            if abs(change) > max_delta_q:
+                max_delta_q = abs(change)
+            total_reward += reward
+            push_predecessors(cell)
+
+            planned = 0
+            while queue and planned < planning_steps:
+                priority, planned_cell, planned_action = heapq.heappop(queue)
+                if queued.get((planned_cell, planned_action)) != -priority:
+                    continue # stale, it was queued again with a bigger priority
+                del queued[planned_cell, planned_action]
+                q[planned_cell, planned_action] += lr * error(planned_cell, planned_action)
+                push_predecessors(planned_cell)
+                planned += 1
+
+            cell = next_cells[cell][action]
+            if done:
+                break
+
+        total_steps += step + 1
+        if agent.epsilon > agent.epsilon_end:
+            agent.epsilon *= agent.epsilon_decay
+
+        seconds = time.perf_counter() - episode_start
+        stats = {
+            'episode': episode + 1,
+            'steps': step + 1,
+            'reward': total_reward,
+            'epsilon': agent.epsilon,
+            'seconds': seconds,
+            'transitions_per_sec': (step + 1) / seconds if seconds > 0 else 0.0,
+            'q_states': agent.q_states(),
+            'max_delta_q': max_delta_q,
+        }
+        for callback in callbacks:
+            callback.on_episode_end(agent, stats)
+        if agent.stop_training:
+            break
+
+    agent._finish_training(callbacks, episode + 1, total_steps, time.perf_counter() - train_start)
+    return total_steps
@@ -1,4 +1,3 @@
-import pygame
 from constants import TILE_SIZE, COLOR_PLAYER
 
 class Player:
@@ -7,25 +6,27 @@ class Player:
         self.row, self.col = start_pos
         self.maze_rows = maze_rows
         self.maze_cols = maze_cols
-        self.radius = int(TILE_SIZE * 0.35)
 
-    def move(self, row_delta, col_delta, maze_layout):
+    def move(self, row_delta, col_delta, maze_walls):
         # moves the player and returns if it managed to move or not, and the reason why
+        # maze_walls is the maze's (rows, cols) bool wall grid
         next_row = self.row + row_delta
         next_col = self.col + col_delta
         
         if not (0 <= next_row < self.maze_rows and 0 <= next_col < self.maze_cols):
             return False, "boundary"
-        if maze_layout[next_row][next_col] == 'W':
+        if maze_walls[next_row, next_col]:
             return False, "wall"
             
         self.row, self.col = next_row, next_col
         return True, "moved"
 
-    def draw(self, screen):
-        center_x = self.col * TILE_SIZE + TILE_SIZE // 2
-        center_y = self.row * TILE_SIZE + TILE_SIZE // 2
-        pygame.draw.circle(screen, COLOR_PLAYER, (center_x, center_y), self.radius)
+    def draw(self, screen, tile_size=TILE_SIZE):
+        # imported here so training and headless evaluation never load pygame
+        import pygame
+        center_x = self.col * tile_size + tile_size // 2
+        center_y = self.row * tile_size + tile_size // 2
+        pygame.draw.circle(screen, COLOR_PLAYER, (center_x, center_y), int(tile_size * 0.35))
 
     def reset(self):
         # back to start
@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+
+# content addressed Q-table cache
+# a table is only reused for exactly the same maze (walls, start, exit) trained with exactly the same
+# hyperparameters, so two different mazes of the same size never share a table
+# files live in one directory as <key>.qtb, and the least recently used ones are deleted once the
+# directory grows past its size budget
+
+# config entries that change what training produces
+TRAINING_KEYS = ('lr', 'gamma', 'epsilon_decay', 'step_penalty', 'episodes', 'reward_shaping', 'num_envs')
+# only part of the key when early stopping is on, so tables trained without it keep their keys
+EARLY_STOP_KEYS = ('early_stop_every', 'early_stop_patience', 'early_stop_tolerance', 'early_stop_delta_q')
+# likewise only for the model based solvers (see planning.py)
+SOLVER_KEYS = ('solver', 'planning_steps')
+# and for graph_q, whose graph loses the dead ends with prune_dead_ends
+GRAPH_KEYS = ('prune_dead_ends',)
+# and for q_lambda
+TRACE_KEYS = ('trace_lambda',)
+# and for the compact backend, whose precision and action masking change what training produces
+COMPACT_KEYS = ('compact_dtype', 'mask_actions')
+
+
+def trainer_name(config):
+    # what actually trains the table: the solver, or for plain Q-learning which of its trainers
+    if config['solver'] != "q_learning":
+        return config['solver']
+    if config['num_envs'] > 1:
+        return "batched"
+    return "jit" if config['jit'] else "python"
+
+
+def cache_key(maze, config, backend, seed=None):
+    # sha256 of the maze contents plus the training hyperparameters
+    # backend is the agent's own q_backend (not config's, which some trainers override) and seed the agent's
+    # seed: the same settings on another backend, trainer or seed train a different table
+    # unseeded agents (seed None) all share one key, like before seeding existed
+    digest = hashlib.sha256()
+    digest.update(f"{maze.rows}x{maze.cols}|{maze.start_pos}|{maze.exit_pos}|".encode())
+    digest.update(maze.packed_walls.tobytes())
+    params = {key: config[key] for key in TRAINING_KEYS}
+    params.update({'q_backend': backend, 'trainer': trainer_name(config), 'seed': seed})
+    if config['early_stop']:
+        params.update({key: config[key] for key in EARLY_STOP_KEYS})
+    if config['solver'] != "q_learning":
+        params.update({key: config[key] for key in SOLVER_KEYS})
+    if config['solver'] == "graph_q":
+        params.update({key: config[key] for key in GRAPH_KEYS})
+    if config['solver'] == "q_lambda":
+        params.update({key: config[key] for key in TRACE_KEYS})
+    if backend == "compact":
+        params.update({key: config[key] for key in COMPACT_KEYS})
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class QTableCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.qtb")
+
+    def load(self, key, agent, shape):
+        # loads the cached table into agent, returns True on a hit
+        path = self.path(key)
+        if os.path.exists(path) and agent.load_q_table(path, shape=shape):
+            os.utime(path) # mark as recently used
+            self.record(True)
+            return True
+        if os.path.exists(path):
+            # unreadable or wrong size, it will never be a hit so don't keep it around
+            os.remove(path)
+        self.record(False)
+        return False
+
+    def store(self, key, agent, shape, dtype):
+        agent.save_q_table(self.path(key), shape=shape, dtype=dtype)
+        self.evict(keep=key)
+
+    def record(self, hit):
+        # also used for lookups done by other processes (see session.unpack_job_result)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def evict(self, keep=None):
+        # deletes least recently used tables until the directory fits in max_bytes
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".qtb"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue # removed by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self.path(keep):
+                continue
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
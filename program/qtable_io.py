@@ -0,0 +1,94 @@
+import os
+import pickle
+import struct
+import numpy as np
+
+# compact binary Q-table files
+#
+#   32 byte header: magic b"MZQT", format version (u16), dtype code (u8), padding,
+#                   rows, cols, num_actions (u32 each), zero padding
+#   body:           rows * cols * num_actions values, C order, little endian float32 or float16
+#
+# the body starts at a fixed offset, so load_q_array can hand back an np.memmap over the file:
+# opening is instant whatever the size, and pages are only read when the table is used
+
+MAGIC = b"MZQT"
+FORMAT_VERSION = 1
+HEADER_SIZE = 32
+_HEADER = struct.Struct("<4sHBxIII")
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+_DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+class QTableFormatError(ValueError):
+    pass
+
+
+def is_q_table_file(filepath):
+    # True for files in this format, False for anything else (e.g. old pickles)
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_q_array(filepath, q_array, dtype=np.float32):
+    # writes a (rows, cols, num_actions) array
+    # goes through a temporary file so a crash never leaves a half written table behind
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype not in _DTYPE_CODES:
+        raise QTableFormatError(f"Unsupported Q-table dtype {dtype}, expected float32 or float16")
+    rows, cols, num_actions = q_array.shape
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, _DTYPE_CODES[dtype], rows, cols, num_actions)
+
+    temp_path = f"{filepath}.tmp{os.getpid()}"
+    with open(temp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(q_array, dtype=dtype).tobytes())
+    os.replace(temp_path, filepath)
+
+
+def read_header(filepath):
+    # (version, dtype, (rows, cols, num_actions))
+    with open(filepath, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise QTableFormatError(f"{filepath} is not a Q-table file")
+    _, version, dtype_code, rows, cols, num_actions = _HEADER.unpack_from(header)
+    if version > FORMAT_VERSION:
+        raise QTableFormatError(f"{filepath} uses format version {version}, this program reads up to {FORMAT_VERSION}")
+    if dtype_code not in DTYPES:
+        raise QTableFormatError(f"{filepath} has unknown dtype code {dtype_code}")
+    shape = (rows, cols, num_actions)
+    expected_size = HEADER_SIZE + DTYPES[dtype_code].itemsize * rows * cols * num_actions
+    if os.path.getsize(filepath) != expected_size:
+        raise QTableFormatError(f"{filepath} is truncated or corrupt")
+    return version, DTYPES[dtype_code], shape
+
+
+def load_q_array(filepath, mode='c'):
+    # memory maps the table, mode 'c' (copy on write) lets training carry on without touching the file
+    # use mode 'r' for read only access
+    _, dtype, shape = read_header(filepath)
+    return np.memmap(filepath, dtype=dtype, mode=mode, offset=HEADER_SIZE, shape=shape)
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    # old Q-tables are pickled dicts of numpy arrays (or a dense array)
+    # only the few classes needed to rebuild those are allowed, so a file dropped into a shared
+    # cache directory can't run arbitrary code when it is loaded
+    ALLOWED = {
+        ("numpy", "ndarray"), ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"), ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy.core.multiarray", "scalar"), ("numpy._core.multiarray", "scalar"),
+        ("numpy.core.numeric", "_frombuffer"), ("numpy._core.numeric", "_frombuffer"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a Q-table pickle")
+        return super().find_class(module, name)
+
+
+def load_legacy_pickle(filepath):
+    # reads a Q-table saved by older versions with pickle.dump
+    with open(filepath, 'rb') as f:
+        return _LegacyUnpickler(f).load()
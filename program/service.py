@@ -0,0 +1,445 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+
+from agent import Q_BACKENDS, REWARD_SHAPINGS
+from generators import GENERATORS
+from compact import COMPACT_DTYPES
+from planning import SOLVERS
+from metrics import MetricsRecorder, TrainingCallback
+from session import create_cache, generate_maze, prepare_maze
+
+# the maze solver as a local service instead of the input() prompts: line-delimited JSON over TCP
+#
+#   python service.py --port 8765 --workers 4
+#   {"id": 1, "type": "solve", "rows": 21, "cols": 31, "seed": 7, "episodes": 2000}
+#
+# request types
+#   generate  just the maze
+#   train     the maze, then an agent trained for it (or loaded from the Q-table cache) and its training metrics
+#   solve     the same, plus the greedy policy's path through the maze
+#   stats     the service's counters, answered straight away
+# a request can set any key of JOB_DEFAULTS (maze size, seed and the hyperparameters), anything else is an error
+# --max_cells, --max_episodes, --max_envs and --max_planning_steps bound what one request can ask for,
+# hyperparameters outside their ranges (0 < gamma < 1, 0 < lr <= 1, 0 <= trace_lambda <= 1) are errors too,
+# and a request line longer than --max_request_bytes gets an error and closes its connection
+# replies are JSON lines tagged with the request's id, each one sent as soon as its stage is done:
+#   {"id": 1, "event": "accepted", "seed": 7, "deduplicated": false}
+#   {"id": 1, "event": "maze", "rows": 21, "cols": 31, "layout": [...], "start_pos": [1, 1], ...}
+#   {"id": 1, "event": "metrics", "episode": 100, "steps": 312, ...}     (every metrics_every-th episode)
+#   {"id": 1, "event": "trained", "episodes": 2000, "cache_hit": false, "seconds": 1.3}
+#   {"id": 1, "event": "path", "solved": true, "steps": 98, "efficiency": 100.0, "path": [[1, 1], ...]}
+#   {"id": 1, "event": "done"}    or, instead of the rest, {"id": 1, "event": "error", "error": "..."}
+# requests on one connection are handled side by side, so replies to different ids can interleave
+# a client keeps its connection open until it has its replies: closing it (or just its sending side) cancels the
+# jobs nobody else is waiting for, queued ones are dropped and running training stops at its next episode
+#
+# jobs run on a process pool, at most --concurrency of them at a time, and wait in a queue of --queue_size
+# once that is full the service stops reading from connections until there is room again (backpressure),
+# and every reply waits for its connection to take it (writer.drain), so slow clients only hold up themselves
+# identical seeded requests share one job while it is queued or running, and training that already finished
+# is reused from the Q-table cache; unseeded requests get a random seed (sent back in "accepted") and are never shared
+
+REQUEST_TYPES = ("generate", "train", "solve")
+
+# what a request can set, with its default
+JOB_DEFAULTS = {
+    'rows': 21,
+    'cols': 31,
+    'seed': None,
+    'algorithm': "backtracker",
+    'episodes': 20000,
+    'step_penalty': -0.1,
+    'reward_shaping': "manhattan",
+    'lr': 0.5,
+    'gamma': 0.99,
+    'epsilon_decay': 0.9998,
+    'q_backend': "dense",
+    'compact_dtype': "float16",
+    'mask_actions': False,
+    'num_envs': 1,
+    'jit': False,
+    'solver': "q_learning",
+    'planning_steps': 10,
+    'prune_dead_ends': False,
+    'trace_lambda': 0.8,
+    'early_stop': False,
+    'early_stop_every': 50,
+    'early_stop_patience': 3,
+    'early_stop_tolerance': 0.0,
+    'early_stop_delta_q': None,
+    'metrics_every': 100,
+}
+CHOICES = {'algorithm': GENERATORS, 'reward_shaping': REWARD_SHAPINGS, 'q_backend': Q_BACKENDS, 'solver': SOLVERS,
+           'compact_dtype': COMPACT_DTYPES}
+# the keys whose default is None, and what they are otherwise
+OPTIONAL_TYPES = {'seed': int, 'early_stop_delta_q': float}
+
+
+def _check_value(key, value):
+    # returns the request's value for key, raises ValueError if it is the wrong kind of value
+    default = JOB_DEFAULTS[key]
+    expected = OPTIONAL_TYPES.get(key, type(default))
+    if key in CHOICES:
+        if value not in CHOICES[key]:
+            raise ValueError(f"{key} must be one of {', '.join(CHOICES[key])}")
+    elif value is None and key in OPTIONAL_TYPES:
+        pass
+    elif expected is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f"{key} must be true or false")
+    elif expected is int:
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{key} must be a whole number")
+    elif not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(f"{key} must be a number")
+    else:
+        value = float(value)
+    return value
+
+
+def parse_request(request, server_config):
+    # returns (type, job config) for one request, raises ValueError for bad ones
+    if not isinstance(request, dict):
+        raise ValueError("a request must be a JSON object")
+    kind = request.get('type')
+    if kind not in REQUEST_TYPES:
+        raise ValueError(f"type must be one of {', '.join(REQUEST_TYPES + ('stats',))}")
+    unknown = set(request) - {'id', 'type'} - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown keys: {', '.join(sorted(unknown))}")
+
+    config = {**JOB_DEFAULTS, **server_config}
+    for key in JOB_DEFAULTS:
+        if key in request:
+            config[key] = _check_value(key, request[key])
+    if min(config['rows'], config['cols']) < 5 or config['rows'] * config['cols'] > server_config['max_cells']:
+        raise ValueError(f"mazes must be at least 5x5 and at most {server_config['max_cells']} cells")
+    if not 1 <= config['episodes'] <= server_config['max_episodes']:
+        raise ValueError(f"episodes must be between 1 and {server_config['max_episodes']}")
+    if not 1 <= config['num_envs'] <= server_config['max_envs']:
+        raise ValueError(f"num_envs must be between 1 and {server_config['max_envs']}")
+    if not 0 <= config['planning_steps'] <= server_config['max_planning_steps']:
+        raise ValueError(f"planning_steps must be between 0 and {server_config['max_planning_steps']}")
+    # written so that NaN fails them too
+    if not 0 < config['gamma'] < 1:
+        raise ValueError("gamma must be between 0 and 1 (both excluded)")
+    if not 0 < config['lr'] <= 1:
+        raise ValueError("lr must be above 0 and at most 1")
+    if not 0 <= config['trace_lambda'] <= 1:
+        raise ValueError("trace_lambda must be between 0 and 1")
+    return kind, config
+
+
+def job_key(kind, config):
+    # requests with the same key produce exactly the same replies (only seeded ones have a key)
+    return hashlib.sha256(json.dumps([kind, config], sort_keys=True).encode()).hexdigest()
+
+
+def generate_job(config):
+    # process pool entry point: the "maze" event
+    with redirect_stdout(StringIO()):
+        maze = generate_maze(config, config['rows'], config['cols'], config['seed'])
+    return {
+        'event': "maze",
+        'rows': maze.rows,
+        'cols': maze.cols,
+        'layout': maze.layout,
+        'start_pos': maze.start_pos,
+        'exit_pos': maze.exit_pos,
+        'shortest_path_length': maze.shortest_path_length,
+    }
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class CancelCheck(TrainingCallback):
+    # ends training in a worker once the service sets cancel (a Manager Event), looked at every `every` seconds
+    # it raises instead of setting agent.stop_training, so the unfinished table never reaches the cache
+    def __init__(self, cancel, every=0.25):
+        self.cancel = cancel
+        self.every = every
+        self.next_check = time.perf_counter() + every
+
+    def on_episode_end(self, agent, stats):
+        now = time.perf_counter()
+        if now >= self.next_check:
+            self.next_check = now + self.every
+            if self.cancel.is_set():
+                raise JobCancelled()
+
+
+def train_job(config, play, cancel=None):
+    # process pool entry point: the "metrics" and "trained" events, and with play the "path" event
+    # the maze is generated again from the seed, which costs little next to training and is cheaper than pickling it
+    cache = create_cache(config)
+    recorder = MetricsRecorder(config['metrics_every'])
+    callbacks = [recorder] if cancel is None else [recorder, CancelCheck(cancel)]
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        maze, agent = prepare_maze(config, config['rows'], config['cols'], cache, config['seed'], callbacks)
+    events = [{'event': "metrics", **stats} for stats in recorder.rows]
+    events.append({'event': "trained", 'episodes': agent.episodes_trained, 'cache_hit': cache.hits > 0,
+                   'seconds': round(time.perf_counter() - start, 4)})
+    if play:
+        path = []
+        solved, steps = agent.greedy_rollout(maze, path=path)
+        efficiency = maze.shortest_path_length / steps * 100 if solved else 0.0
+        events.append({'event': "path", 'solved': solved, 'steps': steps, 'efficiency': round(efficiency, 2), 'path': path})
+    return events
+
+
+def _to_json(value):
+    # numpy numbers in the training stats
+    return value.item()
+
+
+class Job:
+    # one unit of work on the pool, and the events it has produced so far
+    # every request waiting for it listens on its own queue, and requests that join late get the earlier events first
+    def __init__(self, kind, config, key=None):
+        self.kind = kind
+        self.config = config
+        self.key = key
+        self.events = []
+        self.listeners = []
+        self.finished = False
+        self.cancelled = False
+        self.cancel_event = None # set while training runs on the pool, to stop it from here
+
+    def emit(self, event):
+        self.finished = event['event'] in ("done", "error")
+        self.events.append(event)
+        for listener in self.listeners:
+            listener.put_nowait(event)
+
+    def listen(self):
+        listener = asyncio.Queue()
+        for event in self.events:
+            listener.put_nowait(event)
+        self.listeners.append(listener)
+        return listener
+
+    def cancel(self):
+        self.cancelled = True
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+
+class MazeService:
+    def __init__(self, server_config, workers, concurrency, queue_size):
+        self.server_config = server_config
+        self.concurrency = concurrency
+        self.num_workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.manager = Manager() # cancel events the pool workers can see
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = {} # job key -> Job, while it is queued or running
+        self.running = 0
+        self.stats = {'connections': 0, 'requests': 0, 'deduplicated': 0, 'jobs': 0, 'cancelled': 0, 'errors': 0}
+
+    async def start(self, host, port, max_request_bytes=2 ** 16):
+        # max_request_bytes caps how much of one request line is buffered before it is refused
+        self.max_request_bytes = max_request_bytes
+        # the pool's processes are forked before any connection is open, or they would hold on to its socket and the
+        # client would never see it closed
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, os.getpid) for _ in range(self.num_workers)])
+        self.workers = [asyncio.create_task(self._run_jobs()) for _ in range(self.concurrency)]
+        return await asyncio.start_server(self.handle_connection, host, port, limit=max_request_bytes)
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+    async def submit(self, kind, config, key=None):
+        # (job, its events for this request, deduplicated): a new job or the identical one already waiting or running
+        # waits while the queue is full, which is what pushes back on the clients
+        # the request listens before anything is awaited, so the job is never without a listener until it is dropped
+        if key in self.jobs:
+            self.stats['deduplicated'] += 1
+            job = self.jobs[key]
+            return job, job.listen(), True
+        job = Job(kind, config, key)
+        events = job.listen()
+        if key:
+            self.jobs[key] = job # before waiting for the queue, so identical requests meanwhile join this job
+        self.stats['jobs'] += 1
+        await self.queue.put(job)
+        return job, events, False
+
+    def drop(self, job, events):
+        # a request stops listening to a job, and a job left with no listeners before it finished is cancelled
+        job.listeners.remove(events)
+        if not job.listeners and not job.finished and not job.cancelled:
+            job.cancel()
+            self.stats['cancelled'] += 1
+            if job.key and self.jobs.get(job.key) is job:
+                del self.jobs[job.key] # later identical requests start over instead of joining a cancelled job
+
+    async def _run_jobs(self):
+        # one of the --concurrency loops feeding the process pool
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                self.queue.task_done()
+                continue
+            self.running += 1
+            try:
+                if job.kind in ("generate", "solve"):
+                    job.emit(await loop.run_in_executor(self.pool, generate_job, job.config))
+                if job.kind in ("train", "solve") and not job.cancelled:
+                    job.cancel_event = await loop.run_in_executor(None, self.manager.Event)
+                    if job.cancelled: # while the event was being made
+                        job.cancel_event.set()
+                    events = await loop.run_in_executor(self.pool, train_job, job.config, job.kind == "solve", job.cancel_event)
+                    for event in events:
+                        job.emit(event)
+                job.emit({'event': "done"})
+            except JobCancelled:
+                pass # nobody is listening any more
+            except Exception as e:
+                # anything going wrong in a worker ends this job only, not the service
+                self.stats['errors'] += 1
+                job.emit({'event': "error", 'error': f"{type(e).__name__}: {e}"})
+            finally:
+                self.running -= 1
+                job.cancel_event = None
+                if job.key and self.jobs.get(job.key) is job:
+                    del self.jobs[job.key]
+                self.queue.task_done()
+
+    def service_stats(self):
+        return {**self.stats, 'queued': self.queue.qsize(), 'running': self.running}
+
+    async def handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        lock = asyncio.Lock()
+        replies = set()
+
+        async def send(message):
+            async with lock:
+                writer.write(json.dumps(message, default=_to_json).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # a line over the limit, there is no telling where the next request would start, so stop reading
+                    self.stats['errors'] += 1
+                    await send({'id': None, 'event': "error",
+                                'error': f"requests must be at most {self.max_request_bytes} bytes, closing the connection"})
+                    break
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if isinstance(request, dict):
+                        request_id = request.get('id')
+                        if request.get('type') == "stats":
+                            await send({'id': request_id, 'event': "stats", **self.service_stats()})
+                            continue
+                    kind, config = parse_request(request, self.server_config)
+                except ValueError as e:
+                    self.stats['errors'] += 1
+                    await send({'id': request_id, 'event': "error", 'error': str(e)})
+                    continue
+
+                self.stats['requests'] += 1
+                key = None
+                if config['seed'] is None:
+                    config['seed'] = random.getrandbits(63)
+                else:
+                    key = job_key(kind, config)
+                job, events, deduplicated = await self.submit(kind, config, key)
+                reply = asyncio.create_task(self._reply(job, events, request_id, send))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+                await send({'id': request_id, 'event': "accepted", 'seed': config['seed'], 'deduplicated': deduplicated})
+        except ConnectionError:
+            pass
+        finally:
+            # the connection is closed (or was cut off), the replies still going are cancelled along with their jobs
+            for reply in replies:
+                reply.cancel()
+            writer.close()
+
+    async def _reply(self, job, events, request_id, send):
+        # streams a job's events to one request
+        try:
+            while True:
+                event = await events.get()
+                await send({'id': request_id, **event})
+                if event['event'] in ("done", "error"):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.drop(job, events)
+
+
+def get_service_config():
+    parser = argparse.ArgumentParser(description="Maze generating and solving service (line-delimited JSON over TCP).")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes in the pool that generates and trains.")
+    parser.add_argument("--concurrency", type=int, help="Jobs running at the same time (default: --workers).")
+    parser.add_argument("--queue_size", type=int, default=64, help="Jobs waiting for a worker before the service stops reading requests.")
+    parser.add_argument("--max_cells", type=int, default=1001 * 1001, help="Largest maze (rows * cols) a request may ask for.")
+    parser.add_argument("--max_episodes", type=int, default=200000, help="Most training episodes a request may ask for.")
+    parser.add_argument("--max_envs", type=int, default=64, help="Most parallel training environments (num_envs) a request may ask for.")
+    parser.add_argument("--max_planning_steps", type=int, default=100, help="Most planning_steps (dyna_q, prioritized_sweeping) a request may ask for.")
+    parser.add_argument("--max_request_bytes", type=int, default=2 ** 16, help="Longest request line, longer ones close the connection.")
+    parser.add_argument("--cache_dir", default="q_cache", help="Directory for cached Q-tables.")
+    parser.add_argument("--cache_size_mb", type=float, default=256, help="Size budget of the Q-table cache.")
+    parser.add_argument("--q_dtype", choices=["float32", "float16"], default="float32", help="Precision of saved Q-table files.")
+    return vars(parser.parse_args())
+
+
+async def serve(config):
+    # what jobs can't change: where the cache is and that nothing writes metrics or profile files
+    server_config = {
+        'cache_dir': config['cache_dir'],
+        'cache_size_mb': config['cache_size_mb'],
+        'q_dtype': config['q_dtype'],
+        'max_cells': config['max_cells'],
+        'max_episodes': config['max_episodes'],
+        'max_envs': config['max_envs'],
+        'max_planning_steps': config['max_planning_steps'],
+        'no_cache': False,
+        'metrics_file': None,
+        'profile': None,
+    }
+    service = MazeService(server_config, config['workers'], config['concurrency'] or config['workers'], config['queue_size'])
+    server = await service.start(config['host'], config['port'], config['max_request_bytes'])
+    print(f"Serving on {config['host']}:{config['port']} with {config['workers']} worker(s), "
+          f"{service.concurrency} job(s) at a time, queue of {config['queue_size']}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+        print(f"Stopped: {service.service_stats()}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(get_service_config()))
+    except KeyboardInterrupt:
+        pass
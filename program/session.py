@@ -0,0 +1,188 @@
+import os
+import zlib
+import random
+import hashlib
+from contextlib import redirect_stdout, nullcontext
+from io import StringIO
+
+import numpy as np
+
+from constants import NUM_ACTIONS
+from maze import Maze
+from agent import RLAgent
+from general import GeneralAgent, NUM_NEIGHBOURHOODS, NUM_DIRECTIONS
+from qcache import QTableCache, cache_key
+from metrics import MetricsSink, EarlyStopping, profiled
+from planning import value_iteration, dyna_q, graph_q, q_lambda, prioritized_sweeping
+
+# per-maze setup shared by the interactive loop in main.py and the background workers
+# kept free of pygame so worker processes start quickly
+
+# maze sizes the shared agent of a --general session trains on
+# its states don't depend on the maze size, so small mazes teach it as much as big ones and train much quicker
+GENERAL_TRAINING_SIZES = [(11, 15), (15, 21), (21, 31)]
+
+
+def derive_seed(seed, *labels):
+    # a reproducible seed for one part of a seeded session, e.g. derive_seed(seed, "maze", 3)
+    # every label combination gets an unrelated seed, so mazes and agents never share random streams
+    # (and adding a maze doesn't change the others); None stays None, i.e. unseeded
+    if seed is None:
+        return None
+    digest = hashlib.sha256(repr((seed, *labels)).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def agent_backend(config):
+    # the batched and JIT trainers, q_lambda and prioritized_sweeping only work on the dense table, and graph_q
+    # rewrites the whole table (after every episode, with callbacks), which the dict backend is slow at
+    if config['solver'] == "q_learning" and (config['num_envs'] > 1 or config['jit']):
+        return "dense"
+    if config['solver'] in ("q_lambda", "prioritized_sweeping"):
+        return "dense"
+    if config['solver'] == "graph_q" and config['q_backend'] == "dict":
+        return "dense"
+    return config['q_backend']
+
+
+def create_agent(config, seed=None):
+    return RLAgent(
+        learning_rate=config['lr'],
+        discount_factor=config['gamma'],
+        epsilon_start=1.0,
+        epsilon_end=0.01,
+        epsilon_decay=config['epsilon_decay'],
+        step_penalty=config['step_penalty'],
+        q_backend=agent_backend(config),
+        reward_shaping=config['reward_shaping'],
+        seed=seed,
+        compact_dtype=config['compact_dtype'],
+        mask_actions=config['mask_actions']
+    )
+
+
+def create_cache(config):
+    return QTableCache(config['cache_dir'], config['cache_size_mb'] * 1024 * 1024)
+
+
+def generate_maze(config, rows, cols, seed=None):
+    # the maze prepare_maze builds for this seed, without an agent
+    return Maze(rows=rows, cols=cols, algorithm=config['algorithm'], seed=derive_seed(seed, "maze"))
+
+
+def prepare_maze(config, rows, cols, cache=None, seed=None, callbacks=()):
+    # generates a maze and gets a trained agent for it (from the cache or by training)
+    # seed (see derive_seed) makes both the maze and the training reproducible
+    maze = generate_maze(config, rows, cols, seed)
+    return maze, prepare_agent(config, maze, cache, derive_seed(seed, "agent"), callbacks)
+
+
+def prepare_general_agent(config, seed=None):
+    # the one agent a --general session uses for every maze
+    # loaded from config['general_model'] when that file exists, otherwise trained on config['general_mazes']
+    # small mazes (and saved to general_model, if set); seed makes the training mazes and the training reproducible
+    num_episodes = config['general_mazes'] * config['general_episodes']
+    agent = GeneralAgent(
+        learning_rate=config['lr'],
+        discount_factor=config['gamma'],
+        epsilon_start=1.0,
+        epsilon_end=0.01,
+        # explores for the whole run, however many episodes that is (config['epsilon_decay'] is per maze)
+        epsilon_decay=0.01 ** (1 / max(1, num_episodes)),
+        step_penalty=config['step_penalty'],
+        reward_shaping=config['reward_shaping'],
+        seed=derive_seed(seed, "general", "agent")
+    )
+    shape = (NUM_NEIGHBOURHOODS, NUM_DIRECTIONS)
+    if config['general_model'] and agent.load_q_table(config['general_model'], shape):
+        return agent
+
+    size_rng = random.Random(derive_seed(seed, "general", "sizes"))
+    mazes = [Maze(*size_rng.choice(GENERAL_TRAINING_SIZES), algorithm=config['algorithm'], seed=derive_seed(seed, "general", i))
+             for i in range(config['general_mazes'])]
+    callbacks = []
+    if config['metrics_file']:
+        callbacks.append(MetricsSink(config['metrics_file'], every=config['metrics_every'], label="general"))
+    with profiled(config['profile']) if config['profile'] else nullcontext():
+        agent.train_many(mazes, config['general_episodes'], callbacks=callbacks)
+    if config['general_model']:
+        agent.save_q_table(config['general_model'], dtype=config['q_dtype'])
+    return agent
+
+
+def prepare_agent(config, maze, cache=None, seed=None, callbacks=()):
+    # gets a trained agent for an existing maze
+    # with a cache, a table trained on exactly this maze with exactly these settings is reused and
+    # new tables are stored in it (no_cache only skips the lookup); without one the agent is always trained
+    # callbacks are training callbacks on top of the ones config asks for
+    agent = create_agent(config, seed)
+    agent.prepare_q_table(maze)
+    shape = (maze.rows, maze.cols)
+    key = cache_key(maze, config, agent.q_backend, seed) if cache else None
+
+    if cache and not config['no_cache'] and cache.load(key, agent, shape):
+        return agent # Q-table loaded, no training needed
+
+    callbacks = list(callbacks)
+    if config['metrics_file']:
+        callbacks.append(MetricsSink(config['metrics_file'], every=config['metrics_every'], label=f"{maze.rows}x{maze.cols}"))
+    if config['early_stop']:
+        callbacks.append(EarlyStopping(check_every=config['early_stop_every'], patience=config['early_stop_patience'],
+                                       tolerance=config['early_stop_tolerance'], delta_q_tolerance=config['early_stop_delta_q']))
+    with profiled(config['profile']) if config['profile'] else nullcontext():
+        if config['solver'] == "value_iteration":
+            value_iteration(agent, maze)
+        elif config['solver'] == "dyna_q":
+            dyna_q(agent, maze, num_episodes=config['episodes'], planning_steps=config['planning_steps'], callbacks=callbacks)
+        elif config['solver'] == "graph_q":
+            graph_q(agent, maze, num_episodes=config['episodes'], prune_dead_ends=config['prune_dead_ends'], callbacks=callbacks)
+        elif config['solver'] == "q_lambda":
+            q_lambda(agent, maze, num_episodes=config['episodes'], trace_lambda=config['trace_lambda'], callbacks=callbacks)
+        elif config['solver'] == "prioritized_sweeping":
+            prioritized_sweeping(agent, maze, num_episodes=config['episodes'], planning_steps=config['planning_steps'], callbacks=callbacks)
+        elif config['num_envs'] > 1:
+            agent.train_batched(maze, num_episodes=config['episodes'], num_envs=config['num_envs'], callbacks=callbacks)
+        elif config['jit']:
+            agent.train_jit(maze, num_episodes=config['episodes'], callbacks=callbacks)
+        else:
+            agent.train(maze, num_episodes=config['episodes'], callbacks=callbacks)
+    if cache:
+        cache.store(key, agent, shape, config['q_dtype'])
+    return agent
+
+
+def train_maze_job(config, rows, cols, seed=None):
+    # process pool entry point: same as prepare_maze, but silent and returning a compact, picklable result
+    cache = create_cache(config)
+    # every worker process gets its own metrics / profile files, they can't share one
+    config = dict(config)
+    for key in ('metrics_file', 'profile'):
+        if config[key]:
+            config[key] = f"{config[key]}.{os.getpid()}"
+    with redirect_stdout(StringIO()):
+        maze, agent = prepare_maze(config, rows, cols, cache, seed)
+        q_table = agent.dense_q_table((maze.rows, maze.cols))
+    return {
+        'rows': maze.rows,
+        'cols': maze.cols,
+        'walls': zlib.compress(maze.packed_walls.tobytes()),
+        'start_pos': maze.start_pos,
+        'exit_pos': maze.exit_pos,
+        'shortest_path_length': maze.shortest_path_length,
+        'q_table': zlib.compress(np.asarray(q_table, dtype=np.float32).tobytes()),
+        'cache_hit': cache.hits > 0,
+    }
+
+
+def unpack_job_result(config, result, cache=None):
+    # rebuilds the maze and agent from train_maze_job's output, without regenerating or retraining
+    # the worker's cache lookup is counted in cache (the workers' own cache objects are thrown away)
+    if cache:
+        cache.record(result['cache_hit'])
+    packed_walls = np.frombuffer(zlib.decompress(result['walls']), dtype=np.uint8).reshape(result['rows'], -1)
+    maze = Maze.from_packed(packed_walls, result['cols'], result['start_pos'], result['exit_pos'], result['shortest_path_length'])
+    q_table = np.frombuffer(zlib.decompress(result['q_table']), dtype=np.float32)
+    agent = create_agent(config)
+    agent.prepare_q_table(maze)
+    agent.set_q_table(q_table.reshape(result['rows'], result['cols'], NUM_ACTIONS))
+    return maze, agent
@@ -0,0 +1,96 @@
+import json
+import random
+import argparse
+import numpy as np
+
+from generators import iter_eller_rows
+
+# mazes too big for memory (e.g. 100001 x 100001)
+# Eller's algorithm produces the maze one row at a time, every row is bit-packed and appended
+# straight to a .npy file on disk, so generation only ever holds O(cols) in memory
+# StreamedMaze then opens that file with np.memmap and only touches the pages that get read
+#
+#   python streaming.py huge_maze.npy --rows 100001 --cols 100001
+
+
+def _metadata_path(filepath):
+    return filepath + ".json"
+
+
+def write_streamed_maze(filepath, rows, cols, rng=None):
+    # generates a rows x cols maze straight into filepath (plus a small .json with its metadata)
+    if rows % 2 == 0:
+        rows += 1
+    if cols % 2 == 0:
+        cols += 1
+    row_bytes = (cols + 7) // 8
+
+    with open(filepath, 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, {'descr': '|u1', 'fortran_order': False, 'shape': (rows, row_bytes)})
+        for row in iter_eller_rows(rows, cols, rng):
+            f.write(np.packbits(row).tobytes())
+
+    # start and exit are the same corners Maze picks: (1, 1) and the farthest cell from it
+    metadata = {'rows': rows, 'cols': cols, 'start_pos': [1, 1], 'exit_pos': [rows - 2, cols - 2], 'algorithm': "eller"}
+    with open(_metadata_path(filepath), 'w') as f:
+        json.dump(metadata, f)
+    return metadata
+
+
+class PackedWallGrid:
+    # read-only wall lookups on a bit-packed (rows, ceil(cols / 8)) array, so walls[row, col] works like
+    # indexing Maze.walls (Player.move only needs that)
+    def __init__(self, packed, rows, cols):
+        self.packed = packed
+        self.shape = (rows, cols)
+
+    def __getitem__(self, pos):
+        row, col = pos
+        return bool((self.packed[row, col >> 3] >> (7 - (col & 7))) & 1)
+
+    def row(self, row):
+        # one full row as a bool array
+        return np.unpackbits(self.packed[row], count=self.shape[1]).view(bool)
+
+
+class StreamedMaze:
+    # Maze-compatible reader for files written by write_streamed_maze
+    # rows, cols, start_pos, exit_pos, walls[row, col] and packed_walls behave like on Maze,
+    # but nothing is loaded up front: the grid is an np.memmap over the file
+    def __init__(self, filepath):
+        with open(_metadata_path(filepath)) as f:
+            metadata = json.load(f)
+        self.rows = metadata['rows']
+        self.cols = metadata['cols']
+        self.start_pos = tuple(metadata['start_pos'])
+        self.exit_pos = tuple(metadata['exit_pos'])
+        self.algorithm = metadata['algorithm']
+        # a full BFS over a maze this size is not something to do on open
+        self.shortest_path_length = None
+
+        self.packed_walls = np.load(filepath, mmap_mode='r')
+        self.walls = PackedWallGrid(self.packed_walls, self.rows, self.cols)
+
+    def is_wall(self, row, col):
+        return self.walls[row, col]
+
+    def row(self, row):
+        return self.walls.row(row)
+
+    def to_maze(self):
+        # loads the whole thing into a regular Maze, only for mazes that fit in memory
+        from maze import Maze
+        return Maze.from_packed(np.asarray(self.packed_walls), self.cols, self.start_pos, self.exit_pos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a maze straight to disk, one row at a time.")
+    parser.add_argument("output", help="Path of the .npy file to write.")
+    parser.add_argument("--rows", type=int, default=10001, help="Number of rows in the maze.")
+    parser.add_argument("--cols", type=int, default=10001, help="Number of columns in the maze.")
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible maze.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed) if args.seed is not None else None
+    metadata = write_streamed_maze(args.output, args.rows, args.cols, rng)
+    print(f"-> Wrote a {metadata['rows']}x{metadata['cols']} maze to {args.output}")
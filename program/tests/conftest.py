@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules sit side by side in program/ and import each other by name, like when the scripts are run from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from generators import GENERATORS
+from maze import Maze
+
+SIZES = [(5, 5), (7, 31), (21, 31), (41, 41)]
+
+
+def _reachable(open_grid, start):
+    # every open cell a plain BFS gets to from start
+    rows, cols = open_grid.shape
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        row, col = queue.popleft()
+        for row_delta, col_delta in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            neighbour = (row + row_delta, col + col_delta)
+            if 0 <= neighbour[0] < rows and 0 <= neighbour[1] < cols and open_grid[neighbour] and neighbour not in seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    return seen
+
+
+@pytest.mark.parametrize("algorithm", GENERATORS)
+@pytest.mark.parametrize("rows, cols", SIZES)
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_generator_makes_a_perfect_maze(algorithm, rows, cols, seed):
+    walls = GENERATORS[algorithm](rows, cols, random.Random(seed))
+    assert walls.shape == (rows, cols) and walls.dtype == bool
+    open_grid = ~walls
+
+    # a closed outer wall, every cell (odd row and col) open and no wall post (even row and col) open
+    assert walls[0].all() and walls[-1].all() and walls[:, 0].all() and walls[:, -1].all()
+    assert open_grid[1::2, 1::2].all()
+    assert not open_grid[::2, ::2].any()
+
+    # perfect: the open cells are connected and there are no loops, i.e. they form a tree (edges = cells - 1)
+    num_open = int(open_grid.sum())
+    edges = int((open_grid[1:] & open_grid[:-1]).sum() + (open_grid[:, 1:] & open_grid[:, :-1]).sum())
+    assert len(_reachable(open_grid, (1, 1))) == num_open
+    assert edges == num_open - 1
+
+
+@pytest.mark.parametrize("algorithm", GENERATORS)
+def test_generator_is_reproducible_from_its_seed(algorithm):
+    first = GENERATORS[algorithm](21, 31, random.Random(7))
+    second = GENERATORS[algorithm](21, 31, random.Random(7))
+    assert np.array_equal(first, second)
+
+
+@pytest.mark.parametrize("algorithm", GENERATORS)
+def test_maze_start_and_exit_are_open_and_connected(algorithm):
+    maze = Maze(21, 31, algorithm=algorithm, seed=3, verbose=False)
+    open_grid = ~maze.walls
+    assert open_grid[maze.start_pos] and open_grid[maze.exit_pos]
+    assert maze.exit_pos in _reachable(open_grid, maze.start_pos)
@@ -0,0 +1,85 @@
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from generators import GENERATORS
+from maze import Maze
+from pathfinding import bidirectional_bfs, astar, distance_field
+
+
+def _bfs_distances(walls, source):
+    # plain (row, col) BFS from source: steps to every cell, -1 for walls and cells it can't reach
+    rows, cols = walls.shape
+    distances = np.full((rows, cols), -1, dtype=np.int64)
+    distances[source] = 0
+    queue = deque([source])
+    while queue:
+        row, col = queue.popleft()
+        for row_delta, col_delta in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            neighbour = (row + row_delta, col + col_delta)
+            if 0 <= neighbour[0] < rows and 0 <= neighbour[1] < cols and not walls[neighbour] and distances[neighbour] < 0:
+                distances[neighbour] = distances[row, col] + 1
+                queue.append(neighbour)
+    return distances
+
+
+def _with_loops(walls, seed, fraction=0.1):
+    # knocks down a fraction of the inner walls between two cells, so there are many paths of different lengths
+    walls = walls.copy()
+    rng = random.Random(seed)
+    rows, cols = walls.shape
+    between = [(row, col) for row in range(1, rows - 1) for col in range(1, cols - 1)
+               if walls[row, col] and (row % 2) != (col % 2)]
+    for cell in rng.sample(between, int(len(between) * fraction)):
+        walls[cell] = False
+    return walls
+
+
+def _grids():
+    # (name, walls, open cells) of perfect mazes from every generator and of the same mazes with loops
+    for algorithm in GENERATORS:
+        maze = Maze(21, 31, algorithm=algorithm, seed=11, verbose=False)
+        for kind, walls in (("perfect", maze.walls), ("loops", _with_loops(maze.walls, seed=11))):
+            yield f"{algorithm}-{kind}", walls, [tuple(int(i) for i in cell) for cell in np.argwhere(~walls)]
+
+
+GRIDS = list(_grids())
+GRID_IDS = [name for name, _, _ in GRIDS]
+
+
+@pytest.mark.parametrize("name, walls, open_cells", GRIDS, ids=GRID_IDS)
+def test_bidirectional_bfs_matches_bfs(name, walls, open_cells):
+    rng = random.Random(5)
+    for _ in range(30):
+        start, goal = rng.choice(open_cells), rng.choice(open_cells)
+        assert bidirectional_bfs(walls, start, goal) == _bfs_distances(walls, start)[goal]
+
+
+@pytest.mark.parametrize("name, walls, open_cells", GRIDS, ids=GRID_IDS)
+def test_distance_field_matches_bfs(name, walls, open_cells):
+    for target in random.Random(6).sample(open_cells, 5):
+        assert np.array_equal(distance_field(walls, target), _bfs_distances(walls, target))
+
+
+@pytest.mark.parametrize("name, walls, open_cells", GRIDS, ids=GRID_IDS)
+def test_astar_finds_a_shortest_path(name, walls, open_cells):
+    rng = random.Random(7)
+    for _ in range(10):
+        start, goal = rng.choice(open_cells), rng.choice(open_cells)
+        path = astar(walls, start, goal)
+        assert path[0] == start and path[-1] == goal
+        assert len(path) - 1 == _bfs_distances(walls, start)[goal]
+        for (row, col), (next_row, next_col) in zip(path, path[1:]):
+            assert abs(row - next_row) + abs(col - next_col) == 1 and not walls[next_row, next_col]
+
+
+def test_unreachable_goal():
+    walls = np.ones((7, 7), dtype=bool)
+    walls[1, 1:6] = False
+    walls[5, 1:6] = False
+    assert bidirectional_bfs(walls, (1, 1), (5, 5)) == -1
+    assert astar(walls, (1, 1), (5, 5)) is None
+    assert distance_field(walls, (5, 5))[1, 1] == -1
+    assert bidirectional_bfs(walls, (1, 1), (1, 1)) == 0
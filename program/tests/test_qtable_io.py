@@ -0,0 +1,162 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from agent import RLAgent
+from compact import CompactLayout
+from maze import Maze
+from qtable_io import save_q_array, load_q_array, load_legacy_pickle, QTableFormatError
+
+# (q_backend, extra RLAgent arguments) of every Q-table backend
+BACKENDS = [
+    ("dict", {}),
+    ("dense", {}),
+    ("compact", {'compact_dtype': "float32"}),
+    ("compact", {'compact_dtype': "float16"}),
+    ("compact", {'compact_dtype': "float16", 'mask_actions': True}),
+]
+BACKEND_IDS = ["dict", "dense", "compact-float32", "compact-float16", "compact-masked"]
+
+
+def _agent(q_backend, **kwargs):
+    return RLAgent(0.5, 0.99, 1.0, 0.01, 0.99, -0.1, q_backend=q_backend, seed=0, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def maze():
+    return Maze(11, 15, seed=1, verbose=False)
+
+
+@pytest.fixture(scope="module")
+def shape(maze):
+    return (maze.rows, maze.cols)
+
+
+def _trained(maze, q_backend, kwargs):
+    agent = _agent(q_backend, **kwargs)
+    agent.train(maze, 30)
+    return agent
+
+
+def _loaded(maze, q_backend, kwargs, filepath, shape):
+    # a fresh agent with filepath loaded, or None when loading failed
+    agent = _agent(q_backend, **kwargs)
+    agent.prepare_q_table(maze)
+    return agent if agent.load_q_table(filepath, shape) else None
+
+
+def _assert_holds(agent, kwargs, expected, shape):
+    # agent's table is expected, up to what its backend keeps: a float16 table about 3 significant digits,
+    # and with mask_actions -inf for every move into a wall
+    actual = agent.dense_q_table(shape)
+    if kwargs.get('mask_actions'):
+        expected = np.where(np.isneginf(actual), -np.inf, expected)
+    rtol = 1e-3 if agent.q_backend == "compact" and kwargs.get('compact_dtype') == "float16" else 0
+    np.testing.assert_allclose(actual, expected, rtol=rtol)
+
+
+@pytest.mark.parametrize("q_backend, kwargs", BACKENDS, ids=BACKEND_IDS)
+def test_save_load_round_trip(tmp_path, maze, shape, q_backend, kwargs):
+    saved = _trained(maze, q_backend, kwargs)
+    filepath = str(tmp_path / "table.qtb")
+    saved.save_q_table(filepath, shape)
+    loaded = _loaded(maze, q_backend, kwargs, filepath, shape)
+    assert loaded is not None
+    np.testing.assert_array_equal(loaded.dense_q_table(shape), saved.dense_q_table(shape))
+    assert loaded.greedy_rollout(maze) == saved.greedy_rollout(maze)
+
+
+@pytest.mark.parametrize("saver", BACKENDS, ids=BACKEND_IDS)
+@pytest.mark.parametrize("loader", BACKENDS, ids=BACKEND_IDS)
+def test_tables_load_into_any_backend(tmp_path, maze, shape, saver, loader):
+    saved = _trained(maze, *saver)
+    filepath = str(tmp_path / "table.qtb")
+    saved.save_q_table(filepath, shape)
+    loaded = _loaded(maze, *loader, filepath, shape)
+    _assert_holds(loaded, loader[1], saved.dense_q_table(shape), shape)
+
+
+def test_float16_files(tmp_path):
+    q_array = np.random.default_rng(0).normal(size=(5, 7, 4)).astype(np.float32)
+    filepath = str(tmp_path / "table.qtb")
+    save_q_array(filepath, q_array, np.float16)
+    assert os.path.getsize(filepath) < q_array.nbytes
+    loaded = load_q_array(filepath)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_allclose(loaded, q_array, rtol=1e-3, atol=1e-3)
+
+
+def test_broken_files_are_refused(tmp_path, maze, shape):
+    filepath = str(tmp_path / "table.qtb")
+    save_q_array(filepath, np.zeros((maze.rows, maze.cols, 4), dtype=np.float32))
+    with open(filepath, 'r+b') as f:
+        f.truncate(os.path.getsize(filepath) - 1)
+    with pytest.raises(QTableFormatError):
+        load_q_array(filepath)
+    assert _loaded(maze, "dense", {}, filepath, shape) is None
+
+    # a table for another maze size
+    save_q_array(filepath, np.zeros((maze.rows + 2, maze.cols, 4), dtype=np.float32))
+    assert _loaded(maze, "dense", {}, filepath, shape) is None
+
+
+def test_compact_layout_matches_only_its_maze(maze):
+    layout = CompactLayout(maze)
+    packed = Maze.from_arrays(maze.packed_walls, maze.rows, maze.cols, maze.start_pos, maze.exit_pos,
+                              maze.shortest_path_length, packed=True)
+    assert layout.matches(maze)
+    assert layout.matches(packed)
+    assert CompactLayout(packed).matches(maze)
+    assert not layout.matches(Maze(maze.rows, maze.cols, seed=2, verbose=False))
+    assert not layout.matches(Maze(maze.rows + 2, maze.cols, seed=1, verbose=False))
+
+
+class _RunsCode:
+    # unpickling this calls os.system, which is what a malicious "Q-table" would do
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (os.system, (f"touch {self.marker}",))
+
+
+def test_legacy_loader_refuses_unsafe_pickles(tmp_path, maze, shape):
+    marker = tmp_path / "ran"
+    filepath = str(tmp_path / "table.pkl")
+    with open(filepath, 'wb') as f:
+        pickle.dump(_RunsCode(marker), f)
+    with pytest.raises(pickle.UnpicklingError):
+        load_legacy_pickle(filepath)
+    assert _loaded(maze, "dense", {}, filepath, shape) is None
+    assert not marker.exists()
+
+
+@pytest.mark.parametrize("q_backend, kwargs", BACKENDS, ids=BACKEND_IDS)
+def test_legacy_tables_still_load(tmp_path, maze, shape, q_backend, kwargs):
+    # the {(row, col): values} dicts older versions pickled, for two open cells
+    first, second = [tuple(int(i) for i in cell) for cell in np.argwhere(~maze.walls)[:2]]
+    q_dict = {first: np.array([0.5, -1.0, 2.0, 0.0]), second: np.array([1.0, 0.0, 0.0, -3.0])}
+    filepath = str(tmp_path / "table.pkl")
+    with open(filepath, 'wb') as f:
+        pickle.dump(q_dict, f)
+    expected = np.zeros((*shape, 4))
+    for cell, values in q_dict.items():
+        expected[cell] = values
+    _assert_holds(_loaded(maze, q_backend, kwargs, filepath, shape), kwargs, expected, shape)
+
+
+@pytest.mark.parametrize("table", [
+    [1, 2, 3],
+    {(1, 1): [0.0, 1.0]},
+    {(1, 1, 1): [0.0, 0.0, 0.0, 0.0]},
+    {(100, 1): [0.0, 0.0, 0.0, 0.0]},
+    np.zeros((3, 3, 4)),
+    np.zeros((11, 15)),
+], ids=["list", "values", "key", "outside", "array shape", "array dims"])
+def test_legacy_pickles_that_are_no_table_are_refused(tmp_path, maze, shape, table):
+    filepath = str(tmp_path / "table.pkl")
+    with open(filepath, 'wb') as f:
+        pickle.dump(table, f)
+    assert _loaded(maze, "dense", {}, filepath, shape) is None
@@ -0,0 +1,70 @@
+import pytest
+
+from service import JOB_DEFAULTS, parse_request
+
+SERVER_CONFIG = {
+    'cache_dir': "q_cache",
+    'cache_size_mb': 16,
+    'q_dtype': "float32",
+    'max_cells': 101 * 101,
+    'max_episodes': 50000,
+    'max_envs': 8,
+    'max_planning_steps': 50,
+    'no_cache': False,
+    'metrics_file': None,
+    'profile': None,
+}
+
+
+def test_valid_request():
+    kind, config = parse_request({'id': 1, 'type': "solve", 'rows': 21, 'cols': 31, 'seed': 7, 'episodes': 2000,
+                                  'gamma': 0.9, 'lr': 1, 'trace_lambda': 0, 'planning_steps': 50}, SERVER_CONFIG)
+    assert kind == "solve"
+    assert config['episodes'] == 2000 and config['seed'] == 7
+    assert config['gamma'] == 0.9 and config['lr'] == 1.0 and isinstance(config['lr'], float)
+    # whatever the request doesn't set is the default
+    assert config['algorithm'] == JOB_DEFAULTS['algorithm']
+    assert config['max_cells'] == SERVER_CONFIG['max_cells']
+
+
+@pytest.mark.parametrize("fields", [
+    # sizes
+    {'rows': 3},
+    {'cols': 4},
+    {'rows': 101, 'cols': 103},
+    # per request limits
+    {'episodes': 0},
+    {'episodes': 50001},
+    {'num_envs': 0},
+    {'num_envs': 9},
+    {'planning_steps': -1},
+    {'planning_steps': 51},
+    # hyperparameter ranges
+    {'gamma': 0},
+    {'gamma': 1},
+    {'gamma': 1e308},
+    {'gamma': float('nan')},
+    {'lr': 0},
+    {'lr': -0.5},
+    {'lr': 1.5},
+    {'trace_lambda': -0.1},
+    {'trace_lambda': 1.1},
+    # types and choices
+    {'episodes': "2000"},
+    {'episodes': 2000.0},
+    {'rows': True},
+    {'gamma': "0.9"},
+    {'early_stop': 1},
+    {'solver': "sarsa"},
+    {'algorithm': None},
+    {'unknown': 1},
+], ids=repr)
+def test_bad_values_are_rejected(fields):
+    with pytest.raises(ValueError):
+        parse_request({'type': "train", **fields}, SERVER_CONFIG)
+
+
+@pytest.mark.parametrize("request_", [[], "solve", {'type': "play"}, {'rows': 21}], ids=repr)
+def test_bad_requests_are_rejected(request_):
+    with pytest.raises(ValueError):
+        parse_request(request_, SERVER_CONFIG)
@@ -0,0 +1,56 @@
+import numpy as np
+
+from constants import ACTION_MAP, NUM_ACTIONS
+
+# the maze's deterministic transition and reward model, built once per maze
+# for every flat cell (row * cols + col) and action:
+#   next_cells  where the move ends up (the same cell when it hits a wall or the boundary, like Player.move)
+#   rewards     what RLAgent.get_reward gives for it (-10 blocked, +100 exit, step_penalty + distance shaping)
+#   terminal    True when the move reaches the exit
+# the trainers then only look things up instead of moving a Player and recomputing distances every step
+
+
+class TransitionTable:
+    def __init__(self, maze, step_penalty, reward_shaping="manhattan"):
+        self.rows, self.cols = maze.rows, maze.cols
+        self.start_cell = self.cell(*maze.start_pos)
+        self.exit_cell = self.cell(*maze.exit_pos)
+        size = self.rows * self.cols
+        walls = maze.walls
+        cells = np.arange(size)
+        cell_rows, cell_cols = np.divmod(cells, self.cols)
+        if reward_shaping == "path":
+            distances = maze.distance_to_exit.ravel()
+        else:
+            exit_row, exit_col = maze.exit_pos
+            distances = np.abs(cell_rows - exit_row) + np.abs(cell_cols - exit_col)
+
+        self.next_cells = np.empty((size, NUM_ACTIONS), dtype=np.int32)
+        self.rewards = np.empty((size, NUM_ACTIONS))
+        for action in range(NUM_ACTIONS):
+            row_delta, col_delta, _ = ACTION_MAP[action]
+            next_rows = cell_rows + row_delta
+            next_cols = cell_cols + col_delta
+            inside = (next_rows >= 0) & (next_rows < self.rows) & (next_cols >= 0) & (next_cols < self.cols)
+            blocked = ~inside
+            blocked[inside] = walls[next_rows[inside], next_cols[inside]]
+            next_cell = np.where(blocked, cells, next_rows * self.cols + next_cols)
+            self.next_cells[:, action] = next_cell
+            self.rewards[:, action] = np.where(blocked, -10.0, np.where(
+                next_cell == self.exit_cell, 100.0, step_penalty + (distances - distances[next_cell]) * 0.1))
+        self.terminal = self.next_cells == self.exit_cell
+
+    def cell(self, row, col):
+        return row * self.cols + col
+
+    def position(self, cell):
+        return divmod(cell, self.cols)
+
+    def keys(self):
+        # the (row, col) state key of every cell, indexed by flat cell
+        return [divmod(cell, self.cols) for cell in range(self.rows * self.cols)]
+
+    def as_lists(self):
+        # (next_cells, rewards, terminal) as nested python lists, which index much quicker than numpy
+        # one element at a time in the single episode trainers
+        return self.next_cells.tolist(), self.rewards.tolist(), self.terminal.tolist()